@@ -1,2 +1,8 @@
 from .resources import PythonFile, DataFile, CFile, ExecResourceFile, DataFile, ResourcesFromFileName
 from .compiler import Module, Package, Executable, Data, ProcessAll
+from .scheduler import BuildError
+from .lazyimports import LazyImports
+from .toolchain import BuildProfile
+from .datasync import SYNC_COPY, SYNC_HARDLINK, SYNC_REFLINK
+from .dataarchive import DATA_ARCHIVE_APPEND, DATA_ARCHIVE_FILE
+from .watch import Watch
@@ -0,0 +1,176 @@
+import os
+import time
+import zlib
+import struct
+import zipfile
+
+from typing import List, Dict, Tuple, BinaryIO
+
+
+ZIP_STORED = zipfile.ZIP_STORED
+ZIP_DEFLATED = zipfile.ZIP_DEFLATED
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+_END_OF_CENTRAL_DIR = struct.Struct("<4s4H2LH")
+
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+_CENTRAL_HEADER_SIGNATURE = b"PK\x01\x02"
+_END_OF_CENTRAL_DIR_SIGNATURE = b"PK\x05\x06"
+
+_ZIP_VERSION = 20
+_UTF8_FLAG = 0x800
+_ALIGNMENT_EXTRA_ID = 0xD935
+_MAX_ENTRIES = 0xFFFF
+_MAX_SIZE = 0xFFFFFFFF
+
+
+def _dosDateTime(mtime: float) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = time.localtime(mtime)[:6]
+    if year < 1980:
+        year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def Deflate(data: bytes, level: int = 6) -> Tuple[int, int, int, bytes]:
+    """
+    Compress 'data' as a raw zip entry, returns (method, crc, fileSize, payload).
+    A level of 0, or deflate not making it smaller, gives a stored entry.
+    zlib releases the GIL, so this scales on a thread pool.
+    """
+    if level:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        payload = compressor.compress(data) + compressor.flush()
+
+        if len(payload) < len(data):
+            return ZIP_DEFLATED, zlib.crc32(data), len(data), payload
+
+    return ZIP_STORED, zlib.crc32(data), len(data), data
+
+
+class ZipEntry:
+    def __init__(self, name: str, method: int, crc: int, compressSize: int, fileSize: int, mtime: float):
+        self.name = name
+        self.method = method
+        self.crc = crc
+        self.compressSize = compressSize
+        self.fileSize = fileSize
+        self.mtime = mtime
+        self.headerOffset = 0
+
+
+class ZipWriter:
+    """
+    Writes a zip archive from already compressed payloads, or from raw payloads copied
+    out of another archive. The archive is built in a temporary file and moved into
+    place by close(), readers of the previous archive are never disturbed.
+
+    With 'align', the payload of every stored entry starts at a multiple of 'align'
+    bytes (padded through the local header's extra field), so it can be used in
+    place from a memory map of the archive.
+    """
+    def __init__(self, path: str, align: int = 0):
+        self.path = path
+        self.align = align
+        self._tmpPath = path + ".tmp"
+        self._file: BinaryIO = open(self._tmpPath, "wb")
+        self._entries: List[ZipEntry] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _writeLocalHeader(self, entry: ZipEntry):
+        if len(self._entries) >= _MAX_ENTRIES or max(entry.compressSize, entry.fileSize, self._file.tell()) > _MAX_SIZE:
+            raise Exception(f"Archive \"{self.path}\" is too large for a zip without zip64 extensions")
+
+        name = entry.name.encode()
+        dosTime, dosDate = _dosDateTime(entry.mtime)
+
+        entry.headerOffset = self._file.tell()
+
+        extra = b""
+        if self.align and entry.method == ZIP_STORED:
+            dataOffset = entry.headerOffset + _LOCAL_HEADER.size + len(name) + 4
+            padding = -dataOffset % self.align
+            extra = struct.pack("<2H", _ALIGNMENT_EXTRA_ID, padding) + bytes(padding)
+
+        self._file.write(_LOCAL_HEADER.pack(
+            _LOCAL_HEADER_SIGNATURE, _ZIP_VERSION, _UTF8_FLAG, entry.method, dosTime, dosDate,
+            entry.crc, entry.compressSize, entry.fileSize, len(name), len(extra)
+        ))
+        self._file.write(name)
+        self._file.write(extra)
+
+        self._entries.append(entry)
+
+    def write(self, entry: ZipEntry, payload: bytes):
+        self._writeLocalHeader(entry)
+        self._file.write(payload)
+
+    def copyFrom(self, entry: ZipEntry, src: BinaryIO, dataOffset: int):
+        self._writeLocalHeader(entry)
+
+        src.seek(dataOffset)
+        remaining = entry.compressSize
+        while remaining:
+            chunk = src.read(min(COPY_BUFFER_SIZE, remaining))
+            if not chunk:
+                raise Exception(f"Unexpected end of archive while copying \"{entry.name}\"")
+            self._file.write(chunk)
+            remaining -= len(chunk)
+
+    def close(self):
+        centralDirOffset = self._file.tell()
+
+        for entry in self._entries:
+            name = entry.name.encode()
+            dosTime, dosDate = _dosDateTime(entry.mtime)
+
+            self._file.write(_CENTRAL_HEADER.pack(
+                _CENTRAL_HEADER_SIGNATURE, _ZIP_VERSION, _ZIP_VERSION, _UTF8_FLAG, entry.method, dosTime, dosDate,
+                entry.crc, entry.compressSize, entry.fileSize, len(name), 0, 0, 0, 0,
+                0o100644 << 16, entry.headerOffset
+            ))
+            self._file.write(name)
+
+        centralDirSize = self._file.tell() - centralDirOffset
+        self._file.write(_END_OF_CENTRAL_DIR.pack(
+            _END_OF_CENTRAL_DIR_SIGNATURE, 0, 0, len(self._entries), len(self._entries),
+            centralDirSize, centralDirOffset, 0
+        ))
+
+        self._file.close()
+        os.replace(self._tmpPath, self.path)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmpPath):
+            os.remove(self._tmpPath)
+
+
+def ReadRawEntries(path: str) -> Dict[str, Tuple[zipfile.ZipInfo, int]]:
+    """
+    Entries of an existing archive as {name: (info, offset of the raw payload)}.
+    """
+    entries = {}
+
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            f.seek(info.header_offset)
+            header = f.read(_LOCAL_HEADER.size)
+            if len(header) != _LOCAL_HEADER.size or header[:4] != _LOCAL_HEADER_SIGNATURE:
+                continue
+
+            nameLength, extraLength = _LOCAL_HEADER.unpack(header)[-2:]
+            entries[info.filename] = (info, info.header_offset + _LOCAL_HEADER.size + nameLength + extraLength)
+
+    return entries
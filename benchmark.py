@@ -0,0 +1,331 @@
+"""
+Measures the speed of builds on generated projects, and compares it with a baseline:
+
+    python -m <package>.benchmark [--modules 50] [--packages 5] [--submodules 10] [--data 100]
+                                  [--standalone] [--baseline bench.json] [--save-baseline]
+
+Every run generates a new project, so the cold build starts without generated sources
+and objects. The machine-wide cache is turned off for the builds. The cold startup of
+the executable is its first run after the build, with the binary in the page cache but
+none of its modules imported before. The warm startup is the median of the next runs.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from typing import Optional, List, Dict, Tuple
+
+from .cache import SHARED_CACHE_SIZE_ENV
+
+
+PACKAGE_NAME = __package__
+PACKAGE_PARENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BUILD_SCRIPT_NAME = "build.py"
+BUILD_DIR_NAME = "build"
+EXECUTABLE_FILE_NAME = "executable.txt"
+
+# Metric, unit, lower is better for all of them
+METRICS = [
+    ("coldBuild", "s"),
+    ("noopBuild", "s"),
+    ("incrementalBuild", "s"),
+    ("peakRss", "MB"),
+    ("binarySize", "KB"),
+    ("coldStartup", "ms"),
+    ("warmStartup", "ms"),
+]
+
+_UNIT_SCALE = {"s": 1, "ms": 1000, "MB": 1 / (1024 * 1024), "KB": 1 / 1024}
+
+_MODULE_CODE = """import math
+
+VALUE_{index} = {index}
+
+
+class Item{index}:
+    def __init__(self, value):
+        self.value = value
+
+    def scaled(self, factor):
+        return Item{index}(self.value * factor)
+
+    def __repr__(self):
+        return f"Item{index}({{self.value}})"
+
+"""
+
+_FUNCTION_CODE = """
+def function{index}_{function}(values, offset={function}):
+    total = 0
+    for value in values:
+        if value % 3 == 0:
+            total += math.isqrt(value + offset)
+        elif value % 3 == 1:
+            total -= value // (offset + 1)
+        else:
+            total ^= value
+    return total
+
+"""
+
+_BUILD_SCRIPT = """import os
+import sys
+
+sys.path.insert(0, {packageParentDir!r})
+
+from {packageName} import Executable, Package, Data, ProcessAll
+
+
+if __name__ == "__main__":
+    executable = Executable("main.py", {resources!r} + [Package([pattern]) for pattern in {packages!r}] +
+                            ([Data("data/*.*")] if {data!r} else []),
+                            standalone={standalone!r})
+
+    ProcessAll(executable, buildDir={buildDir!r}, jobs={jobs!r})
+
+    with open({executableFileName!r}, "w") as f:
+        f.write(os.path.join(executable.buildCmd.build_platlib, executable.name) + executable.compiler.exeExt)
+"""
+
+
+def _moduleCode(index: int, functions: int) -> str:
+    return _MODULE_CODE.format(index=index) + "".join(
+        _FUNCTION_CODE.format(index=index, function=function) for function in range(functions)
+    )
+
+
+def GenerateProject(root: str,
+                    modules: int = 50,
+                    packages: int = 5,
+                    submodules: int = 10,
+                    dataFiles: int = 100,
+                    dataSize: int = 4096,
+                    functions: int = 20,
+                    standalone: bool = False,
+                    jobs: Optional[int] = None):
+    """
+    Write a project of 'modules' top level modules, 'packages' packages of 'submodules'
+    modules each and 'dataFiles' data files of 'dataSize' bytes into 'root', with a
+    build script that builds all of it into one executable. 'main.py' imports every module.
+    """
+    os.makedirs(root, exist_ok=True)
+
+    imports = []
+    for index in range(modules):
+        with open(os.path.join(root, f"mod_{index}.py"), "w") as f:
+            f.write(_moduleCode(index, functions))
+        imports.append(f"mod_{index}")
+
+    for package in range(packages):
+        packageDir = os.path.join(root, f"pkg_{package}")
+        os.makedirs(packageDir, exist_ok=True)
+
+        with open(os.path.join(packageDir, "__init__.py"), "w") as f:
+            f.write(f"PACKAGE = {package}\n")
+        imports.append(f"pkg_{package}")
+
+        for index in range(submodules):
+            with open(os.path.join(packageDir, f"sub_{index}.py"), "w") as f:
+                f.write(_moduleCode(index, functions))
+            imports.append(f"pkg_{package}.sub_{index}")
+
+    if dataFiles:
+        os.makedirs(os.path.join(root, "data"), exist_ok=True)
+        for index in range(dataFiles):
+            with open(os.path.join(root, "data", f"file_{index}.bin"), "wb") as f:
+                f.write(os.urandom(dataSize))
+
+    with open(os.path.join(root, "main.py"), "w") as f:
+        f.write("".join(f"import {name}\n" for name in imports))
+        f.write("\nprint(len(__import__('sys').modules))\n")
+
+    with open(os.path.join(root, BUILD_SCRIPT_NAME), "w") as f:
+        f.write(_BUILD_SCRIPT.format(
+            packageParentDir=PACKAGE_PARENT_DIR,
+            packageName=PACKAGE_NAME,
+            resources=["mod_*.py"] if modules else [],
+            packages=[os.path.join(f"pkg_{package}", "*.py") for package in range(packages)],
+            data=bool(dataFiles),
+            standalone=standalone,
+            buildDir=BUILD_DIR_NAME,
+            jobs=jobs,
+            executableFileName=EXECUTABLE_FILE_NAME
+        ))
+
+
+def _runMeasured(cmd: List[str], cwd: str, logFile: Optional[str] = None) -> Tuple[float, Optional[int]]:
+    """
+    Wall time of 'cmd' and the peak RSS in bytes of it or of any process it waited for,
+    the peak RSS is None where os.wait4() is missing.
+    """
+    env = dict(os.environ)
+    env[SHARED_CACHE_SIZE_ENV] = "0"
+
+    with open(logFile or os.devnull, "a") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            # Kilobytes everywhere but on macOS
+            peakRss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        else:
+            proc.wait()
+            peakRss = None
+
+        duration = time.perf_counter() - start
+
+    if proc.returncode != 0:
+        raise RuntimeError(f"Command {' '.join(cmd)} failed with exit code {proc.returncode}, see \"{logFile}\"")
+
+    return duration, peakRss
+
+
+def _touchModule(root: str):
+    path = os.path.join(root, "mod_0.py") if os.path.isfile(os.path.join(root, "mod_0.py")) else os.path.join(root, "main.py")
+    with open(path, "a") as f:
+        f.write(f"\nCHANGED = {time.time_ns()}\n")
+
+
+def RunBenchmark(root: str, startupRuns: int = 10, **projectOptions) -> Dict[str, Optional[float]]:
+    """
+    Generate a project into the empty directory 'root' (see GenerateProject() for the
+    options) and measure it. Times are in seconds, sizes in bytes.
+    """
+    GenerateProject(root, **projectOptions)
+
+    logFile = os.path.join(root, "build.log")
+    build = [sys.executable, BUILD_SCRIPT_NAME]
+
+    results: Dict[str, Optional[float]] = {}
+
+    results["coldBuild"], peakRss = _runMeasured(build, root, logFile)
+    results["noopBuild"], _ = _runMeasured(build, root, logFile)
+
+    _touchModule(root)
+    results["incrementalBuild"], _ = _runMeasured(build, root, logFile)
+
+    results["peakRss"] = peakRss
+
+    with open(os.path.join(root, EXECUTABLE_FILE_NAME), "r") as f:
+        executable = os.path.join(root, f.read())
+
+    results["binarySize"] = os.path.getsize(executable)
+
+    results["coldStartup"], _ = _runMeasured([executable], os.path.dirname(executable))
+    results["warmStartup"] = statistics.median(
+        _runMeasured([executable], os.path.dirname(executable))[0] for _ in range(max(1, startupRuns))
+    )
+
+    return results
+
+
+def CompareResults(results: Dict[str, Optional[float]],
+                   baseline: Dict[str, Optional[float]],
+                   threshold: float = 10.0) -> List[Dict[str, object]]:
+    """
+    One row per metric with its change against 'baseline' in percent, metrics that grew
+    by more than 'threshold' percent are regressions.
+    """
+    rows = []
+    for metric, unit in METRICS:
+        value = results.get(metric)
+        base = baseline.get(metric)
+
+        change = None
+        if value is not None and base:
+            change = 100 * (value - base) / base
+
+        rows.append({
+            "metric": metric,
+            "unit": unit,
+            "value": value,
+            "baseline": base,
+            "change": change,
+            "regression": change is not None and change > threshold
+        })
+
+    return rows
+
+
+def FormatRows(rows: List[Dict[str, object]]) -> str:
+    def formatValue(value: Optional[float], unit: str) -> str:
+        return "-" if value is None else f"{value * _UNIT_SCALE[unit]:.2f} {unit}"
+
+    lines = [f"{'metric':<18} {'value':>14} {'baseline':>14} {'change':>9}"]
+    for row in rows:
+        change = "" if row["change"] is None else f"{row['change']:+.1f}%"
+        lines.append(
+            f"{row['metric']:<18} {formatValue(row['value'], row['unit']):>14} {formatValue(row['baseline'], row['unit']):>14} "
+            f"{change:>9}" + ("  REGRESSION" if row["regression"] else "")
+        )
+
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark builds of generated projects.")
+    parser.add_argument("--modules", type=int, default=50, help="top level modules (default: 50)")
+    parser.add_argument("--packages", type=int, default=5, help="packages (default: 5)")
+    parser.add_argument("--submodules", type=int, default=10, help="modules in every package (default: 10)")
+    parser.add_argument("--functions", type=int, default=20, help="functions in every module (default: 20)")
+    parser.add_argument("--data", type=int, default=100, help="data files (default: 100)")
+    parser.add_argument("--data-size", type=int, default=4096, help="bytes of every data file (default: 4096)")
+    parser.add_argument("--standalone", action="store_true", help="build a standalone executable")
+    parser.add_argument("--jobs", type=int, default=None, help="build jobs (default: all cores)")
+    parser.add_argument("--startup-runs", type=int, default=10, help="runs of the warm startup (default: 10)")
+    parser.add_argument("--baseline", help="JSON file with the results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results into the baseline file")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent (default: 10)")
+    parser.add_argument("--keep", help="generate the project into this new or empty directory and keep it")
+    args = parser.parse_args(argv)
+
+    projectOptions = {
+        "modules": args.modules,
+        "packages": args.packages,
+        "submodules": args.submodules,
+        "functions": args.functions,
+        "dataFiles": args.data,
+        "dataSize": args.data_size,
+        "standalone": args.standalone,
+        "jobs": args.jobs,
+    }
+
+    if args.keep:
+        if os.path.isdir(args.keep) and os.listdir(args.keep):
+            parser.error(f"--keep directory \"{args.keep}\" is not empty")
+        results = RunBenchmark(args.keep, startupRuns=args.startup_runs, **projectOptions)
+    else:
+        with tempfile.TemporaryDirectory(prefix="pyc-benchmark-") as root:
+            results = RunBenchmark(root, startupRuns=args.startup_runs, **projectOptions)
+
+    baseline = {}
+    if args.baseline and os.path.isfile(args.baseline):
+        with open(args.baseline, "r") as f:
+            stored = json.load(f)
+
+        if stored.get("project") != projectOptions:
+            print(f"Warning: the baseline was measured on another project: {stored.get('project')}")
+        baseline = stored.get("results", {})
+
+    rows = CompareResults(results, baseline, args.threshold)
+    print(FormatRows(rows))
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"project": projectOptions, "results": results}, f, indent=1)
+        print(f"Baseline written to \"{args.baseline}\"")
+
+    elif any(row["regression"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import threading
+import contextlib
+
+from typing import Optional, List, Dict
+
+
+class BuildTrace:
+    """
+    Timeline of the build stages in the Trace Event Format, the file written by write()
+    opens in chrome://tracing and Perfetto. Spans are only recorded between start() and
+    stop(), every span has the process and thread it ran on, and optionally the file it
+    worked on and the number of bytes it produced.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.events: List[dict] = []
+        self._threads: Dict[tuple, str] = {}
+
+    def start(self):
+        with self._lock:
+            self.events = []
+            self._threads = {}
+            self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def add(self,
+            stage: str,
+            startNs: int,
+            endNs: int,
+            file: Optional[str] = None,
+            output: Optional[str] = None,
+            pid: Optional[int] = None,
+            tid: Optional[int] = None,
+            threadName: Optional[str] = None,
+            detail: Optional[str] = None):
+        """
+        Record a span measured with time.perf_counter_ns(), also by another process of
+        the build. The byte count is the size of 'output', 'detail' only names the span.
+        """
+        if not self.enabled:
+            return
+
+        if pid is None:
+            pid = os.getpid()
+
+        if tid is None:
+            tid = threading.get_ident()
+            threadName = threading.current_thread().name
+
+        args = {}
+        if file is not None:
+            args["file"] = file
+
+        size = _fileSize(output)
+        if size is not None:
+            args["bytes"] = size
+
+        event = {
+            "name": " ".join(part for part in [stage, detail or file] if part),
+            "cat": stage,
+            "ph": "X",
+            "ts": startNs / 1000,
+            "dur": (endNs - startNs) / 1000,
+            "pid": pid,
+            "tid": tid,
+            "args": args,
+        }
+
+        with self._lock:
+            self.events.append(event)
+            if threadName is not None:
+                self._threads.setdefault((pid, tid), threadName)
+
+    @contextlib.contextmanager
+    def span(self, stage: str, file: Optional[str] = None, output: Optional[str] = None, detail: Optional[str] = None):
+        """
+        Record the time the block takes as a 'stage' span, the byte count is the size of 'output' afterwards.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        startNs = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(stage, startNs, time.perf_counter_ns(), file=file, output=output, detail=detail)
+
+    def write(self, traceFile: str):
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+
+        for (pid, tid), threadName in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": threadName}})
+
+        os.makedirs(os.path.dirname(traceFile) or ".", exist_ok=True)
+        with open(traceFile, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self, count: int = 5) -> str:
+        """
+        Total time of every stage, and the slowest spans that worked on a file.
+        """
+        with self._lock:
+            events = list(self.events)
+
+        if not events:
+            return ""
+
+        stages: Dict[str, List[float]] = {}
+        for event in events:
+            total = stages.setdefault(event["cat"], [0.0, 0, 0])
+            total[0] += event["dur"]
+            total[1] += 1
+            total[2] += event["args"].get("bytes", 0)
+
+        lines = ["Slowest stages:"]
+        for stage, (duration, spans, size) in sorted(stages.items(), key=lambda item: -item[1][0])[:count]:
+            lines.append(f"    {stage}: {duration / 1e6:.2f}s in {spans} spans, {size} bytes")
+
+        files = sorted((event for event in events if "file" in event["args"]), key=lambda event: -event["dur"])
+        if files:
+            lines.append("Slowest files:")
+            for event in files[:count]:
+                lines.append(f"    {event['cat']} {event['args']['file']}: {event['dur'] / 1e6:.2f}s")
+
+        return "\n".join(lines)
+
+
+def _fileSize(path: Optional[str]) -> Optional[int]:
+    if path is None:
+        return None
+
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+BUILD_TRACE = BuildTrace()
@@ -0,0 +1,393 @@
+import os
+import json
+import time
+import errno
+import shutil
+import hashlib
+import tempfile
+import threading
+import contextlib
+
+from typing import Optional, Dict, List
+
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+_LOCK_RETRY_DELAY = 0.1
+
+
+def HashFile(path: str) -> str:
+    hasher = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+_stampedHashes: Dict[str, tuple] = {}
+
+
+def HashFileStamped(path: str) -> Optional[str]:
+    """
+    HashFile() remembered by path, size and modification time, so the headers shared by
+    many objects are read once. A changed file replaces its entry. None if the file is gone.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    stamped = _stampedHashes.get(path)
+    if stamped is None or stamped[0] != stamp:
+        stamped = _stampedHashes[path] = (stamp, HashFile(path))
+
+    return stamped[1]
+
+
+def HashKey(*parts) -> str:
+    hasher = hashlib.sha256()
+
+    for part in parts:
+        hasher.update(repr(part).encode())
+        hasher.update(b"\0")
+
+    return hasher.hexdigest()
+
+
+class CacheStats:
+    """
+    Hit/miss counters of all caches, per kind of entry.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    def record(self, kind: str, hit: bool):
+        with self._lock:
+            counters = self.hits if hit else self.misses
+            counters[kind] = counters.get(kind, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.hits.clear()
+            self.misses.clear()
+
+    def summary(self) -> str:
+        lines = []
+        for kind in sorted(set(self.hits) | set(self.misses)):
+            hits = self.hits.get(kind, 0)
+            misses = self.misses.get(kind, 0)
+            lines.append(f"Cache {kind}: {hits} hits, {misses} misses ({100 * hits / (hits + misses):.1f}% hit rate)")
+
+        return "\n".join(lines)
+
+
+CACHE_STATS = CacheStats()
+
+
+class BuildCache:
+    """
+    Content-addressed file store: 'put' saves a copy of a file under a key,
+    'get' copies it back out.
+    """
+    def __init__(self, cacheDir: str):
+        self.cacheDir = cacheDir
+
+    def _entryPath(self, key: str) -> str:
+        return os.path.join(self.cacheDir, key[:2], key)
+
+    def _copyOut(self, entryPath: str, outputFile: str) -> bool:
+        outputDir = os.path.dirname(outputFile)
+        if outputDir:
+            os.makedirs(outputDir, exist_ok=True)
+
+        try:
+            shutil.copyfile(entryPath, outputFile)
+        except FileNotFoundError:
+            # Evicted by another build in the meantime
+            return False
+
+        return True
+
+    def get(self, key: str, outputFile: str, kind: str = "file") -> bool:
+        entryPath = self._entryPath(key)
+        hit = os.path.isfile(entryPath) and self._copyOut(entryPath, outputFile)
+
+        CACHE_STATS.record(kind, hit)
+        return hit
+
+    def put(self, key: str, inputFile: str) -> int:
+        entryPath = self._entryPath(key)
+        entryDir = os.path.dirname(entryPath)
+        os.makedirs(entryDir, exist_ok=True)
+
+        # Write next to the entry and rename, readers never see a partial file
+        fd, tmpPath = tempfile.mkstemp(dir=entryDir, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(inputFile, tmpPath)
+            os.replace(tmpPath, entryPath)
+        except BaseException:
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+            raise
+
+        return os.path.getsize(entryPath)
+
+
+@contextlib.contextmanager
+def _InterProcessLock(path: str):
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError as e:
+                    # LK_LOCK gives up after 10 seconds with EDEADLOCK, anything else is a real error
+                    if e.errno != errno.EDEADLOCK:
+                        raise
+                    time.sleep(_LOCK_RETRY_DELAY)
+
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class SharedCache(BuildCache):
+    """
+    Machine-wide BuildCache shared by every build directory and every parallel build.
+
+    Entries are written atomically, a hit refreshes the entry's mtime, and once the
+    store grows past 'maxSize' bytes the least recently used entries are evicted
+    under an inter-process lock.
+    """
+    _evictRatio = 0.9
+
+    def __init__(self, cacheDir: str, maxSize: int):
+        super().__init__(cacheDir)
+        self.maxSize = maxSize
+
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _entries(self):
+        entries = []
+        for bucket in os.scandir(self.cacheDir):
+            if not bucket.is_dir():
+                continue
+
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        return entries
+
+    def get(self, key: str, outputFile: str, kind: str = "file") -> bool:
+        hit = super().get(key, outputFile, kind)
+        if hit:
+            try:
+                os.utime(self._entryPath(key))
+            except OSError:
+                pass
+
+        return hit
+
+    def put(self, key: str, inputFile: str) -> int:
+        size = super().put(key, inputFile)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entrySize for _, entrySize, _ in self._entries())
+            else:
+                self._size += size
+
+            if self._size > self.maxSize:
+                self.evict()
+
+        return size
+
+    def evict(self):
+        with _InterProcessLock(os.path.join(self.cacheDir, "lock")):
+            entries = sorted(self._entries())
+            size = sum(entrySize for _, entrySize, _ in entries)
+
+            for _, entrySize, path in entries:
+                if size <= self.maxSize * self._evictRatio:
+                    break
+
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Still open by a reader on Windows, or already gone
+                    continue
+
+                size -= entrySize
+
+            self._size = size
+
+
+SHARED_CACHE_DIR_ENV = "PYTHON_COMPILER_CACHE_DIR"
+SHARED_CACHE_SIZE_ENV = "PYTHON_COMPILER_CACHE_SIZE"
+
+DEFAULT_SHARED_CACHE_SIZE = 5 * 1024 ** 3
+
+_SIZE_SUFFIXES = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def _parseSize(size: str) -> int:
+    size = size.strip().upper().rstrip("B")
+    if size and size[-1] in _SIZE_SUFFIXES:
+        return int(float(size[:-1]) * _SIZE_SUFFIXES[size[-1]])
+    return int(size)
+
+
+def _defaultSharedCacheDir() -> str:
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+
+    return os.path.join(base, "python-compiler")
+
+
+_sharedCache: Optional[SharedCache] = None
+_sharedCacheLock = threading.Lock()
+
+
+def GetSharedCache() -> Optional[SharedCache]:
+    """
+    The machine-wide cache, configured by the PYTHON_COMPILER_CACHE_DIR and
+    PYTHON_COMPILER_CACHE_SIZE ("500M", "5G", ...) environment variables.
+    A size of 0 disables it and None is returned.
+    """
+    global _sharedCache
+
+    with _sharedCacheLock:
+        cacheDir = os.environ.get(SHARED_CACHE_DIR_ENV) or _defaultSharedCacheDir()
+        maxSize = _parseSize(os.environ.get(SHARED_CACHE_SIZE_ENV) or str(DEFAULT_SHARED_CACHE_SIZE))
+
+        if maxSize <= 0:
+            return None
+
+        if _sharedCache is None or _sharedCache.cacheDir != cacheDir or _sharedCache.maxSize != maxSize:
+            os.makedirs(cacheDir, exist_ok=True)
+            _sharedCache = SharedCache(cacheDir, maxSize)
+
+        return _sharedCache
+
+
+def HeaderPath(path: str) -> str:
+    """
+    Headers inside the working directory are kept relative to it, so that the same
+    sources built from another checkout look up their own headers.
+    """
+    relPath = os.path.relpath(os.path.abspath(path))
+    if relPath == os.pardir or relPath.startswith(os.pardir + os.sep) or os.path.isabs(relPath):
+        return os.path.abspath(path)
+
+    return relPath
+
+
+def HeadersKey(commandKey: str, headers: List[str]) -> Optional[str]:
+    """
+    Key of an object built by the command of 'commandKey' that included 'headers' (see
+    HeaderPath()), from their current content. None if one of them is gone.
+    """
+    hashes = []
+    for header in headers:
+        headerHash = HashFileStamped(header)
+        if headerHash is None:
+            return None
+        hashes.append((header, headerHash))
+
+    return HashKey(commandKey, hashes)
+
+
+class ObjectManifest:
+    """
+    JSON file in the build directory that maps every object file to the key it was
+    built with (hash of the source, compiler command and include dirs) and the headers
+    the source included.
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries = self._load()
+        self._changes: Dict[str, Optional[dict]] = {}
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def isUpToDate(self, objectFile: str, commandKey: str) -> bool:
+        """
+        Same command and every header unchanged.
+        """
+        entry = self._entries.get(objectFile)
+        if not isinstance(entry, dict) or entry.get("command") != commandKey:
+            return False
+
+        return HeadersKey(commandKey, entry["headers"]) == entry["key"] and os.path.isfile(objectFile)
+
+    def update(self, objectFile: str, commandKey: str, headers: List[str]):
+        entry = {"command": commandKey, "headers": headers, "key": HeadersKey(commandKey, headers)}
+        self._entries[objectFile] = entry
+        self._changes[objectFile] = entry
+
+    def discard(self, objectFile: str):
+        self._entries.pop(objectFile, None)
+        self._changes[objectFile] = None
+
+    def save(self):
+        if not self._changes:
+            return
+
+        with self._lock:
+            # Other compilers may share this build directory, merge into the latest state
+            entries = self._load()
+            for objectFile, key in self._changes.items():
+                if key is None:
+                    entries.pop(objectFile, None)
+                else:
+                    entries[objectFile] = key
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+            tmpPath = self.path + ".tmp"
+            with open(tmpPath, "w") as f:
+                json.dump(entries, f, indent=1, sort_keys=True)
+            os.replace(tmpPath, self.path)
+
+        self._entries = entries
+        self._changes.clear()
@@ -0,0 +1,138 @@
+import io
+import os
+
+from typing import Optional, List, Dict, Iterable
+
+
+class CodeTransform:
+    """
+    One step of a CodePipeline. start() is called before every pass, line() gets every
+    line of the code, with its line break, and returns the text that replaces it, end()
+    returns the text added after the last line.
+    """
+    def start(self):
+        pass
+
+    def line(self, line: str) -> str:
+        return line
+
+    def end(self) -> str:
+        return ""
+
+
+class ReplaceLines(CodeTransform):
+    """
+    Replace every occurrence of the keys of 'replacements' with their values.
+    The keys must not span several lines.
+    """
+    def __init__(self, replacements: Dict[str, str]):
+        self.replacements = replacements
+
+    def line(self, line: str) -> str:
+        for old, new in self.replacements.items():
+            if old in line:
+                line = line.replace(old, new)
+
+        return line
+
+
+class InsertAfter(CodeTransform):
+    """
+    Insert 'code' after the first line that contains 'marker' and follows a line that
+    contains 'after' (or the line itself). 'forbidden' lines raise 'error', and so does
+    a code without the place to insert at.
+    """
+    def __init__(self, code: str, marker: str, after: Optional[str] = None,
+                 forbidden: Optional[str] = None, error: str = "Insert position not found"):
+        self.code = code
+        self.marker = marker
+        self.after = after
+        self.forbidden = forbidden
+        self.error = error
+
+        self.start()
+
+    def start(self):
+        self._found = self.after is None
+        self._inserted = False
+
+    def line(self, line: str) -> str:
+        if self.forbidden is not None and self.forbidden in line:
+            raise Exception(self.error)
+
+        if self._inserted:
+            return line
+
+        if not self._found and self.after in line:
+            self._found = True
+
+        if self._found and self.marker in line:
+            self._inserted = True
+            return line + self.code
+
+        return line
+
+    def end(self) -> str:
+        if not self._inserted:
+            raise Exception(self.error)
+
+        return ""
+
+
+class AppendCode(CodeTransform):
+    def __init__(self, code: str):
+        self.code = code
+
+    def end(self) -> str:
+        return self.code
+
+
+class CodePipeline:
+    """
+    Transforms registered once and applied to the code in a single pass, line by line.
+    Only the current line is kept in memory, whatever the size of the code.
+    """
+    def __init__(self, transforms: Optional[Iterable[CodeTransform]] = None):
+        self.transforms: List[CodeTransform] = list(transforms or [])
+
+    def add(self, transform: CodeTransform) -> "CodePipeline":
+        self.transforms.append(transform)
+        return self
+
+    def _process(self, lines: Iterable[str], write):
+        for transform in self.transforms:
+            transform.start()
+
+        for line in lines:
+            for transform in self.transforms:
+                line = transform.line(line)
+            write(line)
+
+        for index, transform in enumerate(self.transforms):
+            code = transform.end()
+            for nextTransform in self.transforms[index + 1:]:
+                code = nextTransform.line(code) if code else code
+            write(code)
+
+    def apply(self, inputFile: str, outputFile: Optional[str] = None):
+        """
+        Rewrite 'inputFile' into 'outputFile' (default: in place), with one read and one write.
+        """
+        if outputFile is None:
+            outputFile = inputFile
+
+        tmpFile = outputFile + ".tmp"
+        try:
+            with open(inputFile, "r") as src, open(tmpFile, "w") as dst:
+                self._process(src, dst.write)
+            os.replace(tmpFile, outputFile)
+
+        except BaseException:
+            if os.path.exists(tmpFile):
+                os.remove(tmpFile)
+            raise
+
+    def transform(self, code: str) -> str:
+        output = io.StringIO()
+        self._process(io.StringIO(code), output.write)
+        return output.getvalue()
@@ -1,14 +1,25 @@
 import os
 import sys
+import json
+import shutil
+import sysconfig
+import subprocess
 
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Set, Callable, Tuple
 
-from distutils.ccompiler import new_compiler
-from distutils.dist import Distribution
-from distutils.command.build import build
-
-from .resources import PythonFile, CythonFile, CFile, ExecResourceFile, DataFile, ResourcesFromFileName
+from .resources import PythonFile, CythonFile, CFile, ExecResourceFile, DataFile, ResourcesFromFileName, ClearDirectoryCache
+from .resources import CythonizeResource, CythonizeResources, CythonizePool
 from .deps import MakeDeps
+from .toolchain import NewCompiler, JobSlots, CompileError, PROFILE_GENERATE, PROFILE_USE
+from .toolchain import BuildProfile, GetBuildProfile
+from .scheduler import FindDependencies, RunGraph
+from .cache import BuildCache, ObjectManifest, GetSharedCache, CACHE_STATS, HashFile, HashKey
+from .buildtrace import BUILD_TRACE
+from .lazyimports import LazyImports
+from .unity import WriteUnitySources, UNITY_DIR_NAME
+from .datasync import SyncFiles, SYNC_COPY
+from .dataarchive import WriteDataArchive, AppendDataArchive, DATA_ARCHIVE_APPEND, DATA_ARCHIVE_FILE
+from .dataarchive import DATA_ARCHIVE_EXT, RUNTIME_MODULE_NAME, RUNTIME_MODULE_FILE
 
 
 _TCompileRes = Union[PythonFile, CythonFile, CFile]
@@ -16,32 +27,55 @@ _TDataFiles = Union[DataFile, List['_TDataFiles']]
 
 
 PYTHON_DIR = sys.base_prefix
-PYTHON_INCLUDE_DIR = os.path.join(PYTHON_DIR, "include")
-PYTHON_LIBS_DIR = os.path.join(PYTHON_DIR, "libs")
+PYTHON_INCLUDE_DIR = sysconfig.get_path("include")
+if os.name == "nt":
+    PYTHON_LIBS_DIR = os.path.join(PYTHON_DIR, "libs")
+else:
+    PYTHON_LIBS_DIR = sysconfig.get_config_var("LIBDIR") or os.path.join(PYTHON_DIR, "lib")
 
 
 def _extFileName(extName: str):
-    from distutils.sysconfig import get_config_var
     ext_path = extName.split('.')
-    ext_suffix = get_config_var('EXT_SUFFIX')
+    ext_suffix = sysconfig.get_config_var('EXT_SUFFIX')
     return os.path.join(*ext_path) + ext_suffix
 
 
-def _getBuildCmd(buildDir: Optional[str] = None) -> build:
-    buildCmd = build(Distribution())
-    if buildDir is not None:
-        buildCmd.build_base = buildDir
+class _BuildDirs:
+    """
+    Same layout as the distutils 'build' command: 'build_platlib' for artifacts,
+    'build_temp' for intermediate objects.
+    """
+    def __init__(self, buildDir: Optional[str] = None):
+        if buildDir is None:
+            buildDir = "build"
+
+        platSpecifier = f".{sysconfig.get_platform()}-{sys.implementation.cache_tag}"
+
+        self.build_base = buildDir
+        self.build_platlib = os.path.join(buildDir, "lib" + platSpecifier)
+        self.build_temp = os.path.join(buildDir, "temp" + platSpecifier)
 
-    buildCmd.finalize_options()
 
-    buildCmd.build_temp = os.path.join(buildCmd.build_temp, "Release")
+def _getBuildCmd(buildDir: Optional[str] = None, buildProfile: Union[str, BuildProfile, None] = None) -> _BuildDirs:
+    buildCmd = _BuildDirs(buildDir)
+
+    buildCmd.build_temp = os.path.join(buildCmd.build_temp, GetBuildProfile(buildProfile).tempDirName)
 
     return buildCmd
 
 
+OBJECT_MANIFEST_FILE_NAME = "objects.json"
+IMPORTS_CACHE_FILE_NAME = "imports.json"
+FROZEN_MODULES_FILE_NAME = "frozen_modules.c"
+PGO_DIR_NAME = "pgo"
+PGO_STAMP_FILE_NAME = "pgo.json"
+DATA_SYNC_DIR_NAME = "data"
+
+
 class BaseProcessor:
-    def __init__(self, buildDir: Optional[str] = None):
-        self.buildCmd = _getBuildCmd(buildDir)
+    def __init__(self, buildDir: Optional[str] = None, buildProfile: Union[str, BuildProfile, None] = None):
+        self._buildProfile = buildProfile
+        self.buildCmd = _getBuildCmd(buildDir, buildProfile)
 
     @property
     def buildDir(self) -> str:
@@ -49,12 +83,48 @@ class BaseProcessor:
 
     @buildDir.setter
     def buildDir(self, buildDir: str):
-        self.buildCmd = _getBuildCmd(buildDir)
+        self.buildCmd = _getBuildCmd(buildDir, self._buildProfile)
+
+    @property
+    def buildProfile(self) -> Union[str, BuildProfile, None]:
+        """
+        Name of the build profile (see toolchain.BUILD_PROFILES) or a BuildProfile,
+        None for the default one. Every profile has its own temp dir.
+        """
+        return self._buildProfile
+
+    @buildProfile.setter
+    def buildProfile(self, buildProfile: Union[str, BuildProfile, None]):
+        self._buildProfile = buildProfile
+        self.buildCmd = _getBuildCmd(self.buildCmd.build_base, buildProfile)
+
+    def __repr__(self) -> str:
+        return f"<{self.__module__}.{self.__class__.__name__} processor>"
+
+    def getInputs(self) -> Set[str]:
+        """
+        Files the processor reads, used by ProcessAll to order processors.
+        """
+        return set()
+
+    def getOutputs(self) -> Set[str]:
+        """
+        Files and directories the processor writes, used by ProcessAll to order processors.
+        """
+        return set()
 
     def process(self):
         pass
 
-    def clean(self):
+    def reset(self, changedFiles: Optional[Set[str]] = None):
+        """
+        Prepare the next process() after 'changedFiles' changed, None for any file. The
+        paths are normalized with os.path.normcase(os.path.abspath()). Used by watch.Watch()
+        to build processors again.
+        """
+        pass
+
+    def clean(self, keepObjects: bool = False):
         pass
 
 
@@ -62,8 +132,18 @@ class BaseCompiler(BaseProcessor):
     def __init__(self,
                  includeDirs: Optional[List[str]] = None,
                  libraryDirs: Optional[List[str]] = None,
-                 buildDir: Optional[str] = None):
-        super().__init__(buildDir=buildDir)
+                 buildDir: Optional[str] = None,
+                 jobs: Optional[int] = None,
+                 pgoTraining: Optional[Union[str, List[str]]] = None,
+                 buildProfile: Union[str, BuildProfile, None] = None):
+        """
+        With 'pgoTraining' the processor is built with profile-guided optimization: an
+        instrumented build is run by this command, a shell command line or an argument
+        list where '{output}' stands for the built file, and the profiles it writes are
+        used to build again. The profiles are kept in the build dir and reused until
+        the sources or the command change.
+        """
+        super().__init__(buildDir=buildDir, buildProfile=buildProfile)
 
         if includeDirs is None:
             includeDirs = []
@@ -71,7 +151,7 @@ class BaseCompiler(BaseProcessor):
         if libraryDirs is None:
             libraryDirs = []
 
-        self.compiler = new_compiler()
+        self.compiler = NewCompiler()
 
         self.incDirs = [PYTHON_INCLUDE_DIR]
         self.libDirs = [PYTHON_LIBS_DIR]
@@ -79,7 +159,19 @@ class BaseCompiler(BaseProcessor):
         self.incDirs.extend(includeDirs)
         self.libDirs.extend(libraryDirs)
 
+        self.jobs = jobs
+        self.pgoTraining = pgoTraining
+
         self._cache = []
+        self._objectCache = []
+
+    @property
+    def cythonCache(self) -> BuildCache:
+        return GetSharedCache() or BuildCache(os.path.join(self.buildDir, "cython_cache"))
+
+    @property
+    def objectManifest(self) -> ObjectManifest:
+        return ObjectManifest(os.path.join(self.buildCmd.build_temp, OBJECT_MANIFEST_FILE_NAME))
 
     def addIncludeDir(self, includeDir: str):
         self.incDirs.append(includeDir)
@@ -91,43 +183,143 @@ class BaseCompiler(BaseProcessor):
         if exportSymbols is None:
             exportSymbols = []
 
-        self.compiler.set_include_dirs(self.incDirs)
-        self.compiler.set_library_dirs(self.libDirs)
+        outputPath = os.path.join(self.buildCmd.build_platlib, outputFile)
 
-        objects = self.compiler.compile(sources, output_dir=self.buildCmd.build_temp)
-
-        self.compiler.link_shared_object(
-            objects=objects,
-            output_filename=os.path.join(self.buildCmd.build_platlib, outputFile),
-            target_lang="c++",
-            build_temp=self.buildCmd.build_base,
-            export_symbols=exportSymbols
-        )
+        def link(objects: List[str]):
+            self.compiler.linkSharedObject(
+                objects=objects,
+                outputFile=outputPath,
+                libraryDirs=self.libDirs,
+                exportSymbols=exportSymbols,
+                buildTemp=self.buildCmd.build_base
+            )
 
-        self._cache.extend(sources)
-        self._cache.extend(objects)
+        self._build(sources, outputPath, link)
 
     def _compileExec(self, sources: List[str], outputFileName: str):
-        self.compiler.set_include_dirs(self.incDirs)
-        self.compiler.set_library_dirs(self.libDirs)
+        outputPath = os.path.join(self.buildCmd.build_platlib, outputFileName)
 
-        objects = self.compiler.compile(sources, output_dir=self.buildCmd.build_temp)
+        def link(objects: List[str]):
+            self.compiler.linkExecutable(
+                objects=objects,
+                outputFile=outputPath,
+                libraryDirs=self.libDirs
+            )
 
-        self.compiler.link_executable(
-            objects=objects,
-            output_progname=os.path.join(self.buildCmd.build_platlib, outputFileName),
-            target_lang="c++"
-        )
+        self._build(sources, outputPath + self.compiler.exeExt, link)
 
-        self._cache.extend(sources)
-        self._cache.extend(objects)
+    def _compileObjects(self, sources: List[str]) -> List[str]:
+        return self.compiler.compile(sources,
+                                     outputDir=self.buildCmd.build_temp,
+                                     includeDirs=self.incDirs,
+                                     manifest=self.objectManifest,
+                                     cache=GetSharedCache())
+
+    def _build(self, sources: List[str], outputPath: str, link: Callable[[List[str]], None]):
+        self.compiler.jobs = self.jobs
+        self.compiler.buildProfile = GetBuildProfile(self.buildProfile)
 
-    def clean(self):
+        try:
+            if self.pgoTraining is not None:
+                self._trainProfile(sources, outputPath, link)
+
+            objects = self._compileObjects(sources)
+            link(objects)
+
+        finally:
+            self.compiler.setProfile(None)
+
+        self._cache.extend(sources)
+        self._objectCache.extend(objects)
+
+    def _trainProfile(self, sources: List[str], outputPath: str, link: Callable[[List[str]], None]):
+        """
+        Instrumented build and training run, skipped while the profile of the same sources
+        and training command is still in the build dir. Leaves the compiler set up to use it.
+        """
+        profileDir = os.path.join(self.buildCmd.build_temp, PGO_DIR_NAME,
+                                  os.path.relpath(outputPath, self.buildCmd.build_platlib))
+        stampFile = os.path.join(profileDir, PGO_STAMP_FILE_NAME)
+
+        key = HashKey("pgo", [HashFile(source) for source in sources], self.incDirs, self.pgoTraining)
+
+        stamp = {}
+        if os.path.isfile(stampFile):
+            with open(stampFile, "r") as f:
+                stamp = json.load(f)
+
+        profile = stamp.get("profile")
+        if stamp.get("key") == key and self.compiler.hasProfile(profile):
+            print(f"PGO {outputPath}: sources unchanged, reuse profile \"{profile}\"")
+            self.compiler.setProfile(PROFILE_USE, profile)
+            return
+
+        shutil.rmtree(profileDir, ignore_errors=True)
+        os.makedirs(profileDir)
+
+        print(f"PGO {outputPath}: instrumented build")
+        self.compiler.setProfile(PROFILE_GENERATE, os.path.abspath(profileDir))
+        link(self._compileObjects(sources))
+
+        with BUILD_TRACE.span("pgo training", outputPath):
+            self._runTraining(outputPath)
+
+        profile = self.compiler.mergeProfiles(os.path.abspath(profileDir))
+        if not self.compiler.hasProfile(profile):
+            raise CompileError(f"PGO {outputPath}: the training run wrote no profiles into \"{profileDir}\"")
+
+        with open(stampFile, "w") as f:
+            json.dump({"key": key, "profile": profile}, f, indent=1)
+
+        self.compiler.setProfile(PROFILE_USE, profile)
+
+    def _runTraining(self, outputPath: str):
+        env = dict(os.environ)
+        pythonPath = [os.path.abspath(self.buildCmd.build_platlib)]
+        if env.get("PYTHONPATH"):
+            pythonPath.append(env["PYTHONPATH"])
+        env["PYTHONPATH"] = os.pathsep.join(pythonPath)
+
+        if isinstance(self.pgoTraining, str):
+            cmd = self.pgoTraining.replace("{output}", outputPath)
+        else:
+            cmd = [arg.replace("{output}", outputPath) for arg in self.pgoTraining]
+
+        print(f"PGO {outputPath}: training run {cmd}")
+        result = subprocess.run(cmd, shell=isinstance(cmd, str), env=env)
+        if result.returncode != 0:
+            raise CompileError(f"PGO {outputPath}: training command {cmd} failed with exit code {result.returncode}")
+
+    def _getCythonizeResources(self) -> List[CythonizeResource]:
+        return [resource for resource in self.resources if isinstance(resource, CythonizeResource)]
+
+    def reset(self, changedFiles: Optional[Set[str]] = None):
+        """
+        Only the changed sources are cythonized again, the '.cpp' of the others are still
+        up to date and so are their objects.
+        """
+        for resource in self._getCythonizeResources():
+            if changedFiles is None or os.path.normcase(os.path.abspath(resource.inputFile)) in changedFiles:
+                resource.reset()
+
+    def clean(self, keepObjects: bool = False):
         for file in self._cache:
             if os.path.exists(file):
                 print(f"Remove {file}")
                 os.remove(file)
 
+        if keepObjects:
+            return
+
+        manifest = self.objectManifest
+        for file in self._objectCache:
+            manifest.discard(file)
+            if os.path.exists(file):
+                print(f"Remove {file}")
+                os.remove(file)
+
+        manifest.save()
+
 
 class Data(BaseProcessor):
     data: List[DataFile]
@@ -135,23 +327,101 @@ class Data(BaseProcessor):
     def __init__(self,
                  data: Union[str, List[str], DataFile, List[DataFile]],
                  homePath: Optional[str] = None,
-                 buildDir: Optional[str] = None):
-
+                 buildDir: Optional[str] = None,
+                 mode: str = SYNC_COPY,
+                 checkHash: bool = True,
+                 jobs: Optional[int] = None,
+                 archive: Optional[str] = None,
+                 exclude: Optional[List[str]] = None):
+        """
+        'data' are file names or patterns, see ResourcesFromFileName(), files matching
+        'exclude' are left out.
+
+        The files are synced into the build: unchanged ones are skipped, changed ones are
+        copied on 'jobs' threads ('mode' is SYNC_COPY, SYNC_HARDLINK or SYNC_REFLINK), and
+        files a previous build of the same data copied but that are gone now are removed.
+
+        With 'archive' the files are packed into that data archive in the build instead,
+        read them with pycdata.Open().
+        """
         super().__init__(buildDir=buildDir)
 
         if isinstance(data, str) or isinstance(data, DataFile):
             data = [data]
 
+        self.mode = mode
+        self.checkHash = checkHash
+        self.jobs = jobs
+        self.archive = archive
+
+        # Identifies the synced files of this processor from one build to the next
+        self._syncKey = HashKey("data", homePath, [
+            _data.inputFilePath if isinstance(_data, DataFile) else _data for _data in data
+        ] + [f"!{pattern}" for pattern in exclude or []])
+
         self.data = []
         for _data in data:
             if isinstance(_data, DataFile):
                 self.data.append(_data)
             elif isinstance(_data, str):
-                self.data.extend(ResourcesFromFileName(_data, clone=True, homePath=homePath))
+                self.data.extend(ResourcesFromFileName(_data, clone=True, homePath=homePath, exclude=exclude))
+
+    def __repr__(self) -> str:
+        return f"<{self.__module__}.{self.__class__.__name__} processor: (files={len(self.data)})>"
+
+    def getInputs(self) -> Set[str]:
+        return {data.inputFilePath for data in self.data}
+
+    def getOutputs(self) -> Set[str]:
+        if self.archive is not None:
+            return {os.path.join(self.buildCmd.build_platlib, self.archive)}
+
+        return {data.getOutputFile(self.buildCmd.build_platlib) for data in self.data}
+
+    def getArchiveFiles(self) -> List[Tuple[str, str]]:
+        return [(data.inputFile, data.inputFilePath) for data in self.data]
 
     def process(self):
-        for data in self.data:
-            data.clone(self.buildCmd.build_platlib)
+        if self.archive is not None:
+            WriteDataArchive(self.getArchiveFiles(),
+                             os.path.join(self.buildCmd.build_platlib, self.archive),
+                             stampFile=os.path.join(self.buildCmd.build_temp, DATA_SYNC_DIR_NAME,
+                                                    self._syncKey + DATA_ARCHIVE_EXT + ".json"))
+            return
+
+        stats = SyncFiles(
+            [(data.inputFilePath, data.getOutputFile(self.buildCmd.build_platlib)) for data in self.data],
+            manifestFile=os.path.join(self.buildCmd.build_temp, DATA_SYNC_DIR_NAME, self._syncKey + ".json"),
+            mode=self.mode,
+            checkHash=self.checkHash,
+            jobs=self.jobs
+        )
+
+        print(f"Sync {len(self.data)} data files into {self.buildCmd.build_platlib}: "
+              f"{stats['copied']} copied, {stats['unchanged']} unchanged, {stats['removed']} removed")
+
+
+def _setLazyImports(resources: list, lazyImports: Optional[LazyImports]):
+    """
+    Resources configured on their own keep their setting.
+    """
+    if lazyImports is None:
+        return
+
+    for resource in resources:
+        if isinstance(resource, CythonizeResource) and resource.lazyImports is None:
+            resource.lazyImports = lazyImports
+
+
+def _packageSubmodules(initResource: _TCompileRes, resources: list) -> Optional[List[str]]:
+    if not initResource.fullName.endswith("__init__"):
+        return None
+
+    return [
+        resource.name.split(".")[-1] for resource in resources
+        if resource is not initResource and isinstance(resource, (PythonFile, CythonFile, CFile))
+        and resource.name.rpartition(".")[0] == initResource.name
+    ]
 
 
 class Module(BaseCompiler):
@@ -163,9 +433,18 @@ class Module(BaseCompiler):
                  package: Optional[bool] = False,
                  includeDirs: Optional[List[str]] = None,
                  libraryDirs: Optional[List[str]] = None,
-                 buildDir: Optional[str] = None):
-
-        super().__init__(includeDirs=includeDirs, libraryDirs=libraryDirs, buildDir=buildDir)
+                 buildDir: Optional[str] = None,
+                 jobs: Optional[int] = None,
+                 lazyImports: Optional[LazyImports] = None,
+                 pgoTraining: Optional[Union[str, List[str]]] = None,
+                 unityBatchSize: Optional[int] = None,
+                 buildProfile: Union[str, BuildProfile, None] = None):
+        """
+        With 'unityBatchSize' the generated sources are compiled in units of up to that
+        many modules, see unity.GetUnityChunkCode().
+        """
+        super().__init__(includeDirs=includeDirs, libraryDirs=libraryDirs, buildDir=buildDir, jobs=jobs,
+                         pgoTraining=pgoTraining, buildProfile=buildProfile)
 
         if isinstance(resources, str):
             resources = [resources]
@@ -181,6 +460,8 @@ class Module(BaseCompiler):
                 self.resources.append(resource)
 
         self.package = package
+        self.unityBatchSize = unityBatchSize
+        _setLazyImports(self.resources, lazyImports)
 
         if self.package:
             self.name = self.resources[0].name
@@ -190,17 +471,46 @@ class Module(BaseCompiler):
         self.moduleFileName = _extFileName(self.name.split(".")[-1])
         self.moduleFilePath = os.path.join(*self.name.split(".")[:-1], self.moduleFileName)
 
+    def __repr__(self) -> str:
+        return f"<{self.__module__}.{self.__class__.__name__} processor: (name=\"{self.name}\")>"
+
+    def getInputs(self) -> Set[str]:
+        return {resource.inputFile for resource in self.resources}
+
+    def getOutputs(self) -> Set[str]:
+        outputs = {os.path.join(self.buildCmd.build_platlib, self.moduleFilePath)}
+        outputs.update(resource.outputFile for resource in self.resources if isinstance(resource, CythonizeResource))
+        return outputs
+
+    def _onCythonized(self, resource: Union[PythonFile, CythonFile]):
+        if self.package:
+            resource.freezePackage(_packageSubmodules(resource, self.resources))
+
     def process(self):
         sources: List[str] = []
 
+        CythonizeResources(
+            [(resource, self.package) for resource in self.resources if isinstance(resource, (PythonFile, CythonFile))],
+            jobs=self.jobs,
+            onCythonized=self._onCythonized,
+            cache=self.cythonCache,
+            buildTemp=self.buildCmd.build_temp
+        )
+
         for resource in self.resources:
             if isinstance(resource, (PythonFile, CythonFile)):
-                resource.cythonize(package=self.package)
-                if self.package:
-                    resource.freezePackage()
                 sources.append(resource.outputFile)
 
-            elif isinstance(resource, CFile):
+        if self.unityBatchSize and len(sources) > 1:
+            units = WriteUnitySources(sources,
+                                      os.path.join(self.buildCmd.build_temp, UNITY_DIR_NAME),
+                                      self.name.replace(".", "_"),
+                                      self.unityBatchSize)
+            print(f"Unity build of {self.name}: {len(sources)} modules in {len(units)} units")
+            sources = [unitFile for unitFile, _ in units]
+
+        for resource in self.resources:
+            if isinstance(resource, CFile):
                 sources.append(resource.inputFile)
 
         exportSymbols = []
@@ -220,7 +530,12 @@ class Package(Module):
                  ]],
                  includeDirs: Optional[List[str]] = None,
                  libraryDirs: Optional[List[str]] = None,
-                 buildDir: Optional[str] = None):
+                 buildDir: Optional[str] = None,
+                 jobs: Optional[int] = None,
+                 lazyImports: Optional[LazyImports] = None,
+                 pgoTraining: Optional[Union[str, List[str]]] = None,
+                 unityBatchSize: Optional[int] = None,
+                 buildProfile: Union[str, BuildProfile, None] = None):
 
         tmpResources = []
         for resource in resources:
@@ -245,7 +560,12 @@ class Package(Module):
                          package=True,
                          includeDirs=includeDirs,
                          libraryDirs=libraryDirs,
-                         buildDir=buildDir)
+                         buildDir=buildDir,
+                         jobs=jobs,
+                         lazyImports=lazyImports,
+                         pgoTraining=pgoTraining,
+                         unityBatchSize=unityBatchSize,
+                         buildProfile=buildProfile)
 
 
 class Executable(BaseCompiler):
@@ -267,9 +587,27 @@ class Executable(BaseCompiler):
                  libraryDirs: Optional[List[str]] = None,
                  standalone: Optional[bool] = None,
                  pythonDepsDir: Optional[str] = None,
-                 buildDir: Optional[str] = None):
-
-        super().__init__(includeDirs=includeDirs, libraryDirs=libraryDirs, buildDir=buildDir)
+                 pythonDepsOptimize: Optional[int] = None,
+                 pythonDepsCompressLevel: int = 6,
+                 freezePythonDeps: bool = False,
+                 importProfile: bool = False,
+                 dataArchive: Optional[str] = None,
+                 lazyImports: Optional[LazyImports] = None,
+                 buildDir: Optional[str] = None,
+                 jobs: Optional[int] = None,
+                 pgoTraining: Optional[Union[str, List[str]]] = None,
+                 buildProfile: Union[str, BuildProfile, None] = None):
+        """
+        With 'standalone', the Python modules the program imports are packed into
+        python.zip in 'pythonDepsDir' (default: "bin").
+
+        'freezePythonDeps' compiles the standard library modules into the executable as
+        frozen modules instead. Frozen modules have no __file__, so packages, modules that
+        read their __file__ and all of site-packages stay in python.zip, and there is no
+        source for inspect.getsource() or the tracebacks of the frozen modules.
+        """
+        super().__init__(includeDirs=includeDirs, libraryDirs=libraryDirs, buildDir=buildDir, jobs=jobs,
+                         pgoTraining=pgoTraining, buildProfile=buildProfile)
 
         if isinstance(main, str):
             main = ResourcesFromFileName(main)[0]
@@ -300,20 +638,117 @@ class Executable(BaseCompiler):
         self.main = main
         self.name = name
 
+        _setLazyImports([self.main] + self.resources, lazyImports)
+
         self.standalone = standalone
         self.pythonDepsDir = pythonDepsDir
+        self.pythonDepsOptimize = pythonDepsOptimize
+        self.pythonDepsCompressLevel = pythonDepsCompressLevel
+        self.freezePythonDeps = freezePythonDeps
+        self.importProfile = importProfile
+
+        # DATA_ARCHIVE_APPEND or DATA_ARCHIVE_FILE: Data and DataFile resources are packed
+        # into an archive at the end of the executable or next to it, and the 'pycdata'
+        # runtime module is built in
+        if dataArchive not in [None, DATA_ARCHIVE_APPEND, DATA_ARCHIVE_FILE]:
+            raise ValueError(f"Unknown data archive mode \"{dataArchive}\"")
+        self.dataArchive = dataArchive
+
+        self._dllData = None
+        if self.standalone:
+            self._dllData = Data("*.dll", homePath=sys.exec_prefix)
+            self.resources.append(self._dllData)
+
+    def __repr__(self) -> str:
+        return f"<{self.__module__}.{self.__class__.__name__} processor: (name=\"{self.name}\")>"
+
+    def getInputs(self) -> Set[str]:
+        inputs = {self.main.inputFile}
+
+        for resource in self.resources:
+            if isinstance(resource, (PythonFile, CythonFile, CFile)):
+                inputs.add(resource.inputFile)
+
+            elif isinstance(resource, DataFile):
+                inputs.add(resource.inputFilePath)
+
+            elif isinstance(resource, Data):
+                inputs.update(resource.getInputs())
+
+        return inputs
+
+    def getOutputs(self) -> Set[str]:
+        outputs = {os.path.join(self.buildCmd.build_platlib, self.name)}
+
+        if isinstance(self.main, CythonizeResource):
+            outputs.add(self.main.outputFile)
 
         if self.standalone:
-            self.resources.append(Data("*.dll", homePath=sys.exec_prefix))
+            outputs.add(os.path.join(self.buildCmd.build_platlib, self.pythonDepsDir or "bin"))
+
+        for resource in self.resources:
+            if isinstance(resource, (CythonizeResource, ExecResourceFile)):
+                outputs.add(resource.outputFile)
+
+            elif self._isArchived(resource):
+                continue
+
+            elif isinstance(resource, DataFile):
+                outputs.add(resource.getOutputFile(self.buildCmd.build_platlib))
+
+            elif isinstance(resource, Data):
+                outputs.update(resource.getOutputs())
+
+        if self.dataArchive == DATA_ARCHIVE_FILE:
+            outputs.add(os.path.join(self.buildCmd.build_platlib, self.name + DATA_ARCHIVE_EXT))
+
+        return outputs
+
+    def reset(self, changedFiles: Optional[Set[str]] = None):
+        """
+        The main module gets the freeze code of the executable added again.
+        """
+        super().reset(changedFiles)
+
+        if isinstance(self.main, CythonizeResource):
+            self.main.reset()
+
+    def _isArchived(self, resource) -> bool:
+        return self.dataArchive is not None and isinstance(resource, (DataFile, Data)) and resource is not self._dllData
+
+    def _getRuntimeModule(self) -> PythonFile:
+        runtimeModule = PythonFile(RUNTIME_MODULE_FILE, name=RUNTIME_MODULE_NAME)
+        runtimeModule.outputFile = os.path.join(self.buildCmd.build_temp, RUNTIME_MODULE_NAME + ".cpp")
+        return runtimeModule
+
+    def _onCythonized(self, resource: Union[PythonFile, CythonFile]):
+        if resource is not self.main:
+            resource.freezePackage(_packageSubmodules(resource, self.resources))
 
     def process(self):
         modules: List[Union[PythonFile, CythonFile, CFile]] = []
         sources: List[str] = []
+        archiveFiles: List[Tuple[str, str]] = []
 
-        for resource in self.resources:
-            if isinstance(resource, (PythonFile, CythonFile)):
-                resource.cythonize(package=True)
-                resource.freezePackage()
+        resources = list(self.resources)
+        if self.dataArchive is not None:
+            resources.append(self._getRuntimeModule())
+
+        tasks = [(resource, True) for resource in resources if isinstance(resource, (PythonFile, CythonFile))]
+        if isinstance(self.main, (PythonFile, CythonFile)):
+            tasks.append((self.main, None))
+
+        CythonizeResources(tasks, jobs=self.jobs, onCythonized=self._onCythonized, cache=self.cythonCache,
+                           buildTemp=self.buildCmd.build_temp)
+
+        for resource in resources:
+            if self._isArchived(resource):
+                if isinstance(resource, Data):
+                    archiveFiles.extend(resource.getArchiveFiles())
+                else:
+                    archiveFiles.append((resource.inputFile, resource.inputFilePath))
+
+            elif isinstance(resource, (PythonFile, CythonFile)):
                 sources.append(resource.outputFile)
                 modules.append(resource)
 
@@ -333,27 +768,121 @@ class Executable(BaseCompiler):
                 resource.process()
 
         if isinstance(self.main, (PythonFile, CythonFile)):
-            self.main.cythonize()
-            self.main.freezeExecutable(modules, standalone=self.standalone, pythonDepsDir=self.pythonDepsDir)
+            self.main.freezeExecutable(modules, standalone=self.standalone, pythonDepsDir=self.pythonDepsDir,
+                                       frozenModules=self.freezePythonDeps, importProfile=self.importProfile)
             sources.insert(0, self.main.outputFile)
 
         elif isinstance(self.main, CFile):
             sources.insert(0, self.main.inputFile)
 
+        if self.standalone:
+            bundledModules = {module.name: module.inputFile for module in modules if isinstance(module, CythonizeResource)}
+
+            frozenFile = None
+            if self.freezePythonDeps:
+                frozenFile = os.path.join(self.buildCmd.build_temp, FROZEN_MODULES_FILE_NAME)
+                sources.append(frozenFile)
+
+            MakeDeps(self.main.inputFile,
+                     os.path.join(self.buildCmd.build_platlib, self.pythonDepsDir or "bin"),
+                     bundledModules=bundledModules,
+                     scanCacheFile=os.path.join(self.buildDir, IMPORTS_CACHE_FILE_NAME),
+                     compressLevel=self.pythonDepsCompressLevel,
+                     optimize=self.pythonDepsOptimize,
+                     frozenFile=frozenFile,
+                     stateDir=os.path.join(self.buildCmd.build_temp, self.pythonDepsDir or "bin"))
+
         self._compileExec(sources, self.name)
 
-        if self.standalone:
-            MakeDeps(self.main.inputFile, os.path.join(self.buildCmd.build_platlib, self.pythonDepsDir or "bin"))
+        if self.dataArchive == DATA_ARCHIVE_APPEND:
+            AppendDataArchive(archiveFiles, os.path.join(self.buildCmd.build_platlib, self.name) + self.compiler.exeExt)
+
+        elif self.dataArchive == DATA_ARCHIVE_FILE:
+            WriteDataArchive(archiveFiles,
+                             os.path.join(self.buildCmd.build_platlib, self.name + DATA_ARCHIVE_EXT),
+                             stampFile=os.path.join(self.buildCmd.build_temp, DATA_SYNC_DIR_NAME,
+                                                    self.name + DATA_ARCHIVE_EXT + ".json"))
 
 
-def ProcessAll(*processors: Union[BaseProcessor, List[BaseProcessor]], buildDir: Optional[str] = None, cleanCache: Optional[bool] = False):
+def _flattenProcessors(processors) -> List[BaseProcessor]:
+    flatProcessors = []
     for processor in processors:
         if isinstance(processor, (list, tuple)):
-            ProcessAll(*processor, buildDir=buildDir, cleanCache=cleanCache)
-            break
+            flatProcessors.extend(_flattenProcessors(processor))
+        else:
+            flatProcessors.append(processor)
+
+    return flatProcessors
+
+
+def ProcessAll(*processors: Union[BaseProcessor, List[BaseProcessor]],
+               buildDir: Optional[str] = None,
+               cleanCache: Optional[bool] = False,
+               keepObjects: Optional[bool] = False,
+               jobs: Optional[int] = None,
+               buildProfile: Union[str, BuildProfile, None] = None,
+               trace: Optional[str] = None):
+    """
+    Build all processors, independent ones at the same time on 'jobs' workers.
+
+    Processors are ordered by the files they read and write (see getInputs/getOutputs),
+    everything else keeps no particular order. Compiler and Cython processes of all
+    processors share the same 'jobs' limit. A failed processor does not stop the others,
+    a BuildError with every failure is raised at the end. Hit/miss statistics of the
+    build caches are printed when the build is over.
+
+    'cleanCache' removes the generated sources and objects after the build,
+    with 'keepObjects' the objects and their manifest stay for the next incremental build.
+    'buildProfile' is used by the processors that have none of their own.
+
+    With 'trace', the time of every stage of the build (cythonize, freeze, compile,
+    link, data, dependency analysis and packing) is written to that file, open it in
+    chrome://tracing or https://ui.perfetto.dev. The slowest stages and files are printed.
+    """
+    processors = _flattenProcessors(processors)
+
+    for processor in processors:
+        if processor.buildProfile is None:
+            processor.buildProfile = buildProfile
 
         processor.buildDir = buildDir
-        processor.process()
 
+        if isinstance(processor, (BaseCompiler, Data)) and processor.jobs is None:
+            processor.jobs = jobs
+
+    dependencies = FindDependencies([(processor.getInputs(), processor.getOutputs()) for processor in processors])
+
+    processed = []
+
+    def process(processor: BaseProcessor):
+        with BUILD_TRACE.span(processor.__class__.__name__, detail=getattr(processor, "name", None)):
+            processor.process()
+        processed.append(processor)
+
+    CACHE_STATS.reset()
+
+    if trace is not None:
+        BUILD_TRACE.start()
+
+    try:
+        with BUILD_TRACE.span("ProcessAll"), JobSlots(jobs), CythonizePool(jobs):
+            RunGraph(processors, dependencies, process, workers=jobs)
+
+    finally:
+        # Dependent processors may still use the generated sources, clean only at the end
         if cleanCache:
-            processor.clean()
+            for processor in processed:
+                processor.clean(keepObjects=keepObjects)
+
+        ClearDirectoryCache()
+
+        cacheSummary = CACHE_STATS.summary()
+        if cacheSummary:
+            print(cacheSummary)
+
+        if trace is not None:
+            BUILD_TRACE.stop()
+            BUILD_TRACE.write(trace)
+
+            print(BUILD_TRACE.summary())
+            print(f"Build trace written to \"{trace}\"")
@@ -0,0 +1,138 @@
+import os
+import json
+import shutil
+import struct
+
+from typing import Optional, List, Tuple
+
+from .archive import COPY_BUFFER_SIZE
+from .buildtrace import BUILD_TRACE
+
+
+DATA_ARCHIVE_APPEND = "append"
+DATA_ARCHIVE_FILE = "file"
+
+DATA_ARCHIVE_ALIGNMENT = 64
+DATA_ARCHIVE_EXT = ".pycdata"
+
+RUNTIME_MODULE_NAME = "pycdata"
+RUNTIME_MODULE_FILE = os.path.join(os.path.split(__file__)[0], RUNTIME_MODULE_NAME + ".py")
+
+# Read by pycdata.py
+_MAGIC = b"PYCDATA1"
+_TRAILER = struct.Struct("<8sQQQ")
+_COUNT = struct.Struct("<I")
+_ENTRY = struct.Struct("<HQQ")
+
+
+def _archiveName(name: str) -> str:
+    return os.path.normpath(name).replace("\\", "/").lstrip("/")
+
+
+def _pad(f, align: int):
+    padding = -f.tell() % align
+    if padding:
+        f.write(b"\0" * padding)
+
+
+def _writeArchive(f, files: List[Tuple[str, str]], align: int) -> int:
+    """
+    Layout: the files, every one at an 'align'-ed file offset, the index, and a trailer
+    that locates the index and the start of the archive from the end of the file.
+    """
+    _pad(f, align)
+    start = f.tell()
+
+    entries = []
+    for name, file in files:
+        _pad(f, align)
+        offset = f.tell() - start
+
+        with open(file, "rb") as src:
+            shutil.copyfileobj(src, f, COPY_BUFFER_SIZE)
+
+        entries.append((_archiveName(name).encode(), offset, f.tell() - start - offset))
+
+    indexOffset = f.tell() - start
+    f.write(_COUNT.pack(len(entries)))
+    for name, offset, size in entries:
+        f.write(_ENTRY.pack(len(name), offset, size))
+        f.write(name)
+
+    indexSize = f.tell() - start - indexOffset
+    archiveSize = f.tell() - start + _TRAILER.size
+    f.write(_TRAILER.pack(_MAGIC, indexOffset, indexSize, archiveSize))
+
+    return len(entries)
+
+
+def _sortFiles(files: List[Tuple[str, str]], outputFile: str) -> List[Tuple[str, str]]:
+    files = sorted(files, key=lambda item: _archiveName(item[0]))
+
+    names = [_archiveName(name) for name, _ in files]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate names in the data archive of \"{outputFile}\"")
+
+    return files
+
+
+def _getStamp(files: List[Tuple[str, str]], align: int) -> list:
+    stamp = [align]
+    for name, file in files:
+        stat = os.stat(file)
+        stamp.append([_archiveName(name), os.path.abspath(file), stat.st_size, stat.st_mtime_ns])
+
+    return stamp
+
+
+def WriteDataArchive(files: List[Tuple[str, str]],
+                     outputFile: str,
+                     stampFile: Optional[str] = None,
+                     align: int = DATA_ARCHIVE_ALIGNMENT):
+    """
+    Pack the (archive name, file) pairs of 'files' uncompressed into 'outputFile'. With
+    a 'stampFile' the archive is not rewritten while the names, sizes and modification
+    times of the files are the ones it was written from.
+    """
+    files = _sortFiles(files, outputFile)
+    stamp = _getStamp(files, align)
+
+    if stampFile is not None and os.path.isfile(outputFile) and os.path.isfile(stampFile):
+        with open(stampFile, "r") as f:
+            try:
+                if json.load(f) == stamp:
+                    print(f"Data archive {outputFile}: {len(files)} files, unchanged")
+                    return
+            except ValueError:
+                pass
+
+    os.makedirs(os.path.dirname(outputFile) or ".", exist_ok=True)
+
+    tmpFile = outputFile + ".tmp"
+    with BUILD_TRACE.span("data archive", outputFile, output=tmpFile):
+        with open(tmpFile, "wb") as f:
+            _writeArchive(f, files, align)
+    os.replace(tmpFile, outputFile)
+
+    if stampFile is not None:
+        os.makedirs(os.path.dirname(stampFile) or ".", exist_ok=True)
+        with open(stampFile, "w") as f:
+            json.dump(stamp, f)
+
+    print(f"Data archive {outputFile}: {len(files)} files, {os.path.getsize(outputFile)} bytes")
+
+
+def AppendDataArchive(files: List[Tuple[str, str]], executableFile: str, align: int = DATA_ARCHIVE_ALIGNMENT):
+    """
+    Append the archive to a freshly linked 'executableFile', padded so the file offsets stay aligned.
+    """
+    files = _sortFiles(files, executableFile)
+
+    with BUILD_TRACE.span("data archive", executableFile, output=executableFile):
+        with open(executableFile, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            executableSize = f.tell()
+            count = _writeArchive(f, files, align)
+
+    print(f"Data archive appended to {executableFile}: {count} files, "
+          f"{os.path.getsize(executableFile) - executableSize} bytes")
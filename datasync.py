@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import shutil
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Tuple, Dict
+
+from .cache import HashFile
+from .buildtrace import BUILD_TRACE
+
+
+SYNC_COPY = "copy"
+SYNC_HARDLINK = "hardlink"
+SYNC_REFLINK = "reflink"
+
+SYNC_MODES = [SYNC_COPY, SYNC_HARDLINK, SYNC_REFLINK]
+
+# linux/fs.h: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+_COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def _copyFileRange(srcFile: str, dstFile: str) -> bool:
+    """
+    Copy inside the kernel with copy_file_range(), which also shares the blocks on
+    filesystems that support it. False if the system or the filesystems do not.
+    """
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    with open(srcFile, "rb") as src, open(dstFile, "wb") as dst:
+        try:
+            while os.copy_file_range(src.fileno(), dst.fileno(), _COPY_CHUNK_SIZE):
+                pass
+        except OSError:
+            return False
+
+    return True
+
+
+def _reflink(srcFile: str, dstFile: str) -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+
+    import fcntl
+
+    with open(srcFile, "rb") as src, open(dstFile, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            return False
+
+    return True
+
+
+def CopyFile(srcFile: str, dstFile: str, mode: str = SYNC_COPY):
+    """
+    Replace 'dstFile' with 'srcFile' atomically. Copies keep the modification time of the
+    source, 'hardlink' and 'reflink' fall back to a copy where the filesystem cannot do them.
+    Copies are done in the kernel: copy_file_range() where there is one, sendfile() or
+    fcopyfile() through shutil otherwise.
+    """
+    if mode not in SYNC_MODES:
+        raise ValueError(f"Unknown sync mode \"{mode}\", expected one of {', '.join(SYNC_MODES)}")
+
+    tmpFile = dstFile + ".tmp"
+    if os.path.lexists(tmpFile):
+        os.remove(tmpFile)
+
+    try:
+        if mode == SYNC_HARDLINK:
+            try:
+                os.link(srcFile, tmpFile)
+                os.replace(tmpFile, dstFile)
+                return
+            except OSError:
+                pass
+
+        if not (mode == SYNC_REFLINK and _reflink(srcFile, tmpFile)) and not _copyFileRange(srcFile, tmpFile):
+            shutil.copyfile(srcFile, tmpFile)
+
+        shutil.copystat(srcFile, tmpFile)
+        os.replace(tmpFile, dstFile)
+
+    except BaseException:
+        if os.path.lexists(tmpFile):
+            os.remove(tmpFile)
+        raise
+
+
+def IsUpToDate(srcFile: str, dstFile: str, checkHash: bool = True) -> bool:
+    """
+    Same size and modification time, or same size and content. With a matching content
+    only the modification time of 'dstFile' is brought up to date.
+    """
+    try:
+        srcStat = os.stat(srcFile)
+        dstStat = os.stat(dstFile)
+    except FileNotFoundError:
+        return False
+
+    if srcStat.st_size != dstStat.st_size:
+        return False
+
+    if srcStat.st_mtime_ns == dstStat.st_mtime_ns or os.path.samefile(srcFile, dstFile):
+        return True
+
+    if not checkHash or HashFile(srcFile) != HashFile(dstFile):
+        return False
+
+    os.utime(dstFile, ns=(dstStat.st_atime_ns, srcStat.st_mtime_ns))
+    return True
+
+
+def SyncFiles(files: List[Tuple[str, str]],
+              manifestFile: Optional[str] = None,
+              mode: str = SYNC_COPY,
+              checkHash: bool = True,
+              jobs: Optional[int] = None) -> Dict[str, int]:
+    """
+    Bring every (source, destination) pair of 'files' up to date on a thread pool, see
+    IsUpToDate() and CopyFile(). 'manifestFile' lists the destinations of the previous
+    sync, the ones that are not in 'files' anymore are removed. Returns the number of
+    copied, unchanged and removed files.
+    """
+    previous = []
+    if manifestFile is not None and os.path.isfile(manifestFile):
+        try:
+            with open(manifestFile, "r") as f:
+                previous = json.load(f)
+        except ValueError:
+            previous = []
+
+    stats = {"copied": 0, "unchanged": 0, "removed": 0}
+    lock = threading.Lock()
+
+    def sync(srcFile: str, dstFile: str):
+        if IsUpToDate(srcFile, dstFile, checkHash):
+            result = "unchanged"
+        else:
+            os.makedirs(os.path.dirname(dstFile) or ".", exist_ok=True)
+            with BUILD_TRACE.span("data", srcFile, output=dstFile):
+                CopyFile(srcFile, dstFile, mode)
+            result = "copied"
+
+        with lock:
+            stats[result] += 1
+
+    with ThreadPoolExecutor(max_workers=jobs or min(32, (os.cpu_count() or 1) + 4)) as executor:
+        for future in [executor.submit(sync, srcFile, dstFile) for srcFile, dstFile in files]:
+            future.result()
+
+    destinations = {os.path.normpath(dstFile) for _, dstFile in files}
+    for dstFile in previous:
+        if os.path.normpath(dstFile) not in destinations and os.path.isfile(dstFile):
+            os.remove(dstFile)
+            stats["removed"] += 1
+
+    if manifestFile is not None:
+        os.makedirs(os.path.dirname(manifestFile) or ".", exist_ok=True)
+        with open(manifestFile + ".tmp", "w") as f:
+            json.dump(sorted(destinations), f, indent=1)
+        os.replace(manifestFile + ".tmp", manifestFile)
+
+    return stats
@@ -1,10 +1,31 @@
 import os
+import re
 import sys
+import ast
+import glob
+import json
+import time
+import hashlib
+import shutil
+import struct
+import marshal
 import zipfile
+import warnings
 import tempfile
+import contextlib
+import collections
+import sysconfig
 import subprocess
+import importlib.util
+import importlib.machinery
 
-from typing import List
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Set, Tuple, Optional
+
+from .cache import HashFile, HashKey
+from .buildtrace import BUILD_TRACE
+from .freeze.frozen import WriteFrozenModulesCode
+from .archive import ZipWriter, ZipEntry, Deflate, ReadRawEntries, COPY_BUFFER_SIZE
 
 
 def ModulesFromNames(names: list) -> dict:
@@ -16,6 +37,14 @@ PYTHON_LIB_PATH = os.path.join(PYTHON_PATH, "lib")
 PYTHON_DLLS_PATH = os.path.join(PYTHON_PATH, "DLLs")
 PYTHON_SITE_PACKAGES_PATH = os.path.join(PYTHON_LIB_PATH, "site-packages")
 
+DEPS_STATE_FILE_NAME = "deps.json"
+PACK_MANIFEST_FILE_NAME = "python.zip.json"
+FROZEN_CODES_EXT = ".codes"
+# Bumped when the modules that get frozen change, the kept codes are compiled again
+FROZEN_CODES_VERSION = 2
+
+PACK_ALIGNMENT = 16
+
 
 REQUIRED_LIB_FILES = [
     "stringprep.py"
@@ -108,7 +137,507 @@ def AnalyzeDeps(file: str):
     return deps
 
 
-def PackDeps(deps: List[str], outputDir: str):
+_TImport = Tuple[int, str, List[str]]
+
+# Cython sources are not valid Python, their imports are found line by line
+_CYTHON_IMPORT_RE = re.compile(r"^\s*(?:from\s+(\.*)([\w.]*)\s+(?:c?import)\s+(.+)|import\s+(.+))$")
+_DYNAMIC_IMPORT_RE = re.compile(rb"(?:__import__|import_module)\(\s*[\"']([\w.]+)[\"']")
+_STATEMENT_BODY_FIELDS = ("body", "orelse", "finalbody", "handlers", "cases")
+
+# Below this many files a wave is parsed in-process, a worker pool costs more than it saves
+_PARALLEL_SCAN_MIN_FILES = 16
+
+
+def _scanImports(file: str) -> List[_TImport]:
+    """
+    Every import of 'file' as (level, module, names), including imports inside functions
+    and conditional blocks, and __import__/importlib.import_module calls with a literal name.
+    """
+    with open(file, "rb") as f:
+        source = f.read()
+
+    try:
+        tree = ast.parse(source, filename=file)
+    except (SyntaxError, ValueError):
+        return _scanImportsFromLines(source.decode(errors="replace"))
+
+    imports: List[_TImport] = []
+
+    # Import is a statement, only statement bodies are walked, never expressions
+    stack = list(tree.body)
+    while stack:
+        node = stack.pop()
+
+        if isinstance(node, ast.Import):
+            imports.extend((0, alias.name, []) for alias in node.names)
+
+        elif isinstance(node, ast.ImportFrom):
+            imports.append((node.level, node.module or "", [alias.name for alias in node.names]))
+
+        else:
+            for field in _STATEMENT_BODY_FIELDS:
+                children = getattr(node, field, None)
+                if children:
+                    stack.extend(children)
+
+    for match in _DYNAMIC_IMPORT_RE.finditer(source):
+        imports.append((0, match.group(1).decode(), []))
+
+    return imports
+
+
+def _scanImportsFromLines(source: str) -> List[_TImport]:
+    imports: List[_TImport] = []
+
+    for line in source.splitlines():
+        match = _CYTHON_IMPORT_RE.match(line.split("#", 1)[0].rstrip())
+        if match is None or " cimport " in f" {line} ":
+            continue
+
+        dots, module, names, plainNames = match.groups()
+        if plainNames is not None:
+            for name in plainNames.split(","):
+                imports.append((0, name.split(" as ")[0].strip(), []))
+        else:
+            names = [name.split(" as ")[0].strip(" ()") for name in names.split(",")]
+            imports.append((len(dots), module, names))
+
+    return imports
+
+
+class _ScanCache:
+    """
+    Imports found in every scanned file, keyed by path and checked against size and mtime.
+    Interpreter files never change between builds, so they are parsed only once.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._entries: Dict[str, list] = {}
+        self._changed = False
+
+        if path is not None:
+            try:
+                with open(path, "r") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    @staticmethod
+    def _stamp(file: str) -> list:
+        stat = os.stat(file)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def get(self, file: str) -> Optional[List[_TImport]]:
+        entry = self._entries.get(file)
+        if entry is None or entry[0] != self._stamp(file):
+            return None
+        return [tuple(item) for item in entry[1]]
+
+    def set(self, file: str, imports: List[_TImport]):
+        self._entries[file] = [self._stamp(file), imports]
+        self._changed = True
+
+    def save(self):
+        if self.path is None or not self._changed:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self._entries, f)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def _getStartupModules() -> List[str]:
+    """
+    Modules the interpreter imports before running any user code.
+    """
+    output = subprocess.check_output([sys.executable, "-I", "-c", "import sys; print('\\n'.join(sys.modules))"])
+    return sorted(output.decode().split())
+
+
+class _ModuleResolver:
+    def __init__(self, bundledModules: Set[str]):
+        self.bundledModules = bundledModules
+        self._specs: Dict[str, Optional[importlib.machinery.ModuleSpec]] = {}
+
+    def find(self, name: str) -> Optional[importlib.machinery.ModuleSpec]:
+        if name in self._specs:
+            return self._specs[name]
+
+        spec = None
+        if name and name not in self.bundledModules and name not in sys.builtin_module_names:
+            parent = name.rpartition(".")[0]
+
+            if parent:
+                parentSpec = self.find(parent)
+                if parentSpec is not None and parentSpec.submodule_search_locations:
+                    spec = importlib.machinery.PathFinder.find_spec(name, list(parentSpec.submodule_search_locations))
+            else:
+                spec = importlib.machinery.PathFinder.find_spec(name, sys.path)
+
+        self._specs[name] = spec
+        return spec
+
+
+def _isInterpreterFile(path: str) -> bool:
+    return os.path.normcase(os.path.abspath(path)).startswith(os.path.normcase(PYTHON_PATH))
+
+
+def AnalyzeDepsStatic(file: str,
+                      bundledModules: Optional[Dict[str, str]] = None,
+                      jobs: Optional[int] = None,
+                      scanCacheFile: Optional[str] = None) -> List[str]:
+    """
+    Statically find the interpreter files needed by 'file' and the bundled modules
+    ('bundledModules' maps a module name to its source file). Walks the AST import graph
+    from those files through every reached stdlib/site-packages module, resolving names
+    against the build interpreter's sys.path. Returns the same list as AnalyzeDeps.
+
+    Files are parsed in parallel on 'jobs' processes, the imports found are kept in
+    'scanCacheFile' for the next build.
+    """
+    if bundledModules is None:
+        bundledModules = {}
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    print(f"Analyze \"{file}\"...")
+
+    resolver = _ModuleResolver(set(bundledModules))
+    scanCache = _ScanCache(scanCacheFile)
+
+    deps: Set[str] = set()
+    visited: Set[str] = set()
+    wave: List[Tuple[str, str, bool]] = []
+
+    def addFile(path: str, name: str, isPackage: bool):
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in visited:
+            visited.add(key)
+            wave.append((path, name, isPackage))
+
+    def need(name: str) -> Optional[importlib.machinery.ModuleSpec]:
+        parts = name.split(".")
+        spec = None
+        for i in range(1, len(parts) + 1):
+            spec = resolver.find(".".join(parts[:i]))
+            if spec is None:
+                return None
+
+            if spec.has_location and spec.origin and _isInterpreterFile(spec.origin):
+                deps.add(spec.origin)
+
+                if spec.origin.endswith(".py"):
+                    addFile(spec.origin, spec.name, spec.submodule_search_locations is not None)
+
+        return spec
+
+    addFile(file, "__main__", False)
+    for name, path in sorted(bundledModules.items()):
+        addFile(path, name, os.path.splitext(os.path.basename(path))[0] == "__init__")
+
+    for name in _getStartupModules():
+        need(name)
+
+    executor = None
+    try:
+        while wave:
+            current = sorted(wave)
+            wave.clear()
+
+            results = [scanCache.get(path) for path, _, _ in current]
+            paths = [path for (path, _, _), imports in zip(current, results) if imports is None]
+
+            if jobs > 1 and len(paths) >= _PARALLEL_SCAN_MIN_FILES:
+                if executor is None:
+                    executor = ProcessPoolExecutor(max_workers=jobs)
+                scanned = executor.map(_scanImports, paths, chunksize=8)
+            else:
+                scanned = map(_scanImports, paths)
+
+            scanned = dict(zip(paths, scanned))
+            for i, (path, _, _) in enumerate(current):
+                if results[i] is None:
+                    results[i] = scanned[path]
+                    scanCache.set(path, results[i])
+
+            for (path, name, isPackage), imports in zip(current, results):
+                package = name if isPackage else name.rpartition(".")[0]
+
+                for level, module, names in imports:
+                    if level:
+                        bits = package.rsplit(".", level - 1)
+                        if not package or len(bits) < level:
+                            continue
+                        module = f"{bits[0]}.{module}" if module else bits[0]
+
+                    spec = need(module)
+                    if spec is None or spec.submodule_search_locations is None:
+                        continue
+
+                    for fromName in names:
+                        if fromName != "*":
+                            need(f"{module}.{fromName}")
+
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    scanCache.save()
+
+    if any(os.path.basename(dep).startswith("_ctypes") for dep in deps):
+        deps.update(glob.glob(os.path.join(PYTHON_DLLS_PATH, "libffi*.dll")))
+
+    for libFile in REQUIRED_LIB_FILES:
+        libFile = os.path.join(PYTHON_LIB_PATH, libFile)
+        if os.path.isfile(libFile):
+            deps.add(libFile)
+
+    for dllFile in REQUIRED_DLL_FILES:
+        dllFile = os.path.join(PYTHON_DLLS_PATH, dllFile)
+        if os.path.isfile(dllFile):
+            deps.add(dllFile)
+
+    return sorted(deps)
+
+
+def _collectLibEntries(libFiles: List[str], libFolders: List[str]) -> List[Tuple[str, str]]:
+    entries = {}
+
+    for file in libFiles:
+        entries[os.path.relpath(file, PYTHON_LIB_PATH).replace(os.sep, "/")] = file
+
+    for folder in sorted(set(libFolders)):
+        if os.path.isfile(folder):
+            # Plain module at the top of site-packages
+            entries[os.path.relpath(folder, PYTHON_LIB_PATH).replace(os.sep, "/")] = folder
+            continue
+
+        for dirPath, dirs, files in os.walk(folder):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+
+            for file in sorted(files):
+                file = os.path.join(dirPath, file)
+                entries[os.path.relpath(file, PYTHON_LIB_PATH).replace(os.sep, "/")] = file
+
+    return list(entries.items())
+
+
+def _loadPackManifest(zipPath: str, manifestPath: str) -> Tuple[dict, dict]:
+    """
+    Entries of the previous archive that can be copied as they are, with the
+    source stamps they were packed from.
+    """
+    try:
+        with open(manifestPath, "r") as f:
+            manifest = json.load(f)
+        return manifest, ReadRawEntries(zipPath)
+    except (OSError, ValueError, zipfile.BadZipFile):
+        return {}, {}
+
+
+def _compileCode(file: str, name: str, optimize: int) -> Optional[bytes]:
+    with open(file, "rb") as f:
+        source = f.read()
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            code = compile(source, name, "exec", dont_inherit=True, optimize=optimize)
+    except (SyntaxError, ValueError):
+        # Test data and py2 leftovers, packed as sources like before
+        return None
+
+    return marshal.dumps(code)
+
+
+def _compileBytecode(file: str, name: str, optimize: int) -> Optional[bytes]:
+    code = _compileCode(file, name, optimize)
+    if code is None:
+        return None
+
+    # Timestamp based pyc, zipimport does not validate it when the source is not in the archive
+    stat = os.stat(file)
+    header = struct.pack("<3L", 0, int(stat.st_mtime) & 0xFFFFFFFF, stat.st_size & 0xFFFFFFFF)
+
+    return importlib.util.MAGIC_NUMBER + header + code
+
+
+def _moduleNameFromFile(file: str) -> Optional[Tuple[str, bool]]:
+    roots = {PYTHON_LIB_PATH, PYTHON_SITE_PACKAGES_PATH,
+             sysconfig.get_path("stdlib"), sysconfig.get_path("purelib"), sysconfig.get_path("platlib")}
+
+    # The innermost root wins, site-packages lies inside the lib folder
+    for root in sorted(roots, key=len, reverse=True):
+        relPath = os.path.relpath(file, root)
+        if relPath.startswith(os.pardir):
+            continue
+
+        parts = os.path.splitext(relPath)[0].split(os.sep)
+        isPackage = parts[-1] == "__init__"
+        if isPackage:
+            parts.pop()
+
+        if not parts or not all(part.isidentifier() for part in parts):
+            return None
+
+        return ".".join(parts), isPackage
+
+    return None
+
+
+def _compileFrozenCode(file: str, name: str, optimize: int) -> Optional[bytes]:
+    """
+    None for a module that reads its __file__, a frozen module has none.
+    """
+    with open(file, "rb") as f:
+        if b"__file__" in f.read():
+            return None
+
+    return _compileCode(file, name, optimize)
+
+
+def _isStdlibFile(file: str) -> bool:
+    file = os.path.normcase(os.path.abspath(file))
+
+    sitePackagesDirs = {PYTHON_SITE_PACKAGES_PATH, sysconfig.get_path("purelib"), sysconfig.get_path("platlib")}
+    if any(file.startswith(os.path.normcase(os.path.abspath(path)) + os.sep) for path in sitePackagesDirs):
+        return False
+
+    return file.startswith(os.path.normcase(os.path.abspath(sysconfig.get_path("stdlib"))) + os.sep)
+
+
+def _loadFrozenCodes(codesFile: str) -> dict:
+    try:
+        with open(codesFile, "rb") as f:
+            state = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return {}
+
+    if not isinstance(state, dict) or state.get("version") != FROZEN_CODES_VERSION:
+        return {}
+
+    return state
+
+
+def _freezeEntries(entries: List[Tuple[str, str]], frozenFile: str, optimize: int, jobs: int) -> Set[str]:
+    """
+    Write the standard library modules among 'entries' to 'frozenFile' as frozen modules,
+    returns the names of the entries that were frozen. Frozen modules have no __file__:
+    packages, modules that read their __file__ and everything from site-packages stay in
+    python.zip. The frozen submodules of a package there are found by name.
+
+    The marshalled code of every module is kept next to 'frozenFile' with the stamp of
+    its source: only changed modules are compiled again, and 'frozenFile' is only
+    written again when the code of one of them changed.
+    """
+    modules = {}
+    for name, file in entries:
+        if not name.endswith(".py"):
+            continue
+
+        if not _isStdlibFile(file):
+            continue
+
+        moduleName = _moduleNameFromFile(file)
+        if moduleName is not None and not moduleName[1] and moduleName[0] not in modules:
+            modules[moduleName[0]] = (name, file)
+
+    codesFile = frozenFile + FROZEN_CODES_EXT
+    state = _loadFrozenCodes(codesFile)
+    previousCodes = state.get("codes", {})
+
+    magic = importlib.util.MAGIC_NUMBER.hex()
+    codes = {}
+    stamps = {}
+    stale = []
+    for name, file in modules.values():
+        stat = os.stat(file)
+        stamp = stamps[file] = (stat.st_size, stat.st_mtime_ns, optimize, magic)
+
+        previous = previousCodes.get(file)
+        if previous is not None and previous[0] == stamp:
+            codes[file] = previous
+        else:
+            stale.append((name, file))
+
+    if stale:
+        if jobs > 1 and len(stale) > 1:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+        else:
+            executor = ThreadPoolExecutor(max_workers=1)
+
+        with executor:
+            compiled = executor.map(_compileFrozenCode,
+                                    [file for _, file in stale],
+                                    [name for name, _ in stale],
+                                    [optimize] * len(stale),
+                                    chunksize=16)
+
+            for (_, file), code in zip(stale, compiled):
+                codeHash = None if code is None else hashlib.sha256(code).hexdigest()
+                codes[file] = (stamps[file], code, codeHash)
+
+    frozen = {name for name, file in modules.values() if codes[file][1] is not None}
+    key = HashKey("frozen", [(moduleName, codes[file][2]) for moduleName, (_, file) in modules.items()])
+
+    if state.get("key") != key or not os.path.isfile(frozenFile):
+        os.makedirs(os.path.dirname(frozenFile) or ".", exist_ok=True)
+
+        with open(frozenFile + ".tmp", "w") as f:
+            WriteFrozenModulesCode(f, ((moduleName, False, codes[file][1]) for moduleName, (_, file) in modules.items()
+                                       if codes[file][1] is not None))
+        os.replace(frozenFile + ".tmp", frozenFile)
+
+    if stale or state.get("key") != key:
+        with open(codesFile + ".tmp", "wb") as f:
+            marshal.dump({"version": FROZEN_CODES_VERSION, "key": key, "codes": codes}, f)
+        os.replace(codesFile + ".tmp", codesFile)
+
+    return frozen
+
+
+def _packEntry(file: str, name: str, optimize: Optional[int], compressLevel: int):
+    data = None
+    if optimize is not None and name.endswith(".py"):
+        data = _compileBytecode(file, name, optimize)
+        if data is not None:
+            name += "c"
+
+    if data is None:
+        with open(file, "rb") as f:
+            data = f.read()
+
+    return (name, *Deflate(data, compressLevel))
+
+
+def PackDeps(deps: List[str],
+             outputDir: str,
+             jobs: Optional[int] = None,
+             compressLevel: int = 6,
+             optimize: Optional[int] = None,
+             frozenFile: Optional[str] = None,
+             stateDir: Optional[str] = None):
+    """
+    Entries are compressed on 'jobs' workers and written in order. With a 'stateDir'
+    (the build directory, never 'outputDir', which is shipped), the sources of the
+    entries are remembered there, and an entry whose source is unchanged since the
+    previous python.zip is copied from it without recompressing. Extension files are
+    only copied again when they changed.
+
+    With 'optimize' (0, 1 or 2, as for compile()), modules are packed as .pyc files
+    compiled at that level instead of sources. 'compressLevel=0' stores entries
+    uncompressed and aligned, so zipimport reads them without inflating.
+
+    With 'frozenFile', modules are compiled into that C source as frozen modules
+    (see freeze.frozen) and only the remaining files go into python.zip.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    startTime = time.perf_counter()
+
     libFiles = []
     libFolders = []
     dllLibFiles = []
@@ -135,36 +664,231 @@ def PackDeps(deps: List[str], outputDir: str):
 
                 libFolders.append(os.path.join(PYTHON_LIB_PATH, folder))
 
-    with zipfile.ZipFile(os.path.join(outputDir, 'python.zip'), mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
-        for file in libFiles:
-            print("Pack lib module:", file)
+    magic = importlib.util.MAGIC_NUMBER.hex() if optimize is not None else None
+
+    outputs = [os.path.join(outputDir, 'python.zip')]
+    manifestPath = None
+    if stateDir is not None:
+        manifestPath = os.path.join(stateDir, PACK_MANIFEST_FILE_NAME)
+
+    entries = _collectLibEntries(libFiles, libFolders)
+
+    frozen = set()
+    if frozenFile is not None:
+        frozen = _freezeEntries(entries, frozenFile, optimize or 0, jobs)
+        entries = [(name, file) for name, file in entries if name not in frozen]
+        outputs.append(frozenFile)
+
+    previousManifest, previousEntries = {}, {}
+    if manifestPath is not None:
+        previousManifest, previousEntries = _loadPackManifest(outputs[0], manifestPath)
+    manifest = {}
+
+    reused = 0
+    sourceSize = 0
+    window = max(1, jobs) * 8
+
+    if optimize is not None and jobs > 1:
+        # compile() holds the GIL, unlike zlib
+        executor = ProcessPoolExecutor(max_workers=jobs)
+    else:
+        executor = ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="pack")
+
+    with ZipWriter(outputs[0], align=PACK_ALIGNMENT if not compressLevel else 0) as zw, executor, \
+            open(outputs[0], "rb") if previousEntries else contextlib.nullcontext() as previousZip:
+
+        pending = collections.deque()
+
+        def writePending(keep: int):
+            while len(pending) > keep:
+                name, stat, job = pending.popleft()
+
+                if isinstance(job, tuple):
+                    info, dataOffset = job
+                    zw.copyFrom(ZipEntry(name, info.compress_type, info.CRC, info.compress_size, info.file_size,
+                                         stat.st_mtime), previousZip, dataOffset)
+                else:
+                    entryName, method, crc, fileSize, payload = job.result()
+                    manifest[name][0] = entryName
+                    zw.write(ZipEntry(entryName, method, crc, len(payload), fileSize, stat.st_mtime), payload)
+
+        try:
+            for name, file in entries:
+                stat = os.stat(file)
+                stamp = [file, stat.st_size, stat.st_mtime_ns, compressLevel, optimize, magic]
+                sourceSize += stat.st_size
+
+                previous = previousManifest.get(name)
+                if previous and previous[1:] == stamp and previous[0] in previousEntries:
+                    manifest[name] = previous
+                    pending.append((previous[0], stat, previousEntries[previous[0]]))
+                    reused += 1
+                else:
+                    manifest[name] = [name] + stamp
+                    pending.append((name, stat, executor.submit(_packEntry, file, name, optimize, compressLevel)))
+
+                # Bound the compressed payloads held in memory
+                writePending(window)
+
+            writePending(0)
+
+        except BaseException:
+            for _, _, job in pending:
+                if not isinstance(job, tuple):
+                    job.cancel()
+            raise
+
+    if manifestPath is not None:
+        os.makedirs(stateDir, exist_ok=True)
+        with open(manifestPath + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(manifestPath + ".tmp", manifestPath)
+
+    copied = 0
+    for dllFile in dllLibFiles:
+        dllFileName = os.path.split(dllFile)[1]
+        outputFile = os.path.join(outputDir, dllFileName)
 
-            zf.write(file, file.replace(PYTHON_LIB_PATH, "").strip("\\/"))
+        srcStat = os.stat(dllFile)
+        dstStamp = _fileStamp(outputFile)
+        if dstStamp != [srcStat.st_size, srcStat.st_mtime_ns]:
+            with open(dllFile, "rb") as src, open(outputFile + ".tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+            os.utime(outputFile + ".tmp", ns=(srcStat.st_atime_ns, srcStat.st_mtime_ns))
+            os.replace(outputFile + ".tmp", outputFile)
+            copied += 1
 
-        for folder in set(libFolders):
-            print("Pack lib package:", folder)
+        outputs.append(outputFile)
 
-            for dirPath, dirs, files in os.walk(folder):
-                if dirPath.endswith("__pycache__"):
-                    continue
+    if frozenFile is not None:
+        print(f"Freeze {len(frozen)} modules into \"{frozenFile}\"")
 
-                for file in files:
-                    file = os.path.join(dirPath, file)
-                    print("Pack lib package file:", file)
+    print(f"Pack {len(manifest)} files into \"{outputs[0]}\" "
+          f"({len(manifest) - reused} packed, {reused} reused, "
+          f"{sourceSize / 1024 ** 2:.1f} MB -> {os.path.getsize(outputs[0]) / 1024 ** 2:.1f} MB), "
+          f"copy {copied} of {len(dllLibFiles)} extension files in {time.perf_counter() - startTime:.2f}s")
 
-                    zf.write(file, file.replace(PYTHON_LIB_PATH, "").strip("\\/"))
+    return outputs
 
-    for dllFile in dllLibFiles:
-        print("Copy dll file:", dllFile)
 
-        dllFileName = os.path.split(dllFile)[1]
-        with open(dllFile, "rb") as src:
-            with open(os.path.join(outputDir, dllFileName), "wb") as dst:
-                dst.write(src.read())
+def _getSitePackagesState() -> str:
+    """
+    Hash of what is installed: the RECORD of every distribution plus the name and mtime
+    of every top-level entry, so plain modules dropped into site-packages count too.
+    """
+    state = []
+
+    sitePackagesDirs = {PYTHON_SITE_PACKAGES_PATH, sysconfig.get_path("purelib"), sysconfig.get_path("platlib")}
+    for sitePackagesDir in sorted(sitePackagesDirs):
+        if not os.path.isdir(sitePackagesDir):
+            continue
+
+        for entry in sorted(os.scandir(sitePackagesDir), key=lambda entry: entry.name):
+            state.append((entry.name, entry.stat().st_mtime_ns))
+
+            record = os.path.join(entry.path, "RECORD")
+            if entry.name.endswith(".dist-info") and os.path.isfile(record):
+                state.append(HashFile(record))
+
+    return HashKey(*state)
+
 
+def _getDepsKey(src: str, bundledModules: Dict[str, str], staticAnalysis: bool, packOptions: list) -> str:
+    sources = [HashFile(src)] + [(name, HashFile(path)) for name, path in sorted(bundledModules.items())]
+
+    return HashKey(
+        "deps",
+        sources,
+        os.path.abspath(sys.executable),
+        sys.version,
+        _getSitePackagesState(),
+        staticAnalysis,
+        packOptions,
+        REQUIRED_LIB_FILES,
+        REQUIRED_DLL_FILES
+    )
+
+
+def _fileStamp(path: str) -> Optional[list]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _loadDepsState(stateFile: str) -> dict:
+    try:
+        with open(stateFile, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _outputsUnchanged(state: dict) -> bool:
+    outputs = state.get("outputs")
+    if not outputs:
+        return False
+
+    return all(_fileStamp(path) == stamp for path, stamp in outputs.items())
+
+
+def MakeDeps(src: str,
+             outputDir: str,
+             bundledModules: Optional[Dict[str, str]] = None,
+             staticAnalysis: bool = True,
+             scanCacheFile: Optional[str] = None,
+             compressLevel: int = 6,
+             optimize: Optional[int] = None,
+             frozenFile: Optional[str] = None,
+             stateDir: Optional[str] = None):
+    """
+    'staticAnalysis=False' falls back to AnalyzeDeps, which runs 'src' and traces its imports.
+    'compressLevel', 'optimize', 'frozenFile' and 'stateDir' are passed to PackDeps.
+
+    With a 'stateDir', the result is remembered there as well: while the sources, the
+    interpreter and the installed distributions are unchanged, nothing is analyzed or
+    packed again.
+    """
+    if bundledModules is None:
+        bundledModules = {}
 
-def MakeDeps(src: str, outputDir: str):
     if not os.path.exists(outputDir):
         os.makedirs(outputDir, exist_ok=True)
 
-    PackDeps(AnalyzeDeps(src), outputDir)
+    stateFile = None
+    state = {}
+    packOptions = [compressLevel, optimize, frozenFile]
+    key = _getDepsKey(src, bundledModules, staticAnalysis, packOptions)
+
+    if stateDir is not None:
+        stateFile = os.path.join(stateDir, DEPS_STATE_FILE_NAME)
+        state = _loadDepsState(stateFile)
+
+    if state.get("key") == key and _outputsUnchanged(state):
+        print(f"Dependencies of \"{src}\" unchanged, reuse \"{outputDir}\"")
+        return
+
+    with BUILD_TRACE.span("analyze deps", src):
+        if staticAnalysis:
+            deps = AnalyzeDepsStatic(src, bundledModules, scanCacheFile=scanCacheFile)
+        else:
+            deps = AnalyzeDeps(src)
+
+    startNs = time.perf_counter_ns()
+    outputs = PackDeps(deps, outputDir, compressLevel=compressLevel, optimize=optimize, frozenFile=frozenFile,
+                       stateDir=stateDir)
+    BUILD_TRACE.add("pack deps", startNs, time.perf_counter_ns(), file=src, output=outputs[0] if outputs else None)
+
+    if stateFile is None:
+        return
+
+    state = {
+        "key": key,
+        "outputs": {path: _fileStamp(path) for path in outputs}
+    }
+
+    os.makedirs(stateDir, exist_ok=True)
+    with open(stateFile + ".tmp", "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(stateFile + ".tmp", stateFile)
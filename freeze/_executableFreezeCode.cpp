@@ -2,6 +2,7 @@
 #include <locale.h>
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
 #include <iostream>
 
 #ifdef __FreeBSD__
@@ -22,6 +23,106 @@ static struct _inittab inittab[] = {
 
 extern int __pyx_module_is_main_main;
 
+/* Builtin finder table */
+
+/*
+ * Finds the bundled modules of the inittab, also as submodules of a package, where
+ * BuiltinImporter does not look. Names are looked up in an open addressing table of
+ * FNV-1a hashes generated together with the inittab, entries are inittab index + 1.
+ */
+static unsigned int BuiltinFinder_Hash(const char *name) {
+    unsigned int hash = 2166136261u;
+    for (; *name; name++) {
+        hash = (hash ^ (unsigned char)*name) * 16777619u;
+    }
+    return hash;
+}
+
+
+static int BuiltinFinder_IsBundled(const char *name) {
+    unsigned int i = BuiltinFinder_Hash(name) & BUILTIN_FINDER_TABLE_MASK;
+
+    while (builtinFinderTable[i]) {
+        if (strcmp(inittab[builtinFinderTable[i] - 1].name, name) == 0) {
+            return 1;
+        }
+        i = (i + 1) & BUILTIN_FINDER_TABLE_MASK;
+    }
+    return 0;
+}
+
+
+static PyObject *BuiltinFinder_FindSpec(PyObject *self, PyObject *args, PyObject *kwargs) {
+    static const char *kwlist[] = {"fullname", "path", "target", NULL};
+    static PyObject *moduleSpec = NULL;
+    static PyObject *builtinImporter = NULL;
+
+    const char *fullname;
+    PyObject *path = Py_None;
+    PyObject *target = Py_None;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "s|OO", (char **)kwlist, &fullname, &path, &target)) {
+        return NULL;
+    }
+
+    if (!BuiltinFinder_IsBundled(fullname)) {
+        Py_RETURN_NONE;
+    }
+
+    if (moduleSpec == NULL) {
+        PyObject *bootstrap = PyImport_ImportModule("_frozen_importlib");
+        if (bootstrap == NULL) {
+            return NULL;
+        }
+
+        moduleSpec = PyObject_GetAttrString(bootstrap, "ModuleSpec");
+        builtinImporter = PyObject_GetAttrString(bootstrap, "BuiltinImporter");
+        Py_DECREF(bootstrap);
+
+        if (moduleSpec == NULL || builtinImporter == NULL) {
+            Py_CLEAR(moduleSpec);
+            Py_CLEAR(builtinImporter);
+            return NULL;
+        }
+    }
+
+    return PyObject_CallFunction(moduleSpec, "sOs", fullname, builtinImporter, "built-in");
+}
+
+
+static PyMethodDef builtinFinderMethods[] = {
+    {"find_spec", (PyCFunction)(void(*)(void))BuiltinFinder_FindSpec, METH_VARARGS | METH_KEYWORDS, NULL},
+    {NULL, NULL, 0, NULL}
+};
+
+
+static struct PyModuleDef builtinFinderModule = {
+    PyModuleDef_HEAD_INIT, "_builtin_finder", NULL, -1, builtinFinderMethods
+};
+
+
+// The finder is a module object, the import system only needs its 'find_spec' attribute
+static int InstallBuiltinFinder(void) {
+    PyObject *finder = PyModule_Create(&builtinFinderModule);
+    if (finder == NULL) {
+        return -1;
+    }
+
+    PyObject *metaPath = PySys_GetObject("meta_path");
+    if (metaPath == NULL || PyList_Append(metaPath, finder) < 0) {
+        if (!PyErr_Occurred()) {
+            PyErr_SetString(PyExc_RuntimeError, "sys.meta_path is not available");
+        }
+        Py_DECREF(finder);
+        return -1;
+    }
+
+    Py_DECREF(finder);
+    return 0;
+}
+
+/* Frozen modules definitions */
+
 
 void InitPythonStandalone(int argc, wchar_t** argv) {
     PyConfig config;
@@ -54,6 +155,8 @@ void InitPythonStandalone(int argc, wchar_t** argv) {
     PyWideStringList_Append(&config.module_search_paths, (wexec + L"\\bin\\python.zip").c_str());
     PyWideStringList_Append(&config.module_search_paths, (wexec + L"\\bin\\python.zip\\site-packages").c_str());
 
+    /* Extend frozen modules */
+
     // Existing table of built-in modules
     if (PyImport_ExtendInittab(inittab)) {
         std::cout << "No memory\n";
@@ -105,20 +208,13 @@ int r = 0;
     fpsetmask(m & ~FP_X_OFL);
 #endif
 
+    /* Import profile start */
     /* Python init func */
+    /* Import profile */
 
-    PyRun_SimpleString(
-        "import sys\n"
-        "import importlib.abc\n"
-        "import importlib.machinery\n"
-        "\n"
-        "class Finder(importlib.abc.MetaPathFinder):\n"
-        "    def find_spec(self, fullname, path, target=None):\n"
-        "        if fullname in sys.builtin_module_names:\n"
-        "            return importlib.machinery.ModuleSpec(fullname, importlib.machinery.BuiltinImporter)\n"
-        "\n"
-        "sys.meta_path.append(Finder())\n"
-    );
+    if (InstallBuiltinFinder() < 0) {
+        PyErr_Print();
+    }
     __pyx_module_is_main_main = 1;
     m = PyImport_ImportModule(inittab[0].name);
     if (!m) {
@@ -182,7 +278,7 @@ char2wchar(char* arg)
         /* Overallocate; as multi-byte characters are in the argument, the
            actual output could use less memory. */
         argsize = strlen(arg) + 1;
-        res = malloc(argsize*sizeof(wchar_t));
+        res = (wchar_t *)malloc(argsize*sizeof(wchar_t));
         if (!res) goto oom;
         in = (unsigned char*)arg;
         out = res;
@@ -225,7 +321,7 @@ char2wchar(char* arg)
         /* Cannot use C locale for escaping; manually escape as if charset
            is ASCII (i.e. escape all bytes > 128. This will still roundtrip
            correctly in the locale's charset, which must be an ASCII superset. */
-        res = malloc((strlen(arg)+1)*sizeof(wchar_t));
+        res = (wchar_t *)malloc((strlen(arg)+1)*sizeof(wchar_t));
         if (!res) goto oom;
         in = (unsigned char*)arg;
         out = res;
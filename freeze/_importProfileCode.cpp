@@ -0,0 +1,130 @@
+#include <chrono>
+#include <vector>
+#include <cstdlib>
+
+#if defined(_WIN32) || defined(MS_WINDOWS)
+#include <windows.h>
+#include <psapi.h>
+#elif defined(__APPLE__)
+#include <mach/mach.h>
+#else
+#include <unistd.h>
+#endif
+
+struct ImportProfileRecord {
+    const char *name;
+    double start;
+    double duration;
+    long long memory;
+};
+
+static std::vector<ImportProfileRecord> importProfileRecords;
+static std::chrono::steady_clock::time_point importProfileStart;
+static int importProfileEnabled = 0;
+
+
+static double ImportProfile_Clock(void) {
+    return std::chrono::duration<double>(std::chrono::steady_clock::now() - importProfileStart).count();
+}
+
+
+// Resident set size of the process in bytes, 0 if unknown
+static long long ImportProfile_Memory(void) {
+#if defined(_WIN32) || defined(MS_WINDOWS)
+    PROCESS_MEMORY_COUNTERS counters;
+    if (GetProcessMemoryInfo(GetCurrentProcess(), &counters, sizeof(counters))) {
+        return (long long)counters.WorkingSetSize;
+    }
+    return 0;
+#elif defined(__APPLE__)
+    mach_task_basic_info_data_t info;
+    mach_msg_type_number_t count = MACH_TASK_BASIC_INFO_COUNT;
+    if (task_info(mach_task_self(), MACH_TASK_BASIC_INFO, (task_info_t)&info, &count) == KERN_SUCCESS) {
+        return (long long)info.resident_size;
+    }
+    return 0;
+#else
+    long pages = 0, resident = 0;
+    FILE *f = fopen("/proc/self/statm", "r");
+    if (f) {
+        if (fscanf(f, "%ld %ld", &pages, &resident) != 2) {
+            resident = 0;
+        }
+        fclose(f);
+    }
+    return (long long)resident * sysconf(_SC_PAGESIZE);
+#endif
+}
+
+
+static void ImportProfile_Start(void) {
+    const char *reportPath = getenv("PYTHON_COMPILER_IMPORT_PROFILE");
+
+    importProfileEnabled = reportPath != NULL && reportPath[0] != '\0';
+    importProfileStart = std::chrono::steady_clock::now();
+}
+
+
+static PyObject *ImportProfile_Init(const char *name, PyObject *(*init)(void)) {
+    if (!importProfileEnabled) {
+        return init();
+    }
+
+    double start = ImportProfile_Clock();
+    long long memory = ImportProfile_Memory();
+
+    PyObject *module = init();
+
+    importProfileRecords.push_back({name, start, ImportProfile_Clock() - start, ImportProfile_Memory() - memory});
+
+    return module;
+}
+
+
+static PyObject *ImportProfile_PyClock(PyObject *self, PyObject *args) {
+    return PyFloat_FromDouble(ImportProfile_Clock());
+}
+
+
+static PyObject *ImportProfile_PyMemory(PyObject *self, PyObject *args) {
+    return PyLong_FromLongLong(ImportProfile_Memory());
+}
+
+
+static PyObject *ImportProfile_PyInitRecords(PyObject *self, PyObject *args) {
+    PyObject *records = PyList_New(0);
+    if (records == NULL) {
+        return NULL;
+    }
+
+    for (const ImportProfileRecord &record : importProfileRecords) {
+        PyObject *item = Py_BuildValue("(sddL)", record.name, record.start, record.duration, record.memory);
+        if (item == NULL || PyList_Append(records, item) < 0) {
+            Py_XDECREF(item);
+            Py_DECREF(records);
+            return NULL;
+        }
+        Py_DECREF(item);
+    }
+
+    return records;
+}
+
+
+static PyMethodDef importProfileMethods[] = {
+    {"clock", ImportProfile_PyClock, METH_NOARGS, "Seconds since the executable started."},
+    {"memory", ImportProfile_PyMemory, METH_NOARGS, "Resident set size of the process in bytes."},
+    {"init_records", ImportProfile_PyInitRecords, METH_NOARGS, "(name, start, duration, memory) of every PyInit call."},
+    {NULL, NULL, 0, NULL}
+};
+
+
+static struct PyModuleDef importProfileModule = {
+    PyModuleDef_HEAD_INIT, "_importprofile", NULL, -1, importProfileMethods
+};
+
+
+PyMODINIT_FUNC PyInit__importprofile(void) {
+    return PyModule_Create(&importProfileModule);
+}
+
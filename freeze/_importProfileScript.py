@@ -0,0 +1,108 @@
+import os
+import sys
+import atexit
+import _thread
+import _importprofile
+
+
+class ProfiledLoader:
+    def __init__(self, profiler, loader):
+        self._profiler = profiler
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        self._profiler.begin(spec.name)
+        try:
+            createModule = getattr(self._loader, "create_module", None)
+            return createModule(spec) if createModule is not None else None
+        except BaseException:
+            self._profiler.end()
+            raise
+
+    def exec_module(self, module):
+        # Leave the real loader behind once the module is loaded
+        module.__spec__.loader = self._loader
+        module.__loader__ = self._loader
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler.end()
+
+
+class ImportProfiler:
+    def __init__(self):
+        self.records = []
+        self._stacks = {}
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+
+            findSpec = getattr(finder, "find_spec", None)
+            if findSpec is None:
+                continue
+
+            spec = findSpec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = ProfiledLoader(self, spec.loader)
+                return spec
+
+        return None
+
+    def begin(self, name):
+        stack = self._stacks.setdefault(_thread.get_ident(), [])
+        stack.append([name, _importprofile.clock(), _importprofile.memory(), 0.0])
+
+    def end(self):
+        stack = self._stacks[_thread.get_ident()]
+        name, start, memory, children = stack.pop()
+        duration = _importprofile.clock() - start
+
+        if stack:
+            stack[-1][3] += duration
+
+        self.records.append({
+            "kind": "import",
+            "name": name,
+            "parent": stack[-1][0] if stack else None,
+            "start": start,
+            "duration": duration,
+            "self": duration - children,
+            "memory": _importprofile.memory() - memory
+        })
+
+    def report(self):
+        import json
+        import time
+
+        records = [
+            {"kind": "init", "name": name, "start": start, "duration": duration, "self": duration, "memory": memory}
+            for name, start, duration, memory in _importprofile.init_records()
+        ]
+        records.extend(self.records)
+
+        path = os.environ["PYTHON_COMPILER_IMPORT_PROFILE"]
+        if os.path.isdir(path):
+            executableName = os.path.splitext(os.path.basename(sys.executable or "executable"))[0]
+            path = os.path.join(path, f"{executableName}-{os.getpid()}-{int(time.time() * 1000)}.json")
+
+        with open(path, "w") as f:
+            json.dump({
+                "version": 1,
+                "executable": sys.executable,
+                "argv": sys.argv,
+                "pid": os.getpid(),
+                "time": time.time(),
+                "uptime": _importprofile.clock(),
+                "records": sorted(records, key=lambda record: record["start"])
+            }, f, indent=1)
+
+
+profiler = ImportProfiler()
+sys.meta_path.insert(0, profiler)
+atexit.register(profiler.report)
@@ -1,21 +1,38 @@
 import sys
-import importlib.abc
-import importlib.util
 import importlib.machinery
 
 
-class CythonPackageMetaPathFinder(importlib.abc.MetaPathFinder):
-    def __init__(self, packageName, packageFilePath):
-        super().__init__()
-        self._packageFilePath = packageFilePath
-        self._packageName = packageName
+class CythonPackageMetaPathFinder:
+    def __init__(self):
+        self._packages = {}
 
-    def find_spec(self, fullname, path, target=None):
-        splitName = fullname.split('.')
-        if len(splitName) > 1 and splitName[-2] == self._packageName:
-            fullname = fullname.replace('.', '_')
-            loader = importlib.machinery.ExtensionFileLoader(fullname, self._packageFilePath)
-            return importlib.util.spec_from_loader(fullname, loader)
+    def register(self, packagePath, packageFilePath, submodules):
+        loader = importlib.machinery.ExtensionFileLoader(packagePath, packageFilePath)
+        self._packages[packagePath] = (loader, packageFilePath, frozenset(submodules) if submodules is not None else None)
 
+    def find_spec(self, fullname, path=None, target=None):
+        parentName, _, moduleName = fullname.rpartition('.')
+        package = self._packages.get(parentName)
+        if package is None:
+            return None
 
-sys.meta_path.append(CythonPackageMetaPathFinder('%s', r'%s'))
+        loader, packageFilePath, submodules = package
+        if submodules is not None and moduleName not in submodules:
+            return None
+
+        spec = importlib.machinery.ModuleSpec(fullname.replace('.', '_'), loader, origin=packageFilePath)
+        spec.has_location = True
+        return spec
+
+    def invalidate_caches(self):
+        pass
+
+
+for packageFinder in sys.meta_path:
+    if type(packageFinder).__name__ == 'CythonPackageMetaPathFinder':
+        break
+else:
+    packageFinder = CythonPackageMetaPathFinder()
+    sys.meta_path.append(packageFinder)
+
+packageFinder.register(__PACKAGE_PATH__, r'%s', __SUBMODULES__)
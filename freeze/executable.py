@@ -2,46 +2,158 @@ import os
 
 from typing import List, Optional
 
+from ..codepipeline import CodePipeline, AppendCode
+
 
 _EXECUTABLE_FREEZE_CODE_PATH = os.path.join(os.path.split(__file__)[0], "_executableFreezeCode.cpp")
+_IMPORT_PROFILE_CODE_PATH = os.path.join(os.path.split(__file__)[0], "_importProfileCode.cpp")
+_IMPORT_PROFILE_SCRIPT_PATH = os.path.join(os.path.split(__file__)[0], "_importProfileScript.py")
+
+_FROZEN_MODULES_DEF = 'extern "C" int ExtendFrozenModules(void);\n'
+
+_EXTEND_FROZEN_MODULES_CODE = """// Modules embedded by freeze.frozen
+    if (ExtendFrozenModules()) {
+        std::cout << "No memory\\n";
+        exit(1);
+    }"""
+
+_IMPORT_PROFILE_INSTALL_CODE = """if (importProfileEnabled) {{
+        PyRun_SimpleString(
+{importProfileScript}
+        );
+    }}"""
+
+
+def _cStringLiteral(text: str, indent: str = "  ") -> str:
+    lines = []
+    for line in text.splitlines(keepends=True):
+        line = line.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        lines.append(f'{indent}"{line}"')
+
+    return "\n".join(lines)
+
+
+def _fnv1a(name: str) -> int:
+    value = 0x811C9DC5
+    for byte in name.encode():
+        value = ((value ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return value
+
+
+def GetBuiltinFinderTableCode(modulesNames: List[str]) -> str:
+    """
+    Open addressing table of the inittab entries for the native builtin finder of the
+    executable, mirrors BuiltinFinder_IsBundled in _executableFreezeCode.cpp.
+    """
+    size = 8
+    while size < 2 * len(modulesNames):
+        size *= 2
+
+    table = [0] * size
+    for index, moduleName in enumerate(modulesNames):
+        i = _fnv1a(moduleName) & (size - 1)
+        while table[i]:
+            i = (i + 1) & (size - 1)
+        table[i] = index + 1
+
+    rows = ",\n".join("    " + ", ".join(map(str, table[i:i + 16])) for i in range(0, size, 16))
+
+    return f"#define BUILTIN_FINDER_TABLE_MASK {size - 1}u\nstatic const int builtinFinderTable[{size}] = {{\n{rows}\n}};\n"
+
+
+def GetImportProfileCode() -> str:
+    with open(_IMPORT_PROFILE_CODE_PATH, "r") as f:
+        return f.read()
+
+
+def GetImportProfileInstallCode() -> str:
+    with open(_IMPORT_PROFILE_SCRIPT_PATH, "r") as f:
+        importProfileScript = f.read()
+
+    return _IMPORT_PROFILE_INSTALL_CODE.format(importProfileScript=_cStringLiteral(importProfileScript, " " * 12))
 
 
 def GetExecutableFreezeCode(executeModuleName: str,
                             modulesNames: Optional[List[str]] = None,
                             standalone: Optional[bool] = False,
-                            pythonDepsDir: Optional[str] = None) -> str:
+                            pythonDepsDir: Optional[str] = None,
+                            frozenModules: Optional[bool] = False,
+                            importProfile: Optional[bool] = False) -> str:
+    """
+    With 'importProfile', the executable times every import and every PyInit_* call of
+    the bundled modules when the PYTHON_COMPILER_IMPORT_PROFILE environment variable is
+    set, and writes a JSON report to the file (or into the directory) it names at exit.
+    See the importprofile module for aggregating the reports.
+    """
     if modulesNames is None:
         modulesNames = []
 
     with open(_EXECUTABLE_FREEZE_CODE_PATH, "r") as f:
         code = f.read()
 
+    inittabNames = [executeModuleName] + modulesNames
+
     modInitDef = ""
     modInitMap = ""
-    for moduleName in [executeModuleName] + modulesNames:
+    for moduleName in inittabNames:
         moduleNameWithoutDots = moduleName.replace(".", "_")
 
         modInitDef += f'PyMODINIT_FUNC MODINIT({moduleNameWithoutDots}) (void);\n'
-        modInitMap += f'    {{"{moduleName}", MODINIT({moduleNameWithoutDots})}},\n'
+
+        if importProfile:
+            modInitDef += (f'static PyObject *ProfiledInit_{moduleNameWithoutDots}(void) {{ '
+                           f'return ImportProfile_Init("{moduleName}", MODINIT({moduleNameWithoutDots})); }}\n')
+            modInitMap += f'    {{"{moduleName}", ProfiledInit_{moduleNameWithoutDots}}},\n'
+        else:
+            modInitMap += f'    {{"{moduleName}", MODINIT({moduleNameWithoutDots})}},\n'
+
+    if importProfile:
+        modInitDef = GetImportProfileCode() + modInitDef
+        modInitMap += '    {"_importprofile", PyInit__importprofile},\n'
+        inittabNames.append("_importprofile")
 
     code = code.replace("__pyx_module_is_main_X", f"__pyx_module_is_main_{executeModuleName}")
     code = code.replace("/* ModInit definitions */", modInitDef)
     code = code.replace("/* ModInit map */", modInitMap)
+    code = code.replace("/* Builtin finder table */", GetBuiltinFinderTableCode(inittabNames))
 
     if standalone:
         code = code.replace("/* Python init func */", "InitPythonStandalone(argc, argv);")
     else:
         code = code.replace("/* Python init func */", "InitPythonGlobal(argc, argv);")
 
+    if importProfile:
+        code = code.replace("/* Import profile start */", "ImportProfile_Start();")
+        code = code.replace("/* Import profile */", GetImportProfileInstallCode())
+
+    if standalone and frozenModules:
+        code = code.replace("/* Frozen modules definitions */", _FROZEN_MODULES_DEF)
+        code = code.replace("/* Extend frozen modules */", _EXTEND_FROZEN_MODULES_CODE)
+
     if pythonDepsDir is not None:
         code = code.replace("L\"\\\\bin", f"L\"\\\\{pythonDepsDir}")
 
     return code
 
 
+def ExecutableFreezeTransform(executeModuleName: str,
+                              modulesNames: List[str],
+                              standalone: Optional[bool] = False,
+                              pythonDepsDir: Optional[str] = None,
+                              frozenModules: Optional[bool] = False,
+                              importProfile: Optional[bool] = False) -> AppendCode:
+    return AppendCode("\n\n\n" + GetExecutableFreezeCode(executeModuleName, modulesNames, standalone=standalone,
+                                                         pythonDepsDir=pythonDepsDir, frozenModules=frozenModules,
+                                                         importProfile=importProfile))
+
+
 def AddExecutableFreezeCode(code: str,
                             executeModuleName: str,
                             modulesNames: List[str],
                             standalone: Optional[bool] = False,
-                            pythonDepsDir: Optional[str] = None) -> str:
-    return code + "\n\n\n" + GetExecutableFreezeCode(executeModuleName, modulesNames, standalone=standalone, pythonDepsDir=pythonDepsDir)
+                            pythonDepsDir: Optional[str] = None,
+                            frozenModules: Optional[bool] = False,
+                            importProfile: Optional[bool] = False) -> str:
+    return CodePipeline([ExecutableFreezeTransform(executeModuleName, modulesNames, standalone=standalone,
+                                                   pythonDepsDir=pythonDepsDir, frozenModules=frozenModules,
+                                                   importProfile=importProfile)]).transform(code)
@@ -0,0 +1,95 @@
+from typing import List, Tuple, Iterable, TextIO
+
+
+_FROZEN_HEADER_CODE = """#include <Python.h>
+#include <stdlib.h>
+#include <string.h>
+
+#if PY_VERSION_HEX >= 0x030B0000
+# define FROZEN_ENTRY(name, code, isPackage) {name, code, (int)sizeof(code), isPackage}
+#else
+# define FROZEN_ENTRY(name, code, isPackage) {name, code, (isPackage) ? -(int)sizeof(code) : (int)sizeof(code)}
+#endif
+
+"""
+
+_FROZEN_TABLE_CODE = """
+static const struct _frozen _frozenModules[] = {{
+{frozenEntries}    {{0, 0, 0}}
+}};
+
+/* Put the embedded modules in front of the frozen modules of the interpreter */
+int ExtendFrozenModules(void) {{
+    const struct _frozen *p;
+    struct _frozen *modules;
+    size_t count = 0;
+    size_t ownCount = sizeof(_frozenModules) / sizeof(_frozenModules[0]) - 1;
+
+    if (PyImport_FrozenModules != NULL) {{
+        for (p = PyImport_FrozenModules; p->name != NULL; p++) {{
+            count++;
+        }}
+    }}
+
+    modules = (struct _frozen *)malloc((ownCount + count + 1) * sizeof(struct _frozen));
+    if (modules == NULL) {{
+        return -1;
+    }}
+
+    memcpy(modules, _frozenModules, ownCount * sizeof(struct _frozen));
+    if (count) {{
+        memcpy(modules + ownCount, PyImport_FrozenModules, count * sizeof(struct _frozen));
+    }}
+    memset(modules + ownCount + count, 0, sizeof(struct _frozen));
+
+    PyImport_FrozenModules = modules;
+    return 0;
+}}
+"""
+
+_BYTES_PER_LINE = 32
+
+
+def _arrayName(index: int) -> str:
+    return f"_frozenCode{index}"
+
+
+def GetFrozenHeaderCode() -> str:
+    return _FROZEN_HEADER_CODE
+
+
+def GetFrozenModuleCode(index: int, moduleName: str, code: bytes) -> str:
+    """
+    C array with the marshalled code object of 'moduleName', the 'index'-th entry of the table.
+    """
+    lines = []
+    for i in range(0, len(code), _BYTES_PER_LINE):
+        lines.append("    " + ",".join(map(str, code[i:i + _BYTES_PER_LINE])) + ",\n")
+
+    return f"/* {moduleName} */\nstatic const unsigned char {_arrayName(index)}[] = {{\n{''.join(lines)}}};\n"
+
+
+def GetFrozenTableCode(modules: List[Tuple[str, bool]]) -> str:
+    """
+    '_frozen' table of the (moduleName, isPackage) modules written by GetFrozenModuleCode,
+    installed into PyImport_FrozenModules by ExtendFrozenModules() before Python starts.
+    """
+    frozenEntries = ""
+    for index, (moduleName, isPackage) in enumerate(modules):
+        frozenEntries += f'    FROZEN_ENTRY("{moduleName}", {_arrayName(index)}, {int(isPackage)}),\n'
+
+    return _FROZEN_TABLE_CODE.format(frozenEntries=frozenEntries)
+
+
+def WriteFrozenModulesCode(f: TextIO, modules: Iterable[Tuple[str, bool, bytes]]):
+    """
+    Write a C source with the (moduleName, isPackage, marshalled code) modules as frozen modules.
+    """
+    f.write(GetFrozenHeaderCode())
+
+    table = []
+    for moduleName, isPackage, code in modules:
+        f.write(GetFrozenModuleCode(len(table), moduleName, code))
+        table.append((moduleName, isPackage))
+
+    f.write(GetFrozenTableCode(table))
@@ -1,5 +1,9 @@
 import os
 
+from typing import List, Optional
+
+from ..codepipeline import CodePipeline, ReplaceLines, InsertAfter
+
 _PACKAGE_FINDER_SCRIPT_PATH = os.path.join(os.path.split(__file__)[0], "_packageFinderScript.py")
 
 _PACKAGE_FINDER_CODE = """
@@ -9,7 +13,6 @@ _PACKAGE_FINDER_CODE = """
     PyUnicode_AsUTF8(
       PyUnicode_FromFormat(
         __pkgScript,
-        PyUnicode_AsUTF8(PyObject_GetAttrString(__pyx_m, (char*)"__package__")),
         PyUnicode_AsUTF8(PyObject_GetAttrString(__pyx_m, (char*)"__file__"))
       )
     )
@@ -17,10 +20,20 @@ _PACKAGE_FINDER_CODE = """
 """
 
 
-def GetPackageFinderCode() -> str:
+def GetPackageFinderCode(packagePath: str, submodules: Optional[List[str]] = None) -> str:
+    """
+    Code that registers the package in the shared package finder under its full dotted
+    'packagePath', packages with the same last name do not replace each other. Only
+    'submodules' are looked up in the package file, without them every submodule name is.
+    """
     with open(_PACKAGE_FINDER_SCRIPT_PATH, "r") as f:
         pkgFinderScript = f.read()
 
+    pkgFinderScript = pkgFinderScript.replace("__PACKAGE_PATH__", repr(packagePath)).replace(
+        "__SUBMODULES__",
+        "None" if submodules is None else "(" + "".join(f"'{name}', " for name in submodules) + ")"
+    )
+
     pkgFinderScript = '""\n  "' + pkgFinderScript.replace("\n", '\\n"\n  "')[:-4]
 
     pkgFinderCode = _PACKAGE_FINDER_CODE.format(pkgFinderScript=pkgFinderScript)
@@ -28,32 +41,33 @@ def GetPackageFinderCode() -> str:
     return pkgFinderCode
 
 
-def AddPackageFinderCode(code: str) -> str:
-    if 'if (unlikely(__Pyx_copy_spec_to_module(spec, moddict, "parent", "__package__", 1) < 0)) goto bad;' in code:
-        raise Exception("Package not freezed.")
+_UNFROZEN_PACKAGE_CODE = 'if (unlikely(__Pyx_copy_spec_to_module(spec, moddict, "parent", "__package__", 1) < 0)) goto bad;'
+_UNFROZEN_PATH_CODE = 'if (unlikely(__Pyx_copy_spec_to_module(spec, moddict, "submodule_search_locations", "__path__", 0) < 0)) goto bad;'
 
-    execCodePos = code.find("/*--- Execution code ---*/")
-    endifBeforeExecCodePos = code[execCodePos:].find("#endif")
-    skipEndifPos = code[execCodePos + endifBeforeExecCodePos:].find("\n") + 1
 
-    return (
-            code[:execCodePos + endifBeforeExecCodePos + skipEndifPos] +
-            GetPackageFinderCode() +
-            code[execCodePos + endifBeforeExecCodePos + skipEndifPos:]
-    )
+def PackageFinderTransform(packagePath: str, submodules: Optional[List[str]] = None) -> InsertAfter:
+    """
+    Inserts the package finder code after the '#endif' that closes the start of the execution code.
+    """
+    return InsertAfter(GetPackageFinderCode(packagePath, submodules), "#endif", after="/*--- Execution code ---*/",
+                       forbidden=_UNFROZEN_PACKAGE_CODE, error="Package not freezed.")
 
 
-def FreezePackage(code: str, packageName: str, packagePath: str) -> str:
-    # Freeze '__package__'
-    code = code.replace(
-        'if (unlikely(__Pyx_copy_spec_to_module(spec, moddict, "parent", "__package__", 1) < 0)) goto bad;',
-        f'if (PyDict_SetItemString(moddict, "__path__", PyUnicode_FromString("{packagePath}")) < 0) goto bad;'
-    )
+def FreezePackageTransform(packageName: str, packagePath: str) -> ReplaceLines:
+    return ReplaceLines({
+        # Freeze '__package__'
+        _UNFROZEN_PACKAGE_CODE:
+            f'if (PyDict_SetItemString(moddict, "__path__", PyUnicode_FromString("{packagePath}")) < 0) goto bad;',
+
+        # Freeze '__path__'
+        _UNFROZEN_PATH_CODE:
+            f'if (PyDict_SetItemString(moddict, "__package__", PyUnicode_FromString("{packageName}")) < 0) goto bad;'
+    })
 
-    # Freeze '__path__'
-    code = code.replace(
-        'if (unlikely(__Pyx_copy_spec_to_module(spec, moddict, "submodule_search_locations", "__path__", 0) < 0)) goto bad;',
-        f'if (PyDict_SetItemString(moddict, "__package__", PyUnicode_FromString("{packageName}")) < 0) goto bad;'
-    )
 
-    return code
+def AddPackageFinderCode(code: str, submodules: Optional[List[str]] = None) -> str:
+    return CodePipeline([PackageFinderTransform(submodules)]).transform(code)
+
+
+def FreezePackage(code: str, packageName: str, packagePath: str) -> str:
+    return CodePipeline([FreezePackageTransform(packageName, packagePath)]).transform(code)
@@ -0,0 +1,112 @@
+"""
+Aggregates the import profile reports written by executables built with
+Executable(importProfile=True) and run with PYTHON_COMPILER_IMPORT_PROFILE set:
+
+    python -m <package>.importprofile reports/ [--sort self] [--top 30] [--json]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+
+from typing import List, Dict, Optional
+
+
+IMPORT_PROFILE_ENV = "PYTHON_COMPILER_IMPORT_PROFILE"
+
+SORT_KEYS = ["duration", "self", "memory", "count"]
+
+
+def LoadReports(paths: List[str]) -> List[dict]:
+    """
+    'paths' are report files or directories of them.
+    """
+    reports = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json"))
+        else:
+            files = [path]
+
+        for file in files:
+            with open(file, "r") as f:
+                report = json.load(f)
+
+            if isinstance(report, dict) and "records" in report:
+                reports.append(report)
+
+    return reports
+
+
+def AggregateReports(reports: List[dict]) -> List[Dict[str, object]]:
+    """
+    One row per (kind, name) with the number of runs it appeared in and the median
+    and maximum of its cumulative time, its own time and its memory delta.
+    """
+    samples: Dict[tuple, Dict[str, list]] = {}
+
+    for report in reports:
+        for record in report["records"]:
+            sample = samples.setdefault((record["kind"], record["name"]), {"duration": [], "self": [], "memory": []})
+            sample["duration"].append(record["duration"])
+            sample["self"].append(record["self"])
+            sample["memory"].append(record["memory"])
+
+    rows = []
+    for (kind, name), sample in samples.items():
+        rows.append({
+            "kind": kind,
+            "name": name,
+            "count": len(sample["duration"]),
+            "duration": statistics.median(sample["duration"]),
+            "durationMax": max(sample["duration"]),
+            "self": statistics.median(sample["self"]),
+            "selfMax": max(sample["self"]),
+            "memory": statistics.median(sample["memory"])
+        })
+
+    return rows
+
+
+def FormatRows(rows: List[Dict[str, object]], runs: int, uptime: Optional[float] = None) -> str:
+    lines = [f"{runs} runs" + (f", median uptime {uptime * 1000:.1f} ms" if uptime is not None else "")]
+    lines.append(f"{'cumulative ms':>14} {'max':>9} {'self ms':>9} {'max':>9} {'memory KB':>10} {'runs':>5}  kind    module")
+
+    for row in rows:
+        lines.append(
+            f"{row['duration'] * 1000:>14.2f} {row['durationMax'] * 1000:>9.2f} "
+            f"{row['self'] * 1000:>9.2f} {row['selfMax'] * 1000:>9.2f} "
+            f"{row['memory'] / 1024:>10.0f} {row['count']:>5}  {row['kind']:<7} {row['name']}"
+        )
+
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Aggregate import profile reports of built executables.")
+    parser.add_argument("paths", nargs="+", help="report files or directories of reports")
+    parser.add_argument("--sort", choices=SORT_KEYS, default="self", help="column to sort by (default: self)")
+    parser.add_argument("--top", type=int, default=30, help="number of rows to show, 0 for all (default: 30)")
+    parser.add_argument("--json", action="store_true", help="print the aggregated rows as JSON")
+    args = parser.parse_args(argv)
+
+    reports = LoadReports(args.paths)
+    if not reports:
+        parser.error("no reports found")
+
+    rows = sorted(AggregateReports(reports), key=lambda row: row[args.sort], reverse=True)
+    if args.top:
+        rows = rows[:args.top]
+
+    if args.json:
+        json.dump(rows, sys.stdout, indent=1)
+        print()
+    else:
+        uptimes = [report["uptime"] for report in reports if "uptime" in report]
+        print(FormatRows(rows, len(reports), statistics.median(uptimes) if uptimes else None))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import os
+import sys
+import ast
+import fnmatch
+import importlib.machinery
+
+from typing import Optional, List, Set, Tuple
+
+
+_LAZY_IMPORT_HELPER = '''
+def _pyc_lazy_import_class():
+    import sys
+    import importlib
+
+    def resolve(self):
+        state = object.__getattribute__(self, "_pyc_lazy_state")
+        if len(state) == 1:
+            return state[0]
+
+        scope, name, module, attr, level = state
+
+        imported = importlib.import_module("." * level + module, scope.get("__package__") if level else None)
+        if attr is None:
+            value = imported
+        elif attr == "":
+            value = sys.modules[module.partition(".")[0]]
+        else:
+            try:
+                value = getattr(imported, attr)
+            except AttributeError:
+                value = importlib.import_module(imported.__name__ + "." + attr)
+
+        object.__setattr__(self, "_pyc_lazy_state", (value,))
+        if scope.get(name) is self:
+            scope[name] = value
+        return value
+
+    class LazyImport:
+        # A single slot with an unlikely name, any other attribute is the module's
+        __slots__ = ("_pyc_lazy_state",)
+
+        def __init__(self, scope, name, module, attr, level):
+            object.__setattr__(self, "_pyc_lazy_state", (scope, name, module, attr, level))
+
+        def __getattr__(self, name):
+            return getattr(resolve(self), name)
+
+        def __setattr__(self, name, value):
+            setattr(resolve(self), name, value)
+
+        def __delattr__(self, name):
+            delattr(resolve(self), name)
+
+        def __dir__(self):
+            return dir(resolve(self))
+
+        def __repr__(self):
+            return repr(resolve(self))
+
+    return LazyImport
+
+
+_pyc_LazyImport = _pyc_lazy_import_class()
+del _pyc_lazy_import_class
+'''
+
+
+class DeferredImport:
+    def __init__(self, line: int, name: str, module: str, deferred: bool, reason: Optional[str] = None):
+        self.line = line
+        self.name = name
+        self.module = module
+        self.deferred = deferred
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        state = "deferred" if self.deferred else f"kept ({self.reason})"
+        return f"line {self.line}: {self.name} from {self.module}: {state}"
+
+
+def _isModule(name: str, level: int, fileName: str) -> bool:
+    """
+    Whether 'name', relative to the package of 'fileName' with a 'level', is a module or
+    a package on the disk. Nothing is imported to find out.
+    """
+    directory = os.path.dirname(os.path.abspath(fileName))
+    if level:
+        for _ in range(level - 1):
+            directory = os.path.dirname(directory)
+        searchPath = [directory]
+    else:
+        searchPath = [directory, os.getcwd()] + sys.path
+
+    for part in name.split("."):
+        if searchPath is None:
+            return False
+
+        spec = importlib.machinery.PathFinder.find_spec(part, searchPath)
+        if spec is None:
+            return False
+
+        searchPath = spec.submodule_search_locations
+
+    return True
+
+
+def _importTimeNames(tree: ast.Module) -> Set[str]:
+    """
+    Names read while the module body runs, function bodies are left out.
+    """
+    names = set()
+
+    def visit(node: ast.AST):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for child in node.decorator_list + node.args.defaults + node.args.kw_defaults:
+                if child is not None:
+                    visit(child)
+
+            arguments = node.args.posonlyargs + node.args.args + node.args.kwonlyargs + [node.args.vararg, node.args.kwarg]
+            for argument in arguments:
+                if argument is not None and argument.annotation is not None:
+                    visit(argument.annotation)
+            if node.returns is not None:
+                visit(node.returns)
+            return
+
+        if isinstance(node, ast.Lambda):
+            for child in node.args.defaults + node.args.kw_defaults:
+                if child is not None:
+                    visit(child)
+            return
+
+        for child in ast.iter_child_nodes(node):
+            visit(child)
+
+    for statement in tree.body:
+        if not isinstance(statement, (ast.Import, ast.ImportFrom)):
+            visit(statement)
+
+    return names
+
+
+class LazyImports:
+    """
+    Turns module-level 'import' and 'from ... import' statements of a resource into
+    proxies that import on first use, and then replace themselves in the module globals.
+    Only modules are deferred: 'from ... import' of anything but a submodule found on
+    the disk stays eager, the proxy only forwards attribute access.
+
+    'allow' and 'deny' are lists of module name patterns (fnmatch, a pattern also covers
+    the submodules of what it matches), 'allow=None' allows every module. An import is
+    kept as it is when its name is read while the module body runs, e.g. as a base class
+    or decorator, since deferring it would gain nothing.
+    """
+    def __init__(self, allow: Optional[List[str]] = None, deny: Optional[List[str]] = None):
+        self.allow = allow
+        self.deny = deny if deny is not None else []
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(allow={self.allow!r}, deny={self.deny!r})"
+
+    def getKey(self) -> tuple:
+        return self.allow, self.deny
+
+    @staticmethod
+    def _matches(moduleNames: List[str], patterns: List[str]) -> bool:
+        for moduleName in moduleNames:
+            for pattern in patterns:
+                if fnmatch.fnmatchcase(moduleName, pattern) or moduleName.startswith(pattern + "."):
+                    return True
+        return False
+
+    def _isSelected(self, moduleNames: List[str]) -> bool:
+        if self._matches(moduleNames, self.deny):
+            return False
+        return self.allow is None or self._matches(moduleNames, self.allow)
+
+    def transform(self, source: str, fileName: str = "<source>") -> Tuple[str, List[DeferredImport]]:
+        """
+        Returns the rewritten source and what happened to every candidate import.
+        """
+        tree = ast.parse(source, fileName)
+        importTimeNames = _importTimeNames(tree)
+
+        boundCount = {}
+        for statement in tree.body:
+            if isinstance(statement, (ast.Import, ast.ImportFrom)):
+                for alias in statement.names:
+                    boundName = alias.asname or alias.name.partition(".")[0]
+                    boundCount[boundName] = boundCount.get(boundName, 0) + 1
+
+        report: List[DeferredImport] = []
+        replacements: List[Tuple[ast.stmt, str]] = []
+        helperLine = None
+
+        for statement in tree.body:
+            if isinstance(statement, ast.ImportFrom):
+                if statement.module == "__future__" or any(alias.name == "*" for alias in statement.names):
+                    continue
+
+                module = statement.module or ""
+                level = statement.level
+                targets = [(alias.asname or alias.name, alias.name, [module, f"{module}.{alias.name}".lstrip(".")],
+                            alias.name)
+                           for alias in statement.names]
+
+            elif isinstance(statement, ast.Import):
+                module = None
+                level = 0
+                # A plain 'import a.b' binds the top package, 'import a.b as c' binds the submodule
+                targets = [(alias.asname or alias.name.partition(".")[0], alias.name, [alias.name],
+                            "" if alias.asname is None and "." in alias.name else None)
+                           for alias in statement.names]
+
+            else:
+                continue
+
+            assignments = []
+            entries = []
+            for boundName, importedName, moduleNames, attr in targets:
+                displayModule = "." * level + (module if module is not None else importedName)
+                reason = None
+
+                if not self._isSelected(["." * level + name for name in moduleNames]):
+                    assignments.append(None)
+                    continue
+                elif boundName in importTimeNames:
+                    reason = "used at import time"
+                elif boundCount[boundName] > 1:
+                    reason = "name bound by several imports"
+                elif module is not None and not _isModule(moduleNames[-1], level, fileName):
+                    reason = "not a module"
+
+                entries.append(DeferredImport(statement.lineno, boundName, displayModule, reason is None, reason))
+
+                if reason is not None:
+                    assignments.append(None)
+                    continue
+
+                args = (boundName, module if module is not None else importedName, attr, level)
+                assignments.append(f"{boundName} = _pyc_LazyImport(globals(), {', '.join(map(repr, args))})")
+
+            report.extend(entries)
+            if not entries or None in assignments:
+                # Statements are rewritten whole, a partially kept one stays eager
+                for entry in entries:
+                    if entry.deferred:
+                        entry.deferred = False
+                        entry.reason = "other names of the statement are kept"
+                continue
+
+            if helperLine is None:
+                helperLine = statement.lineno
+            replacements.append((statement, "; ".join(assignments)))
+
+        if not replacements:
+            return source, report
+
+        lines = source.splitlines(keepends=True)
+        for statement, replacement in reversed(replacements):
+            first = statement.lineno - 1
+            last = statement.end_lineno - 1
+            prefix = lines[first][:statement.col_offset]
+            suffix = lines[last].encode()[statement.end_col_offset:].decode()
+            lines[first:last + 1] = [prefix + replacement + suffix] + [""] * (last - first)
+
+        lines.insert(helperLine - 1, _LAZY_IMPORT_HELPER.lstrip("\n") + "\n")
+
+        return "".join(lines), report
+
+    def apply(self, inputFile: str, outputFile: str) -> List[DeferredImport]:
+        """
+        Write the transformed 'inputFile' to 'outputFile'.
+        """
+        with open(inputFile, "rb") as f:
+            source = f.read().decode()
+
+        source, report = self.transform(source, inputFile)
+
+        os.makedirs(os.path.dirname(outputFile) or ".", exist_ok=True)
+        with open(outputFile, "w", encoding="utf-8") as f:
+            f.write(source)
+
+        return report
+
+
+def FormatLazyImportsReport(inputFile: str, report: List[DeferredImport]) -> str:
+    deferred = [entry for entry in report if entry.deferred]
+    kept = [entry for entry in report if not entry.deferred]
+
+    lines = [f"Lazy imports of {inputFile}: {len(deferred)} deferred, {len(kept)} kept"]
+    lines.extend(f"    {entry!r}" for entry in deferred + kept)
+
+    return "\n".join(lines)
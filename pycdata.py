@@ -0,0 +1,167 @@
+"""
+Runtime access to the data archive of an executable built with Executable(dataArchive=...),
+compiled into the executable as the 'pycdata' module:
+
+    import pycdata
+    icon = pycdata.Get("Resources/main.ico")    # memoryview into the mapped archive
+
+The archive is looked up at the end of the executable, then next to it as
+'<executable>.pycdata'. Without one, e.g. while the application runs from its sources,
+files are read from the directory of the main script instead.
+
+Only the standard library is used, the module is also importable from the sources.
+"""
+import os
+import sys
+import mmap
+import struct
+import threading
+
+from typing import Optional, List, Dict, Tuple
+
+
+ARCHIVE_EXT = ".pycdata"
+
+# Keep in sync with dataarchive.py
+_MAGIC = b"PYCDATA1"
+_TRAILER = struct.Struct("<8sQQQ")
+_COUNT = struct.Struct("<I")
+_ENTRY = struct.Struct("<HQQ")
+
+
+def _normName(name: str) -> str:
+    return os.path.normpath(name).replace("\\", "/").lstrip("/")
+
+
+class DataArchive:
+    """
+    Read-only memory map of an archive, Get() returns memoryviews into it without copying.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            fileSize = f.tell()
+            if fileSize < _TRAILER.size:
+                raise ValueError(f"\"{path}\" has no data archive")
+
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, indexOffset, indexSize, archiveSize = _TRAILER.unpack_from(self._map, fileSize - _TRAILER.size)
+        if magic != _MAGIC or archiveSize > fileSize:
+            self._map.close()
+            raise ValueError(f"\"{path}\" has no data archive")
+
+        start = fileSize - archiveSize
+        self._view = memoryview(self._map)
+        self._entries: Dict[str, Tuple[int, int]] = {}
+
+        index = self._view[start + indexOffset:start + indexOffset + indexSize]
+        count, = _COUNT.unpack_from(index, 0)
+        position = _COUNT.size
+        for _ in range(count):
+            nameSize, offset, size = _ENTRY.unpack_from(index, position)
+            position += _ENTRY.size
+            name = bytes(index[position:position + nameSize]).decode()
+            position += nameSize
+            self._entries[name] = (start + offset, size)
+
+    def __contains__(self, name: str) -> bool:
+        return _normName(name) in self._entries
+
+    def Names(self) -> List[str]:
+        return sorted(self._entries)
+
+    def Get(self, name: str) -> memoryview:
+        entry = self._entries.get(_normName(name))
+        if entry is None:
+            raise FileNotFoundError(f"\"{name}\" is not in the data archive \"{self.path}\"")
+
+        offset, size = entry
+        return self._view[offset:offset + size]
+
+
+class FileSystemData:
+    """
+    Fallback with the same interface that reads the files under 'root'.
+    """
+    def __init__(self, root: str):
+        self.path = root
+
+    def __contains__(self, name: str) -> bool:
+        return os.path.isfile(os.path.join(self.path, _normName(name)))
+
+    def Names(self) -> List[str]:
+        names = []
+        for dirPath, _, fileNames in os.walk(self.path):
+            names.extend(_normName(os.path.relpath(os.path.join(dirPath, fileName), self.path)) for fileName in fileNames)
+        return sorted(names)
+
+    def Get(self, name: str) -> memoryview:
+        with open(os.path.join(self.path, _normName(name)), "rb") as f:
+            return memoryview(f.read())
+
+
+def _findArchive() -> Optional[str]:
+    executable = sys.executable
+    if not executable or not os.path.isfile(executable):
+        return None
+
+    with open(executable, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() >= _TRAILER.size:
+            f.seek(-_TRAILER.size, os.SEEK_END)
+            if f.read(len(_MAGIC)) == _MAGIC:
+                return executable
+
+    archive = os.path.splitext(executable)[0] + ARCHIVE_EXT
+    if os.path.isfile(archive):
+        return archive
+
+    return None
+
+
+def Open(path: Optional[str] = None, root: Optional[str] = None):
+    """
+    The archive at 'path', or the archive of the running executable. Without an archive,
+    the files under 'root' (default: the directory of the main script) are used.
+    """
+    if path is None:
+        path = _findArchive()
+
+    if path is not None:
+        return DataArchive(path)
+
+    if root is None:
+        mainFile = getattr(sys.modules.get("__main__"), "__file__", None) or (sys.argv[0] if sys.argv else "")
+        root = os.path.dirname(os.path.abspath(mainFile)) if mainFile else os.getcwd()
+
+    return FileSystemData(root)
+
+
+_default = None
+_defaultLock = threading.Lock()
+
+
+def _getDefault():
+    global _default
+
+    if _default is None:
+        with _defaultLock:
+            if _default is None:
+                _default = Open()
+
+    return _default
+
+
+def Get(name: str) -> memoryview:
+    return _getDefault().Get(name)
+
+
+def Exists(name: str) -> bool:
+    return name in _getDefault()
+
+
+def Names() -> List[str]:
+    return _getDefault().Names()
@@ -1,12 +1,25 @@
 import os
-
-from typing import Optional, List, Tuple, TypeVar, Union
-
-from Cython.Build.Dependencies import cythonize_one
-from Cython.Compiler.Main import CompilationOptions
-
-from .freeze.package import FreezePackage, AddPackageFinderCode
-from .freeze.executable import AddExecutableFreezeCode
+import time
+import fnmatch
+import threading
+import contextlib
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional, List, Tuple, TypeVar, Union, Callable, Dict
+
+import Cython
+import Cython.Utils
+from Cython.Build.Dependencies import cythonize_one, DependencyTree
+from Cython.Compiler.Main import CompilationOptions, Context, default_options
+from Cython.Compiler.Options import get_directive_defaults
+
+from .cache import BuildCache, HashFile, HashFileStamped, HashKey
+from .buildtrace import BUILD_TRACE
+from .lazyimports import LazyImports, FormatLazyImportsReport
+from .datasync import CopyFile, IsUpToDate, SYNC_COPY
+from .codepipeline import CodePipeline
+from .freeze.package import FreezePackageTransform, PackageFinderTransform
+from .freeze.executable import ExecutableFreezeTransform
 from .freeze.rc import GetRcCode
 
 
@@ -24,6 +37,10 @@ def _getExtensionName(fileName: str, withoutInit: bool = True) -> str:
     while tmpName:
         tmpName, level = os.path.split(tmpName)
 
+        # The root of an absolute path
+        if not level:
+            break
+
         if withoutInit and level == "__init__":
             continue
 
@@ -78,65 +95,262 @@ class BaseResourceWithName(BaseResource):
                f"(inputFile=\"{self.inputFile}\", outputFile=\"{self.outputFile}\", name=\"{self.name}\")>"
 
 
+# Cython keeps global compiler state, in-process runs from several build threads must not overlap
+_cythonizeLock = threading.Lock()
+
+_sharedExecutor: Optional[ProcessPoolExecutor] = None
+
+_FREEZE_CODE_DIR = os.path.join(os.path.split(__file__)[0], "freeze")
+_LAZY_IMPORTS_FILE = os.path.join(os.path.split(__file__)[0], "lazyimports.py")
+
+LAZY_IMPORTS_DIR = "__lazy__"
+_freezeCodeKey: Optional[str] = None
+
+
+_dependencyTree: Optional[DependencyTree] = None
+
+
+def _cythonDependencies(inputFile: str) -> List[str]:
+    """
+    'inputFile' and the files it depends on through cimport and include, transitively.
+    """
+    global _dependencyTree
+
+    if _dependencyTree is None:
+        context = Context(["."], get_directive_defaults(), options=CompilationOptions(default_options))
+        _dependencyTree = DependencyTree(context, quiet=True)
+
+    return sorted(_dependencyTree.all_dependencies(inputFile))
+
+
+def _getFreezeCodeKey() -> str:
+    """
+    Hash of the code templates the freeze stages add, a new version of them invalidates cached stages.
+    """
+    global _freezeCodeKey
+
+    if _freezeCodeKey is None:
+        _freezeCodeKey = HashKey(*(
+            HashFile(os.path.join(_FREEZE_CODE_DIR, fileName))
+            for fileName in sorted(os.listdir(_FREEZE_CODE_DIR))
+            if fileName.endswith((".py", ".cpp"))
+        ))
+
+    return _freezeCodeKey
+
+
+def _cythonizeOne(args: tuple) -> Optional[list]:
+    """
+    Returns the lazy imports report when the source is rewritten first.
+    """
+    inputFile, outputFile, options, name, lazyImports, lazyFile = args
+
+    report = None
+    if lazyImports is not None:
+        report = lazyImports.apply(inputFile, lazyFile)
+        inputFile = lazyFile
+
+    with _cythonizeLock:
+        cythonize_one(
+            pyx_file=inputFile,
+            c_file=outputFile,
+            fingerprint=None,
+            quiet=False,
+            options=options,
+            full_module_name=name
+        )
+
+    return report
+
+
+def _cythonizeTimed(args: tuple) -> tuple:
+    """
+    _cythonizeOne() on a pool worker, with the span for the build trace of the main process.
+    """
+    startNs = time.perf_counter_ns()
+    report = _cythonizeOne(args)
+    return report, startNs, time.perf_counter_ns(), os.getpid(), threading.get_ident()
+
+
+@contextlib.contextmanager
+def CythonizePool(jobs: Optional[int] = None):
+    """
+    Share one process pool of 'jobs' workers between all CythonizeResources() calls
+    made while the context is active.
+    """
+    global _sharedExecutor
+
+    previous = _sharedExecutor
+    executor = ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1)
+    _sharedExecutor = executor
+    try:
+        yield executor
+    finally:
+        _sharedExecutor = previous
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
 class CythonizeResource(BaseResourceWithName):
-    def __init__(self, inputFile: str, name: Optional[str] = None):
+    def __init__(self, inputFile: str, name: Optional[str] = None, lazyImports: Optional[LazyImports] = None):
         super().__init__(inputFile, None, name)
 
+        self.lazyImports = lazyImports
+        self.deferredImports = None
+
         self._cythonized = False
+        self._packageFrozen = False
         self.package = False
 
+        self._buildCache: Optional[BuildCache] = None
+        self._cacheKey: Optional[str] = None
+        self._lazyImportsDir: Optional[str] = None
+
         self.cppOptions = CompilationOptions(compiler_directives=COMPILER_DIRECTIVES)
         self.cppOptions.cplus = True
 
         self.outputFile = os.path.splitext(self.inputFile)[0] + CPP_EXT
 
+    def reset(self):
+        """
+        Cythonize and freeze again on the next build, from the cache while the source is unchanged.
+        """
+        self._cythonized = False
+        self._packageFrozen = False
+        self.deferredImports = None
+
     def _checkCythonized(self):
         if not self._cythonized:
             raise Exception(f"File '{self.inputFile}' not cythonized!")
 
-    def _getCythonizedCode(self) -> str:
+    def _transformCythonizedCode(self, pipeline: CodePipeline):
+        """
+        One streaming pass over the generated '.cpp' with every transform of 'pipeline'.
+        """
         self._checkCythonized()
 
-        with open(self.outputFile, "r") as f:
-            content = f.read()
-
-        return content
-
-    def _setCythonizedCode(self, content):
-        self._checkCythonized()
+        with BUILD_TRACE.span("freeze", self.outputFile, output=self.outputFile):
+            pipeline.apply(self.outputFile)
 
-        with open(self.outputFile, "w") as f:
-            f.write(content)
+    def _getModuleName(self) -> str:
+        if self.package:
+            return self.name.replace(".", "_")
 
-    def cythonize(self, package: Optional[bool] = None):
-        if self._cythonized:
-            return
+        return self.name.split(".")[-1]
 
+    def _getCythonizeArgs(self, package: Optional[bool] = None, buildTemp: Optional[str] = None) -> tuple:
         if package is not None:
             self.package = package
 
-        if self.package:
-            name = self.name.replace(".", "_")
-        else:
-            name = self.name.split(".")[-1]
-
-        cythonize_one(
-            pyx_file=self.inputFile,
-            c_file=self.outputFile,
-            fingerprint=None,
-            quiet=False,
-            options=self.cppOptions,
-            full_module_name=name
+        self._lazyImportsDir = None if buildTemp is None else os.path.join(buildTemp, LAZY_IMPORTS_DIR)
+
+        lazyImports = self._getLazyImports()
+        lazyFile = None
+        if lazyImports is not None:
+            # The source tree is left alone, the rewritten source mirrors its absolute path
+            lazyFile = os.path.join(self._lazyImportsDir,
+                                    os.path.splitdrive(os.path.abspath(self.inputFile))[1].lstrip("\\/"))
+
+        return self.inputFile, self.outputFile, self.cppOptions, self._getModuleName(), lazyImports, lazyFile
+
+    def _getLazyImports(self) -> Optional[LazyImports]:
+        """
+        Only plain Python sources are rewritten, and not the ones a '.pxd' augments,
+        Cython looks for it next to the file it compiles. The rewritten source goes into
+        the build directory, without one the source is not rewritten.
+        """
+        if self.lazyImports is None or self._lazyImportsDir is None or not self.inputFile.endswith(".py"):
+            return None
+
+        if os.path.isfile(os.path.splitext(self.inputFile)[0] + ".pxd"):
+            return None
+
+        return self.lazyImports
+
+    def _getCacheKey(self) -> str:
+        # The source, its '.pxd' and everything they cimport or include
+        sourceHashes = [HashFileStamped(dependency) for dependency in _cythonDependencies(self.inputFile)]
+
+        return HashKey(
+            "cythonize",
+            sourceHashes,
+            sorted(self.cppOptions.compiler_directives.items()),
+            self.cppOptions.cplus,
+            Cython.__version__,
+            self.package,
+            self._getModuleName(),
+            self._getLazyImports() and [self._getLazyImports().getKey(), HashFile(_LAZY_IMPORTS_FILE)]
         )
 
+    def _restoreCythonized(self, cache: Optional[BuildCache]) -> bool:
+        self._buildCache = cache
+        self._cacheKey = None
+
+        if cache is None:
+            return False
+
+        self._cacheKey = self._getCacheKey()
+        if not cache.get(self._cacheKey, self.outputFile, kind="cython"):
+            return False
+
+        print(f"Cythonize {self.inputFile}: unchanged, reuse cached \"{self.outputFile}\"")
+        self._cythonized = True
+        return True
+
+    def _restoreStage(self, stage: str, *args) -> bool:
+        """
+        Every post-processing stage continues the key chain, so a hit restores
+        the '.cpp' exactly as it was after that stage in a previous build.
+        """
+        if self._cacheKey is None:
+            return False
+
+        self._cacheKey = HashKey(self._cacheKey, stage, _getFreezeCodeKey(), args)
+        return self._buildCache.get(self._cacheKey, self.outputFile, kind="cython")
+
+    def _storeCythonized(self):
+        if self._cacheKey is not None:
+            self._buildCache.put(self._cacheKey, self.outputFile)
+
+    def _setCythonized(self, deferredImports: Optional[list]):
         self._cythonized = True
+        self._storeCythonized()
+
+        self.deferredImports = deferredImports
+        if deferredImports:
+            print(FormatLazyImportsReport(self.inputFile, deferredImports))
+
+    def cythonize(self,
+                  package: Optional[bool] = None,
+                  cache: Optional[BuildCache] = None,
+                  buildTemp: Optional[str] = None):
+        """
+        Sources rewritten for lazy imports are written into 'buildTemp'.
+        """
+        if self._cythonized:
+            return
+
+        args = self._getCythonizeArgs(package, buildTemp)
+        if self._restoreCythonized(cache):
+            return
+
+        with BUILD_TRACE.span("cythonize", self.inputFile, output=self.outputFile):
+            report = _cythonizeOne(args)
 
-    def freezePackage(self):
+        self._setCythonized(report)
+
+    def freezePackage(self, submodules: Optional[List[str]] = None):
+        """
+        'submodules' are the names of the other modules built into the package file,
+        the package finder added to an '__init__' only resolves those.
+        """
         self._checkCythonized()
 
         if not self.package:
             raise Exception("Cythonized without 'package=True' arg")
 
+        if self._packageFrozen:
+            return
+
         packageName = None
         packagePath = None
         addPackageFinder = False
@@ -151,19 +365,28 @@ class CythonizeResource(BaseResourceWithName):
             packagePath = ".".join(self.name.split(".")[:-1])
 
         if (packageName is not None) and (packagePath is not None):
-            code = self._getCythonizedCode()
+            if addPackageFinder and submodules is not None:
+                submodules = sorted(submodules)
+            else:
+                submodules = None
 
-            code = FreezePackage(code, packageName=packageName, packagePath=packagePath)
+            if not self._restoreStage("freezePackage", packageName, packagePath, addPackageFinder, submodules):
+                pipeline = CodePipeline([FreezePackageTransform(packageName, packagePath)])
 
-            if addPackageFinder:
-                code = AddPackageFinderCode(code)
+                if addPackageFinder:
+                    pipeline.add(PackageFinderTransform(packagePath, submodules))
 
-            self._setCythonizedCode(code)
+                self._transformCythonizedCode(pipeline)
+                self._storeCythonized()
+
+        self._packageFrozen = True
 
     def freezeExecutable(self,
                          modules: Optional[List["CythonizeResource"]] = None,
                          standalone: Optional[bool] = False,
-                         pythonDepsDir: Optional[str] = None):
+                         pythonDepsDir: Optional[str] = None,
+                         frozenModules: Optional[bool] = False,
+                         importProfile: Optional[bool] = False):
         self._checkCythonized()
 
         if modules is None:
@@ -171,11 +394,14 @@ class CythonizeResource(BaseResourceWithName):
 
         moduleNames = [module.name for module in modules]
 
-        code = self._getCythonizedCode()
-
-        code = AddExecutableFreezeCode(code, self.name, moduleNames, standalone=standalone, pythonDepsDir=pythonDepsDir)
+        if self._restoreStage("freezeExecutable", moduleNames, standalone, pythonDepsDir, frozenModules, importProfile):
+            return
 
-        self._setCythonizedCode(code)
+        self._transformCythonizedCode(CodePipeline([
+            ExecutableFreezeTransform(self.name, moduleNames, standalone=standalone, pythonDepsDir=pythonDepsDir,
+                                      frozenModules=frozenModules, importProfile=importProfile)
+        ]))
+        self._storeCythonized()
 
 
 class PythonFile(CythonizeResource):
@@ -247,18 +473,95 @@ class DataFile(BaseResource):
         if not os.path.exists(self.inputFilePath):
             raise Exception(f"File \"{self.inputFilePath}\' not exist")
 
-    def clone(self, path: str):
+    def getOutputFile(self, path: str) -> str:
+        return os.path.join(path, self.inputFile)
+
+    def clone(self, path: str, mode: str = SYNC_COPY, checkHash: bool = True) -> bool:
+        """
+        Copy the file into 'path' unless the copy there is up to date, see datasync.SyncFiles().
+        """
+        outputFile = self.getOutputFile(path)
+        if IsUpToDate(self.inputFilePath, outputFile, checkHash):
+            return False
+
         print(f"Clone data file {self.inputFilePath}")
 
-        outputFile = os.path.join(path, self.inputFile)
-        outputPath, _ = os.path.split(outputFile)
+        os.makedirs(os.path.dirname(outputFile) or ".", exist_ok=True)
+        with BUILD_TRACE.span("data", self.inputFilePath, output=outputFile):
+            CopyFile(self.inputFilePath, outputFile, mode)
+
+        return True
+
+
+def CythonizeResources(tasks: List[Tuple[CythonizeResource, Optional[bool]]],
+                       jobs: Optional[int] = None,
+                       onCythonized: Optional[Callable[[CythonizeResource], None]] = None,
+                       cache: Optional[BuildCache] = None,
+                       buildTemp: Optional[str] = None):
+    """
+    Cythonize resources on a process pool.
+
+    'tasks' is a list of (resource, package) pairs, 'package' and 'buildTemp' have the
+    same meaning as in CythonizeResource.cythonize(). Resources finish in any order,
+    'onCythonized' is called in the main process for every resource as soon as its
+    '.cpp' is ready. Resources found in 'cache' are restored without starting a worker.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if onCythonized is None:
+        onCythonized = lambda resource: None
+
+    pending = []
+    for resource, package in tasks:
+        # Like cythonize(), the mode it was cythonized with stays, freezePackage() checks it
+        if resource._cythonized:
+            onCythonized(resource)
+            continue
+
+        args = resource._getCythonizeArgs(package, buildTemp)
+        if resource._restoreCythonized(cache):
+            onCythonized(resource)
+        else:
+            pending.append((resource, args))
+
+    if jobs <= 1 or (len(pending) <= 1 and _sharedExecutor is None):
+        for resource, args in pending:
+            with BUILD_TRACE.span("cythonize", resource.inputFile, output=resource.outputFile):
+                report = _cythonizeOne(args)
+
+            resource._setCythonized(report)
+            onCythonized(resource)
+
+        return
+
+    executor = _sharedExecutor
+    ownExecutor = executor is None
+    if ownExecutor:
+        executor = ProcessPoolExecutor(max_workers=min(jobs, len(pending)))
+
+    futures = {}
+    try:
+        futures = {executor.submit(_cythonizeTimed, args): resource for resource, args in pending}
+
+        for future in as_completed(futures):
+            resource = futures[future]
+            report, startNs, endNs, pid, tid = future.result()
 
-        if not os.path.exists(outputPath):
-            os.makedirs(outputPath, exist_ok=True)
+            BUILD_TRACE.add("cythonize", startNs, endNs, file=resource.inputFile, output=resource.outputFile,
+                            pid=pid, tid=tid, threadName="Cythonize worker")
 
-        with open(self.inputFilePath, "rb") as src:
-            with open(outputFile, "wb") as dst:
-                dst.write(src.read())
+            resource._setCythonized(report)
+            onCythonized(resource)
+
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+    finally:
+        if ownExecutor:
+            executor.shutdown(wait=True)
 
 
 RESOURCE_CLASSES = [
@@ -273,46 +576,178 @@ _TBaseRes = TypeVar('_TBaseRes', bound=BaseResource)
 _TStr = Union[str, List['_TStr']]
 
 
-def ResourcesFromFileName(inputFile: _TStr, clone: bool = False, homePath: Optional[str] = None) -> List[_TBaseRes]:
+_GLOB_CHARS = set("*?[")
+
+_listingCache: Dict[str, Tuple[int, List[Tuple[str, bool, bool]]]] = {}
+_listingLock = threading.Lock()
+
+
+def ClearDirectoryCache():
+    """
+    Forget the directory listings and the cimports and includes found in the sources,
+    ProcessAll() does it at the end of every build.
+    """
+    global _dependencyTree
+
+    with _listingLock:
+        _listingCache.clear()
+
+    # Cython remembers what it parsed for the life of the process
+    _dependencyTree = None
+    Cython.Utils.clear_function_caches()
+
+
+def _listDir(path: str) -> List[Tuple[str, bool, bool]]:
+    """
+    Sorted (name, isDir, isFile) entries of a directory. Listings are cached and reused
+    while the modification time of the directory stays the same.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+    cached = _listingCache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with os.scandir(path) as entries:
+        listing = sorted((entry.name, entry.is_dir(), entry.is_file()) for entry in entries)
+
+    with _listingLock:
+        _listingCache[path] = (mtime, listing)
+
+    return listing
+
+
+def _splitPattern(pattern: str) -> List[str]:
+    """
+    The drive and root of an absolute pattern stay its first part.
+    """
+    drive, path = os.path.splitdrive(pattern)
+    for sep in [os.sep, os.altsep]:
+        if sep and sep != "/":
+            path = path.replace(sep, "/")
+
+    root = drive + (os.sep if path.startswith("/") else "")
+    parts = [part for part in path.split("/") if part not in ["", "."]]
+
+    return ([root] if root else []) + parts
+
+
+def _isGlob(part: str) -> bool:
+    return not _GLOB_CHARS.isdisjoint(part)
+
+
+def _matchName(pattern: str, name: str) -> bool:
+    """
+    Name and extension are matched on their own, '.*' also matches no extension at all.
+    """
+    patternName, patternExt = os.path.splitext(pattern)
+    fileName, fileExt = os.path.splitext(name)
+
+    return fnmatch.fnmatchcase(fileName, patternName) and (patternExt == ".*" or fnmatch.fnmatchcase(fileExt, patternExt))
+
+
+def _matchPath(patternParts: List[str], pathParts: List[str]) -> bool:
+    if not patternParts:
+        return not pathParts
+
+    if patternParts[0] == "**":
+        return any(_matchPath(patternParts[1:], pathParts[index:]) for index in range(len(pathParts) + 1))
+
+    return bool(pathParts) and _matchName(patternParts[0], pathParts[0]) and _matchPath(patternParts[1:], pathParts[1:])
+
+
+def _isExcluded(pathParts: List[str], exclude: List[List[str]]) -> bool:
+    return any(_matchPath(patternParts, pathParts) for patternParts in exclude)
+
+
+def _glob(homePath: str, pathParts: List[str], patternParts: List[str], exclude: List[List[str]], found: dict):
+    directory = os.path.join(homePath, *pathParts) or "."
+    part = patternParts[0]
+
+    if part == "**":
+        _glob(homePath, pathParts, patternParts[1:], exclude, found)
+
+        for name, isDir, _ in _listDir(directory):
+            if isDir and not _isExcluded(pathParts + [name], exclude):
+                _glob(homePath, pathParts + [name], patternParts, exclude, found)
+        return
+
+    if len(patternParts) == 1:
+        for name, _, isFile in _listDir(directory):
+            if isFile and _matchName(part, name) and not _isExcluded(pathParts + [name], exclude):
+                found[os.path.join(*pathParts, name)] = None
+        return
+
+    if not _isGlob(part):
+        _glob(homePath, pathParts + [part], patternParts[1:], exclude, found)
+        return
+
+    for name, isDir, _ in _listDir(directory):
+        if isDir and _matchName(part, name) and not _isExcluded(pathParts + [name], exclude):
+            _glob(homePath, pathParts + [name], patternParts[1:], exclude, found)
+
+
+def _resourceFromFileName(inputFile: str, clone: bool, homePath: str) -> BaseResource:
+    if clone:
+        return DataFile(inputFile, homePath=homePath)
+
+    fileExt = os.path.splitext(inputFile)[1]
+    for resCls in RESOURCE_CLASSES:
+        if fileExt in resCls.supportExt:
+            return resCls(inputFile)
+
+    return BaseResource(inputFile)
+
+
+def ResourcesFromFileName(inputFile: _TStr,
+                          clone: bool = False,
+                          homePath: Optional[str] = None,
+                          exclude: Optional[List[str]] = None,
+                          strict: bool = False) -> List[_TBaseRes]:
+    """
+    'inputFile' is a file name, a pattern or a (nested) list of them, relative to 'homePath'.
+    Patterns match names with '*', '?' and '[...]', where the extension is matched on its
+    own ('name.*', '*.py'): '*' matches the names without an extension, '*.*' all of them.
+    '**' matches any number of directories. Files matching one of the 'exclude' patterns,
+    or a pattern that starts with '!' in the same list, are left out, as are the directories
+    they match. With 'strict', a pattern that matches no file raises FileNotFoundError.
+    """
     resources: List[_TBaseRes] = []
 
     if homePath is None:
         homePath = ""
 
+    if exclude is None:
+        exclude = []
+
     if isinstance(inputFile, (list, tuple)):
+        exclude = exclude + [pattern[1:] for pattern in inputFile if isinstance(pattern, str) and pattern.startswith("!")]
+
         for _inputFile in inputFile:
-            resources.extend(ResourcesFromFileName(_inputFile, clone, homePath=homePath))
+            if not (isinstance(_inputFile, str) and _inputFile.startswith("!")):
+                resources.extend(ResourcesFromFileName(_inputFile, clone, homePath=homePath, exclude=exclude,
+                                                       strict=strict))
 
         return resources
 
-    fileDir, fullFileName = os.path.split(inputFile)
-    fileName, fileExt = os.path.splitext(fullFileName)
-
-    if fileName == "*" or fileExt == ".*":
-        for fileInDir in os.listdir(os.path.join(homePath, fileDir)):
-            if not os.path.isfile(os.path.join(homePath, fileDir, fileInDir)):
-                continue
+    patternParts = _splitPattern(inputFile)
 
-            fileInDirName, fileInDirExt = os.path.splitext(fileInDir)
+    if not any(_isGlob(part) for part in patternParts):
+        if not _isExcluded(patternParts, [_splitPattern(pattern) for pattern in exclude]):
+            resources.append(_resourceFromFileName(inputFile, clone, homePath))
 
-            if fileName not in ["*", fileInDirName]:
-                continue
-
-            if fileExt not in [".*", fileInDirExt]:
-                continue
+        return resources
 
-            resources.extend(ResourcesFromFileName(os.path.join(fileDir, fileInDir), clone, homePath=homePath))
+    found = {}
+    _glob(homePath, [], patternParts, [_splitPattern(pattern) for pattern in exclude], found)
 
-    elif clone:
-        resources.append(DataFile(inputFile, homePath=homePath))
+    if strict and not found:
+        raise FileNotFoundError(f"No file matches \"{inputFile}\"" + (f" in \"{homePath}\"" if homePath else ""))
 
-    else:
-        for resCls in RESOURCE_CLASSES:
-            if fileExt in resCls.supportExt:
-                resources.append(resCls(inputFile))
-                break
-        else:
-            resources.append(BaseResource(inputFile))
+    for fileName in found:
+        resources.append(_resourceFromFileName(fileName, clone, homePath))
 
     return resources
-
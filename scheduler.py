@@ -0,0 +1,117 @@
+import os
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Optional, List, Dict, Set, Tuple, Callable, TypeVar
+
+
+_TNode = TypeVar('_TNode')
+
+
+class BuildError(Exception):
+    """
+    Raised once at the end of a build with every failed node and the nodes
+    that were skipped because something they depend on failed.
+    """
+    def __init__(self, failures: List[Tuple[object, BaseException]], skipped: List[object]):
+        self.failures = failures
+        self.skipped = skipped
+
+        report = [f"{len(failures)} of the build steps failed"]
+        for node, error in failures:
+            report.append(f"\n--- {node!r}:")
+            report.append("".join(traceback.format_exception(type(error), error, error.__traceback__)).rstrip())
+
+        if skipped:
+            report.append("\nSkipped because of failed dependencies:")
+            report.extend(f"    {node!r}" for node in skipped)
+
+        super().__init__("\n".join(report))
+
+
+def _normPath(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def FindDependencies(nodesIO: List[Tuple[Set[str], Set[str]]]) -> Dict[int, Set[int]]:
+    """
+    'nodesIO' holds the (inputs, outputs) file sets of every node in declaration order.
+    A node depends on every earlier node that writes a file it reads or writes, and on
+    every earlier node that reads a file it writes.
+    """
+    writers: Dict[str, List[int]] = {}
+    readers: Dict[str, List[int]] = {}
+    dependencies: Dict[int, Set[int]] = {}
+
+    for index, (inputs, outputs) in enumerate(nodesIO):
+        inputs = {_normPath(path) for path in inputs}
+        outputs = {_normPath(path) for path in outputs}
+
+        nodeDependencies = set()
+        for path in inputs | outputs:
+            nodeDependencies.update(writers.get(path, []))
+        for path in outputs:
+            nodeDependencies.update(readers.get(path, []))
+
+        dependencies[index] = nodeDependencies
+
+        for path in inputs:
+            readers.setdefault(path, []).append(index)
+        for path in outputs:
+            writers.setdefault(path, []).append(index)
+
+    return dependencies
+
+
+def RunGraph(nodes: List[_TNode],
+             dependencies: Dict[int, Set[int]],
+             run: Callable[[_TNode], None],
+             workers: Optional[int] = None):
+    """
+    Run 'run(node)' for every node on a pool of 'workers' threads, a node starts as soon
+    as all nodes it depends on are done. A failure does not stop independent nodes;
+    all failures are raised together as a BuildError at the end.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    dependents: Dict[int, Set[int]] = {index: set() for index in range(len(nodes))}
+    waitingFor: Dict[int, int] = {}
+    for index in range(len(nodes)):
+        waitingFor[index] = len(dependencies.get(index, ()))
+        for dependency in dependencies.get(index, ()):
+            dependents[dependency].add(index)
+
+    failures: List[Tuple[object, BaseException]] = []
+    skipped: Set[int] = set()
+
+    def skip(index: int):
+        for dependent in dependents[index]:
+            if dependent not in skipped:
+                skipped.add(dependent)
+                skip(dependent)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="build") as executor:
+        running = {}
+        for index, count in waitingFor.items():
+            if count == 0:
+                running[executor.submit(run, nodes[index])] = index
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                index = running.pop(future)
+
+                if future.exception() is not None:
+                    failures.append((nodes[index], future.exception()))
+                    skip(index)
+                    continue
+
+                for dependent in dependents[index]:
+                    waitingFor[dependent] -= 1
+                    if waitingFor[dependent] == 0 and dependent not in skipped:
+                        running[executor.submit(run, nodes[dependent])] = dependent
+
+    if failures:
+        raise BuildError(failures, [nodes[index] for index in sorted(skipped)])
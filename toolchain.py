@@ -0,0 +1,811 @@
+import os
+import re
+import abc
+import sys
+import json
+import shlex
+import shutil
+import sysconfig
+import threading
+import contextlib
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+from typing import Optional, List, Dict, Tuple, Union
+
+from .cache import BuildCache, ObjectManifest, HashFile, HashKey, HeaderPath, HeadersKey
+from .buildtrace import BUILD_TRACE
+
+
+class CompileError(Exception):
+    pass
+
+
+PROFILE_GENERATE = "generate"
+PROFILE_USE = "use"
+
+
+class BuildProfile:
+    """
+    Named set of code generation options.
+
+    'optimize' is the optimization level ("0", "1", "2", "3", "s"), None keeps the flags
+    Python was built with. 'lto' is None, "thin" or "full" (gcc has no thin LTO and does a
+    parallel full one). 'arch' is the target ISA, "native" for the build machine or an
+    '-march' / '/arch' name. 'visibility' is the default symbol visibility of gcc/clang
+    objects, 'PyInit_' functions are always exported. 'debug' adds debug info and keeps
+    assertions. Every profile builds in its own 'tempDirName' under 'build_temp'.
+    """
+    def __init__(self,
+                 name: str,
+                 tempDirName: Optional[str] = None,
+                 optimize: Optional[str] = None,
+                 lto: Optional[str] = None,
+                 arch: Optional[str] = None,
+                 visibility: Optional[str] = None,
+                 debug: bool = False):
+        if lto not in [None, "thin", "full"]:
+            raise ValueError(f"Unknown LTO mode \"{lto}\", expected None, \"thin\" or \"full\"")
+
+        self.name = name
+        self.tempDirName = tempDirName or name
+        self.optimize = optimize
+        self.lto = lto
+        self.arch = arch
+        self.visibility = visibility
+        self.debug = debug
+
+    def __repr__(self) -> str:
+        return f"<{self.__module__}.{self.__class__.__name__}: {self.name}>"
+
+
+BUILD_PROFILES: Dict[str, BuildProfile] = {
+    profile.name: profile for profile in [
+        BuildProfile("release", "Release"),
+        BuildProfile("release-lto", "ReleaseLTO", optimize="3", lto="thin", visibility="hidden"),
+        BuildProfile("native", "Native", optimize="3", lto="thin", arch="native", visibility="hidden"),
+        BuildProfile("debug", "Debug", optimize="0", debug=True),
+    ]
+}
+
+DEFAULT_BUILD_PROFILE = "release"
+
+
+def GetBuildProfile(profile: Union[str, BuildProfile, None] = None) -> BuildProfile:
+    if profile is None:
+        profile = DEFAULT_BUILD_PROFILE
+
+    if isinstance(profile, BuildProfile):
+        return profile
+
+    if profile not in BUILD_PROFILES:
+        raise ValueError(f"Unknown build profile \"{profile}\", expected one of {', '.join(BUILD_PROFILES)}")
+
+    return BUILD_PROFILES[profile]
+
+
+_jobSlots: Optional[threading.BoundedSemaphore] = None
+
+
+@contextlib.contextmanager
+def JobSlots(jobs: Optional[int] = None):
+    """
+    Limit the compiler and linker processes of all NativeCompiler instances together
+    to 'jobs' while the context is active.
+    """
+    global _jobSlots
+
+    previous = _jobSlots
+    _jobSlots = threading.BoundedSemaphore(jobs or os.cpu_count() or 1)
+    try:
+        yield
+    finally:
+        _jobSlots = previous
+
+
+def _configVar(name: str, default: str = "") -> str:
+    value = sysconfig.get_config_var(name)
+    if value is None:
+        return default
+    return str(value)
+
+
+class NativeCompiler(abc.ABC):
+    """
+    Minimal C/C++ compiler driver.
+
+    Every source is compiled by a separate compiler process, up to 'jobs' processes run
+    at the same time. The first failed job stops the whole compile: queued jobs are
+    dropped and running ones are killed.
+    """
+    objExt = ".o"
+    resExt = ".res"
+    exeExt = ""
+
+    def __init__(self, jobs: Optional[int] = None):
+        self.jobs = jobs
+        self.env: Optional[Dict[str, str]] = None
+        self.buildProfile = GetBuildProfile()
+
+        self.profileMode: Optional[str] = None
+        self.profilePath: Optional[str] = None
+        self._profileKey: Optional[str] = None
+
+        self._lock = threading.Lock()
+
+    def setProfile(self, mode: Optional[str], path: Optional[str] = None):
+        """
+        Profile-guided optimization: PROFILE_GENERATE builds instrumented code that writes
+        its profiles into the 'path' directory, PROFILE_USE optimizes with the profile
+        'path' returned by mergeProfiles(), None turns it off.
+        """
+        self.profileMode = mode
+        self.profilePath = path
+        self._profileKey = _hashProfile(path) if mode == PROFILE_USE else None
+
+    def hasProfile(self, path: Optional[str]) -> bool:
+        """
+        True if 'path' returned by mergeProfiles() still holds profile data.
+        """
+        return path is not None and os.path.exists(path) and _hashProfile(path) != HashKey()
+
+    def mergeProfiles(self, profileDir: str) -> str:
+        """
+        Merge the profiles the training runs wrote into 'profileDir' and return the
+        profile to use.
+        """
+        return profileDir
+
+    def _profileCompileArgs(self) -> List[str]:
+        return []
+
+    def _profileLinkArgs(self, outputFile: str) -> List[str]:
+        return []
+
+    def _buildProfileCompileArgs(self) -> List[str]:
+        return []
+
+    def _buildProfileLinkArgs(self) -> List[str]:
+        return []
+
+    def objectFileName(self, source: str, outputDir: str) -> str:
+        base, ext = os.path.splitext(os.path.splitdrive(source)[1])
+        base = base[os.path.isabs(base):]
+
+        if ext == ".rc":
+            return os.path.join(outputDir, base + self.resExt)
+
+        return os.path.join(outputDir, base + self.objExt)
+
+    @abc.abstractmethod
+    def _compileCmd(self, source: str, objectFile: str, includeDirs: List[str]) -> Optional[List[str]]:
+        """
+        Command line that compiles 'source' into 'objectFile', None to skip the source.
+        """
+
+    def _depsArgs(self, source: str, objectFile: str) -> List[str]:
+        """
+        Options that make the compiler report the headers 'source' includes, see _headers().
+        """
+        return []
+
+    def _headers(self, source: str, objectFile: str, output: str) -> Tuple[List[str], str]:
+        """
+        The headers reported for 'source' by the options of _depsArgs() (see HeaderPath()),
+        and the 'output' of the compiler without the report.
+        """
+        return [], output
+
+    @abc.abstractmethod
+    def _linkSharedCmd(self,
+                       objects: List[str],
+                       outputFile: str,
+                       libraryDirs: List[str],
+                       exportSymbols: List[str],
+                       buildTemp: str) -> List[str]:
+        """
+        Command line that links 'objects' into the shared library 'outputFile'.
+        """
+
+    @abc.abstractmethod
+    def _linkExecCmd(self, objects: List[str], outputFile: str, libraryDirs: List[str]) -> List[str]:
+        """
+        Command line that links 'objects' into the executable 'outputFile'.
+        """
+
+    def _spawn(self,
+               cmd: List[str],
+               running: Optional[set] = None,
+               failed: Optional[threading.Event] = None,
+               echo: bool = True) -> Optional[str]:
+        """
+        Run 'cmd' and return its output, which is printed with 'echo'. None if the
+        command was not run because another one 'failed'.
+        """
+        slots = _jobSlots
+        if slots is None:
+            return self._spawnProcess(cmd, running, failed, echo)
+
+        with slots:
+            if failed is None or not failed.is_set():
+                return self._spawnProcess(cmd, running, failed, echo)
+
+        return None
+
+    def _spawnProcess(self,
+                      cmd: List[str],
+                      running: Optional[set] = None,
+                      failed: Optional[threading.Event] = None,
+                      echo: bool = True) -> Optional[str]:
+        if self.env is not None:
+            # Popen looks the executable up in our own PATH, not in 'env'
+            cmd = [shutil.which(cmd[0], path=self.env.get("PATH") or self.env.get("Path")) or cmd[0]] + cmd[1:]
+
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=self.env)
+
+        if running is not None:
+            with self._lock:
+                running.add(proc)
+
+            # The compile may have failed while this process was starting
+            if failed.is_set():
+                proc.kill()
+
+        try:
+            output = proc.communicate()[0].decode(errors="replace").strip()
+        finally:
+            if running is not None:
+                with self._lock:
+                    running.discard(proc)
+
+        if proc.returncode != 0:
+            if failed is not None and failed.is_set():
+                return None
+            raise CompileError(f"Command {' '.join(cmd)} failed with exit code {proc.returncode}\n{output}")
+
+        if output and echo:
+            with self._lock:
+                print(output)
+
+        return output
+
+    def _runJobs(self, jobs: List[Tuple[str, List[str], str]]) -> Dict[str, List[str]]:
+        """
+        'jobs' are (source, command, object file) triples. Returns the headers included
+        by every compiled object file.
+        """
+        running = set()
+        failed = threading.Event()
+        headers = {}
+
+        def runJob(source: str, cmd: List[str], objectFile: str):
+            if failed.is_set():
+                return
+
+            with self._lock:
+                print(f"Compile {source}")
+
+            with BUILD_TRACE.span("compile", source, output=objectFile):
+                output = self._spawn(cmd, running, failed, echo=False)
+
+            if output is None:
+                return
+
+            headers[objectFile], output = self._headers(source, objectFile, output)
+            if output:
+                with self._lock:
+                    print(output)
+
+        workers = self.jobs or os.cpu_count() or 1
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as executor:
+            futures = [executor.submit(runJob, source, cmd, objectFile) for source, cmd, objectFile in jobs]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+
+            for future in done:
+                if future.exception() is not None:
+                    failed.set()
+
+                    for pending in futures:
+                        pending.cancel()
+
+                    with self._lock:
+                        for proc in running:
+                            proc.kill()
+
+                    raise future.exception()
+
+        return headers
+
+    def _objectKey(self, source: str, includeDirs: List[str]) -> str:
+        # Source and object paths are left out, the same source compiled into
+        # another build directory gets the same key
+        ext = os.path.splitext(source)[1]
+        cmd = self._compileCmd("<source>" + ext, "<object>", includeDirs)
+
+        return HashKey("object", HashFile(source), cmd, includeDirs, self._profileKey)
+
+    @staticmethod
+    def _getCached(cache: BuildCache, key: str, objectFile: str) -> Optional[List[str]]:
+        """
+        Two lookups: the headers the source included when it was compiled with the command
+        of 'key', then the object built from their current content. The included headers.
+        """
+        headersFile = objectFile + ".headers.json"
+        if not cache.get(HashKey(key, "headers"), headersFile, kind="object headers"):
+            return None
+
+        try:
+            with open(headersFile, "r") as f:
+                headers = json.load(f)
+        finally:
+            os.remove(headersFile)
+
+        headersKey = HeadersKey(key, headers)
+        if headersKey is None or not cache.get(headersKey, objectFile, kind="object"):
+            return None
+
+        return headers
+
+    @staticmethod
+    def _putCached(cache: BuildCache, key: str, objectFile: str, headers: List[str]):
+        headersKey = HeadersKey(key, headers)
+        if headersKey is None:
+            return
+
+        headersFile = objectFile + ".headers.json"
+        with open(headersFile, "w") as f:
+            json.dump(headers, f)
+
+        try:
+            cache.put(HashKey(key, "headers"), headersFile)
+        finally:
+            os.remove(headersFile)
+
+        cache.put(headersKey, objectFile)
+
+    def compile(self,
+                sources: List[str],
+                outputDir: str,
+                includeDirs: Optional[List[str]] = None,
+                manifest: Optional[ObjectManifest] = None,
+                cache: Optional[BuildCache] = None) -> List[str]:
+        """
+        Compile 'sources' into 'outputDir' and return the object files. With a 'manifest',
+        objects whose source, command line, include dirs and included headers are unchanged
+        are not rebuilt. Objects missing from the manifest are looked up in 'cache' before
+        compiling. The compiler reports the included headers, see _depsArgs().
+        """
+        if includeDirs is None:
+            includeDirs = []
+
+        objects = []
+        jobs = []
+        keys = {}
+        headers = {}
+        for source in sources:
+            objectFile = self.objectFileName(source, outputDir)
+            cmd = self._compileCmd(source, objectFile, includeDirs)
+            if cmd is None:
+                continue
+
+            objects.append(objectFile)
+
+            if manifest is not None or cache is not None:
+                key = self._objectKey(source, includeDirs)
+
+                if manifest is not None:
+                    if manifest.isUpToDate(objectFile, key):
+                        continue
+                    manifest.discard(objectFile)
+
+                keys[objectFile] = key
+
+                if cache is not None:
+                    cachedHeaders = self._getCached(cache, key, objectFile)
+                    if cachedHeaders is not None:
+                        headers[objectFile] = cachedHeaders
+                        continue
+
+            os.makedirs(os.path.dirname(objectFile) or ".", exist_ok=True)
+
+            jobs.append((source, cmd + self._depsArgs(source, objectFile), objectFile))
+
+        if manifest is not None:
+            print(f"{len(objects) - len(jobs)} of {len(objects)} objects are up to date")
+            manifest.save()
+
+        if jobs:
+            compiledHeaders = self._runJobs(jobs)
+            headers.update(compiledHeaders)
+
+            if cache is not None:
+                for objectFile, objectHeaders in compiledHeaders.items():
+                    self._putCached(cache, keys[objectFile], objectFile, objectHeaders)
+
+        if manifest is not None:
+            for objectFile, key in keys.items():
+                manifest.update(objectFile, key, headers[objectFile])
+            manifest.save()
+
+        return objects
+
+    def linkSharedObject(self,
+                         objects: List[str],
+                         outputFile: str,
+                         libraryDirs: Optional[List[str]] = None,
+                         exportSymbols: Optional[List[str]] = None,
+                         buildTemp: Optional[str] = None):
+        os.makedirs(os.path.dirname(outputFile) or ".", exist_ok=True)
+
+        print(f"Link {outputFile}")
+        with BUILD_TRACE.span("link", outputFile, output=outputFile):
+            self._spawn(self._linkSharedCmd(objects, outputFile, libraryDirs or [], exportSymbols or [], buildTemp or ".") +
+                        self._buildProfileLinkArgs() + self._profileLinkArgs(outputFile))
+
+    def linkExecutable(self, objects: List[str], outputFile: str, libraryDirs: Optional[List[str]] = None):
+        outputFile += self.exeExt
+        os.makedirs(os.path.dirname(outputFile) or ".", exist_ok=True)
+
+        print(f"Link {outputFile}")
+        with BUILD_TRACE.span("link", outputFile, output=outputFile):
+            self._spawn(self._linkExecCmd(objects, outputFile, libraryDirs or []) +
+                        self._buildProfileLinkArgs() + self._profileLinkArgs(outputFile))
+
+
+class UnixCCompiler(NativeCompiler):
+    """
+    gcc / clang driver, also used for MinGW on Windows.
+    """
+    resExt = ".res.o"
+
+    def __init__(self, jobs: Optional[int] = None):
+        super().__init__(jobs=jobs)
+
+        self.cc = shlex.split(os.environ.get("CC") or _configVar("CC", "cc"))
+        self.cxx = shlex.split(os.environ.get("CXX") or _configVar("CXX", "c++"))
+
+        self.cflags = shlex.split(_configVar("CFLAGS", "-DNDEBUG -O2"))
+        self.ccshared = shlex.split(_configVar("CCSHARED", "-fPIC" if os.name != "nt" else ""))
+
+        if os.name == "nt":
+            self.exeExt = ".exe"
+
+        self._clang: Optional[bool] = None
+
+    def _isClang(self) -> bool:
+        if self._clang is None:
+            try:
+                output = subprocess.run(self.cxx + ["--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT).stdout
+            except OSError:
+                output = b""
+            self._clang = b"clang" in output
+
+        return self._clang
+
+    def mergeProfiles(self, profileDir: str) -> str:
+        # gcc adds up the counters of every run in the '.gcda' files itself,
+        # clang leaves raw profiles that llvm-profdata has to merge
+        if not self._isClang():
+            return profileDir
+
+        rawProfiles = sorted(os.path.join(profileDir, name) for name in os.listdir(profileDir) if name.endswith(".profraw"))
+        if not rawProfiles:
+            raise CompileError(f"The training run wrote no profiles into \"{profileDir}\"")
+
+        profdata = shlex.split(os.environ.get("LLVM_PROFDATA") or "")
+        if not profdata:
+            if shutil.which("llvm-profdata") is None and sys.platform == "darwin":
+                profdata = ["xcrun", "llvm-profdata"]
+            else:
+                profdata = ["llvm-profdata"]
+
+        mergedProfile = os.path.join(profileDir, "merged.profdata")
+        print(f"Merge {len(rawProfiles)} profiles into {mergedProfile}")
+        self._spawn(profdata + ["merge", f"-output={mergedProfile}"] + rawProfiles)
+
+        return mergedProfile
+
+    def _profileCompileArgs(self) -> List[str]:
+        if self.profileMode == PROFILE_GENERATE:
+            return [f"-fprofile-generate={self.profilePath}"]
+
+        if self.profileMode == PROFILE_USE:
+            if self._isClang():
+                return [f"-fprofile-use={self.profilePath}", "-Wno-profile-instr-unprofiled",
+                        "-Wno-profile-instr-out-of-date"]
+
+            # The profiled code may run on several threads, counters can be slightly off
+            return [f"-fprofile-use={self.profilePath}", "-fprofile-correction", "-Wno-missing-profile"]
+
+        return []
+
+    def _profileLinkArgs(self, outputFile: str) -> List[str]:
+        if self.profileMode == PROFILE_GENERATE:
+            return [f"-fprofile-generate={self.profilePath}"]
+
+        return []
+
+    def _ltoArgs(self) -> List[str]:
+        if self.buildProfile.lto is None:
+            return []
+
+        if self._isClang():
+            return [f"-flto={self.buildProfile.lto}"]
+
+        return ["-flto=auto"]
+
+    def _buildProfileCompileArgs(self) -> List[str]:
+        profile = self.buildProfile
+        args = []
+
+        # Added after CFLAGS, the last '-O' wins
+        if profile.optimize is not None:
+            args.append(f"-O{profile.optimize}")
+
+        if profile.debug:
+            args.extend(["-g", "-UNDEBUG"])
+
+        if profile.arch is not None:
+            args.append(f"-march={profile.arch}")
+
+        if profile.visibility is not None:
+            args.append(f"-fvisibility={profile.visibility}")
+
+        return args + self._ltoArgs()
+
+    def _buildProfileLinkArgs(self) -> List[str]:
+        # With LTO the code is generated at link time, it needs the same options
+        if self.buildProfile.lto is None:
+            return ["-g"] if self.buildProfile.debug else []
+
+        return self._buildProfileCompileArgs()
+
+    def _compileCmd(self, source: str, objectFile: str, includeDirs: List[str]) -> Optional[List[str]]:
+        ext = os.path.splitext(source)[1]
+
+        if ext in [".h", ".hpp"]:
+            return None
+
+        if ext == ".rc":
+            if os.name != "nt":
+                print(f"Skip {source}: resource scripts are only supported on Windows")
+                return None
+
+            return ["windres", source, "-O", "coff", "-o", objectFile]
+
+        compiler = self.cc if ext == ".c" else self.cxx
+
+        return (compiler + ["-c", source, "-o", objectFile] +
+                self.cflags + self.ccshared + self._buildProfileCompileArgs() + self._profileCompileArgs() +
+                [f"-I{includeDir}" for includeDir in includeDirs])
+
+    def _depsArgs(self, source: str, objectFile: str) -> List[str]:
+        if os.path.splitext(source)[1] == ".rc":
+            return []
+
+        return ["-MD", "-MF", objectFile + ".d"]
+
+    def _headers(self, source: str, objectFile: str, output: str) -> Tuple[List[str], str]:
+        depFile = objectFile + ".d"
+        if not os.path.isfile(depFile):
+            return [], output
+
+        with open(depFile, "r") as f:
+            rule = f.read()
+        os.remove(depFile)
+
+        # "object: source header ...", lines continued with a backslash, spaces in paths escaped
+        rule = rule.replace("\\\r\n", " ").replace("\\\n", " ")
+        prerequisites = rule.split(": ", 1)[1] if ": " in rule else ""
+        paths = [path.replace("\\ ", " ").replace("$$", "$") for path in re.split(r"(?<!\\)\s+", prerequisites) if path]
+
+        return _headerPaths(source, paths), output
+
+    def _libraryDirArgs(self, libraryDirs: List[str]) -> List[str]:
+        return [f"-L{libraryDir}" for libraryDir in libraryDirs]
+
+    def _linkSharedCmd(self,
+                       objects: List[str],
+                       outputFile: str,
+                       libraryDirs: List[str],
+                       exportSymbols: List[str],
+                       buildTemp: str) -> List[str]:
+        # On ELF/Mach-O targets every non-hidden symbol is exported and PyMODINIT_FUNC is
+        # never hidden, MinGW sees it as __declspec(dllexport), so 'exportSymbols' needs no flags
+        if sys.platform == "darwin":
+            sharedFlags = ["-bundle", "-undefined", "dynamic_lookup"]
+        else:
+            sharedFlags = ["-shared"]
+
+        libs = []
+        if os.name == "nt":
+            libs = [f"-lpython{sys.version_info[0]}{sys.version_info[1]}"]
+
+        return self.cxx + sharedFlags + objects + ["-o", outputFile] + self._libraryDirArgs(libraryDirs) + libs
+
+    def _linkExecCmd(self, objects: List[str], outputFile: str, libraryDirs: List[str]) -> List[str]:
+        if os.name == "nt":
+            libs = [f"-lpython{sys.version_info[0]}{sys.version_info[1]}"]
+        else:
+            libs = [f"-lpython{_configVar('LDVERSION', '%d.%d' % sys.version_info[:2])}"]
+            libs += shlex.split(_configVar("LIBS")) + shlex.split(_configVar("SYSLIBS"))
+
+        return self.cxx + objects + ["-o", outputFile] + self._libraryDirArgs(libraryDirs) + libs
+
+
+# Printed by cl.exe for every header with /showIncludes (English toolset)
+_SHOW_INCLUDES_PREFIX = "Note: including file:"
+
+
+class MsvcCompiler(NativeCompiler):
+    """
+    cl.exe / link.exe driver. Runs inside the current developer environment, or
+    sets one up with vcvarsall.bat of the newest Visual Studio installation.
+    """
+    objExt = ".obj"
+    resExt = ".res"
+    exeExt = ".exe"
+
+    compileOptions = ["/nologo", "/W3", "/MD"]
+    linkOptions = ["/nologo", "/INCREMENTAL:NO"]
+
+    def __init__(self, jobs: Optional[int] = None):
+        super().__init__(jobs=jobs)
+
+        if shutil.which("cl.exe") is None:
+            self.env = _getVcVarsEnv()
+
+    def _compileCmd(self, source: str, objectFile: str, includeDirs: List[str]) -> Optional[List[str]]:
+        ext = os.path.splitext(source)[1]
+        includeArgs = [f"/I{includeDir}" for includeDir in includeDirs]
+
+        if ext in [".h", ".hpp"]:
+            return None
+
+        if ext == ".rc":
+            return ["rc.exe", "/nologo"] + includeArgs + [f"/fo{objectFile}", source]
+
+        if ext == ".c":
+            return (["cl.exe", "/c"] + self.compileOptions + self._buildProfileCompileArgs() + includeArgs +
+                    [f"/Tc{source}", f"/Fo{objectFile}"])
+
+        return (["cl.exe", "/c"] + self.compileOptions + self._buildProfileCompileArgs() + ["/EHsc"] + includeArgs +
+                [f"/Tp{source}", f"/Fo{objectFile}"])
+
+    def _depsArgs(self, source: str, objectFile: str) -> List[str]:
+        if os.path.splitext(source)[1] == ".rc":
+            return []
+
+        return ["/showIncludes"]
+
+    def _headers(self, source: str, objectFile: str, output: str) -> Tuple[List[str], str]:
+        paths = []
+        lines = []
+        for line in output.splitlines():
+            if line.startswith(_SHOW_INCLUDES_PREFIX):
+                paths.append(line[len(_SHOW_INCLUDES_PREFIX):].strip())
+            else:
+                lines.append(line)
+
+        return _headerPaths(source, paths), "\n".join(lines).strip()
+
+    def _libraryDirArgs(self, libraryDirs: List[str]) -> List[str]:
+        return [f"/LIBPATH:{libraryDir}" for libraryDir in libraryDirs]
+
+    def _buildProfileCompileArgs(self) -> List[str]:
+        profile = self.buildProfile
+
+        if profile.debug:
+            args = ["/Od" if profile.optimize in [None, "0"] else f"/O{profile.optimize}", "/Zi", "/FS"]
+        else:
+            args = ["/O1" if profile.optimize == "s" else "/O2", "/DNDEBUG"]
+
+        # Whole program optimization is the default of release builds, PGO needs it too
+        if profile.lto is not None or (not profile.debug and profile.optimize is None) or self.profileMode is not None:
+            args.append("/GL")
+
+        # cl.exe has no option to target the build machine
+        if profile.arch is not None and profile.arch != "native":
+            args.append(f"/arch:{profile.arch}")
+
+        return args
+
+    def _buildProfileLinkArgs(self) -> List[str]:
+        args = []
+
+        if "/GL" in self._buildProfileCompileArgs():
+            args.append("/LTCG:INCREMENTAL" if self.buildProfile.lto == "thin" and self.profileMode is None else "/LTCG")
+
+        if self.buildProfile.debug:
+            args.append("/DEBUG")
+
+        return args
+
+    def mergeProfiles(self, profileDir: str) -> str:
+        # link.exe merges the '.pgc' files of the training runs into the '.pgd' by itself
+        return profileDir
+
+    def _profileLinkArgs(self, outputFile: str) -> List[str]:
+        if self.profileMode is None:
+            return []
+
+        pgdFile = os.path.join(self.profilePath, os.path.splitext(os.path.basename(outputFile))[0] + ".pgd")
+        if self.profileMode == PROFILE_GENERATE:
+            return [f"/GENPROFILE:PGD={pgdFile}"]
+
+        return [f"/USEPROFILE:PGD={pgdFile}"]
+
+    def _linkSharedCmd(self,
+                       objects: List[str],
+                       outputFile: str,
+                       libraryDirs: List[str],
+                       exportSymbols: List[str],
+                       buildTemp: str) -> List[str]:
+        implib = os.path.join(buildTemp, os.path.splitext(os.path.basename(outputFile))[0] + ".lib")
+
+        return (["link.exe", "/DLL"] + self.linkOptions + ["/MANIFEST:EMBED,ID=2", "/MANIFESTUAC:NO"] +
+                self._libraryDirArgs(libraryDirs) +
+                [f"/EXPORT:{symbol}" for symbol in exportSymbols] +
+                objects + [f"/OUT:{outputFile}", f"/IMPLIB:{implib}"])
+
+    def _linkExecCmd(self, objects: List[str], outputFile: str, libraryDirs: List[str]) -> List[str]:
+        return ["link.exe"] + self.linkOptions + self._libraryDirArgs(libraryDirs) + objects + [f"/OUT:{outputFile}"]
+
+
+def _headerPaths(source: str, paths: List[str]) -> List[str]:
+    sourcePath = os.path.normcase(os.path.abspath(source))
+    return sorted({HeaderPath(path) for path in paths if os.path.normcase(os.path.abspath(path)) != sourcePath})
+
+
+def _hashProfile(path: str) -> str:
+    if os.path.isfile(path):
+        return HashFile(path)
+
+    if not os.path.isdir(path):
+        return HashKey()
+
+    return HashKey(*(
+        (name, HashFile(os.path.join(path, name)))
+        for name in sorted(os.listdir(path))
+        if name.endswith((".gcda", ".profdata", ".pgd", ".pgc"))
+    ))
+
+
+def _getVcVarsEnv() -> Dict[str, str]:
+    programFiles = os.environ.get("ProgramFiles(x86)") or os.environ.get("ProgramFiles") or ""
+    vswhere = os.path.join(programFiles, "Microsoft Visual Studio", "Installer", "vswhere.exe")
+
+    if not os.path.isfile(vswhere):
+        raise CompileError("Microsoft Visual C++ not found, run the build from a developer command prompt")
+
+    installPath = subprocess.check_output([
+        vswhere, "-latest", "-prerelease",
+        "-requires", "Microsoft.VisualStudio.Component.VC.Tools.x86.x64",
+        "-property", "installationPath", "-products", "*"
+    ]).decode(errors="replace").strip()
+
+    vcvarsall = os.path.join(installPath, "VC", "Auxiliary", "Build", "vcvarsall.bat")
+    if not os.path.isfile(vcvarsall):
+        raise CompileError(f"vcvarsall.bat not found in \"{installPath}\"")
+
+    arch = "x64" if sys.maxsize > 2 ** 32 else "x86"
+    output = subprocess.check_output(f'cmd /u /c "{vcvarsall}" {arch} && set', stderr=subprocess.STDOUT)
+
+    env = {}
+    for line in output.decode("utf-16le", errors="replace").splitlines():
+        key, sep, value = line.partition("=")
+        if sep and key:
+            env[key] = value
+
+    return env
+
+
+def NewCompiler(jobs: Optional[int] = None) -> NativeCompiler:
+    """
+    MSVC on Windows unless 'CC' is set in the environment, gcc/clang everywhere else.
+    """
+    if os.name == "nt" and "CC" not in os.environ:
+        return MsvcCompiler(jobs=jobs)
+
+    return UnixCCompiler(jobs=jobs)
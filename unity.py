@@ -0,0 +1,92 @@
+import os
+import re
+
+from typing import List, Tuple
+
+
+UNITY_DIR_NAME = "unity"
+
+_INCLUDE_RE = re.compile(r"^\s*#\s*include\b")
+_DEFINE_RE = re.compile(r"^\s*#\s*define\s+([A-Za-z_]\w*)")
+_NAMESPACE_RE = re.compile(r"\W")
+
+
+def _namespaceName(source: str) -> str:
+    return "pyc_unity_" + _NAMESPACE_RE.sub("_", os.path.splitext(os.path.normpath(source))[0])
+
+
+def GetUnityChunkCode(source: str, code: str) -> str:
+    """
+    The code of one generated '.cpp' wrapped to share a translation unit with others:
+    everything it declares goes into its own namespace, so the static Cython utility code
+    of every module stays separate, while the headers are included at global scope and
+    parsed once for the whole unit. 'PyInit_' functions are 'extern "C"' and keep their
+    names inside the namespace. The macros the code defines are undefined at its end.
+    """
+    namespace = _namespaceName(source)
+    lineFile = os.path.abspath(source).replace("\\", "/")
+
+    lines = [f"/* --- {source} --- */\n", f"namespace {namespace} {{\n", f'#line 1 "{lineFile}"\n']
+    macros = []
+    continued = False
+
+    for lineNo, line in enumerate(code.splitlines(keepends=True), start=1):
+        if not line.endswith("\n"):
+            line += "\n"
+
+        if not continued:
+            define = _DEFINE_RE.match(line)
+            if define is not None and define.group(1) not in macros:
+                macros.append(define.group(1))
+
+            if _INCLUDE_RE.match(line):
+                lines.extend(["}\n", line, f"namespace {namespace} {{\n", f'#line {lineNo + 1} "{lineFile}"\n'])
+                continued = line.rstrip().endswith("\\")
+                continue
+
+        lines.append(line)
+        continued = line.rstrip().endswith("\\")
+
+    lines.append(f"}} /* namespace {namespace} */\n")
+    lines.extend(f"#undef {macro}\n" for macro in macros)
+
+    return "".join(lines)
+
+
+def GetUnityCode(sources: List[str]) -> str:
+    chunks = [f"/* Unity build of {len(sources)} modules, generated file */\n"]
+
+    for source in sources:
+        with open(source, "r") as f:
+            chunks.append(GetUnityChunkCode(source, f.read()))
+
+    return "\n".join(chunks)
+
+
+def _writeIfChanged(path: str, code: str):
+    if os.path.isfile(path):
+        with open(path, "r") as f:
+            if f.read() == code:
+                return
+
+    with open(path, "w") as f:
+        f.write(code)
+
+
+def WriteUnitySources(sources: List[str], outputDir: str, name: str, batchSize: int) -> List[Tuple[str, List[str]]]:
+    """
+    Combine the generated '.cpp' 'sources' into units of up to 'batchSize' modules in
+    'outputDir' and return (unit file, sources) pairs. A unit is only rewritten when its
+    code changes, unchanged units keep their objects.
+    """
+    os.makedirs(outputDir, exist_ok=True)
+
+    units = []
+    for start in range(0, len(sources), max(1, batchSize)):
+        batch = sources[start:start + max(1, batchSize)]
+        unitFile = os.path.join(outputDir, f"{name}_unity{len(units)}.cpp")
+
+        _writeIfChanged(unitFile, GetUnityCode(batch))
+        units.append((unitFile, batch))
+
+    return units
@@ -0,0 +1,257 @@
+import os
+import sys
+import time
+import select
+import struct
+
+from typing import Optional, List, Dict, Set, Union
+
+from .compiler import BaseProcessor, ProcessAll, _flattenProcessors
+from .scheduler import FindDependencies, BuildError
+from .toolchain import BuildProfile
+
+
+DEFAULT_DEBOUNCE = 0.2
+DEFAULT_POLL_INTERVAL = 0.5
+
+# sys/inotify.h
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_INOTIFY_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_INOTIFY_EVENT = struct.Struct("iIII")
+_INOTIFY_BUFFER_SIZE = 64 * 1024
+
+
+def _normPath(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+class PollingWatcher:
+    """
+    Compares the size and modification time of the files every 'interval' seconds.
+    """
+    def __init__(self, files: Set[str], interval: float = DEFAULT_POLL_INTERVAL):
+        self.interval = interval
+        self._stamps = {_normPath(file): self._stamp(file) for file in files}
+
+    @staticmethod
+    def _stamp(file: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(file)
+        except OSError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        The files changed since the previous call, waits up to 'timeout' seconds (None: forever) for one.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            changed = set()
+            for file, stamp in self._stamps.items():
+                newStamp = self._stamp(file)
+                if newStamp != stamp:
+                    self._stamps[file] = newStamp
+                    changed.add(file)
+
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+            time.sleep(self.interval if deadline is None else max(0.0, min(self.interval, deadline - time.monotonic())))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    inotify through ctypes, the directories of the files are watched so that editors
+    replacing a file by renaming a new one over it are seen as well.
+    """
+    def __init__(self, files: Set[str]):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        self._files = {_normPath(file) for file in files}
+        self._dirs: Dict[int, str] = {}
+
+        try:
+            for directory in sorted({os.path.dirname(file) for file in self._files}):
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _INOTIFY_MASK)
+                if wd < 0:
+                    errno = ctypes.get_errno()
+                    raise OSError(errno, os.strerror(errno), directory)
+                self._dirs[wd] = directory
+
+        except BaseException:
+            self.close()
+            raise
+
+    def _read(self) -> Set[str]:
+        changed = set()
+
+        while True:
+            try:
+                buffer = os.read(self._fd, _INOTIFY_BUFFER_SIZE)
+            except BlockingIOError:
+                return changed
+
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, nameSize = _INOTIFY_EVENT.unpack_from(buffer, offset)
+                offset += _INOTIFY_EVENT.size
+                name = buffer[offset:offset + nameSize].rstrip(b"\0")
+                offset += nameSize
+
+                # The kernel dropped events, any file may have changed
+                if wd == -1 or mask & _IN_Q_OVERFLOW:
+                    changed.update(self._files)
+                    continue
+
+                directory = self._dirs.get(wd)
+                if directory is not None and name:
+                    file = _normPath(os.path.join(directory, os.fsdecode(name)))
+                    if file in self._files:
+                        changed.add(file)
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        The files changed since the previous call, waits up to 'timeout' seconds (None: forever) for one.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+
+            changed = self._read() if ready else set()
+            if changed or not ready:
+                return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def NewWatcher(files: Set[str], polling: bool = False, pollInterval: float = DEFAULT_POLL_INTERVAL):
+    """
+    inotify on Linux, polling elsewhere or where inotify is not available.
+    """
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(files)
+        except OSError as e:
+            print(f"inotify not available ({e}), poll for changes")
+
+    return PollingWatcher(files, pollInterval)
+
+
+def _dependents(dependencies: Dict[int, Set[int]], nodes: Set[int]) -> Set[int]:
+    dependents: Dict[int, Set[int]] = {}
+    for node, nodeDependencies in dependencies.items():
+        for dependency in nodeDependencies:
+            dependents.setdefault(dependency, set()).add(node)
+
+    affected = set(nodes)
+    pending = list(nodes)
+    while pending:
+        for node in dependents.get(pending.pop(), set()):
+            if node not in affected:
+                affected.add(node)
+                pending.append(node)
+
+    return affected
+
+
+def _build(processors: List[BaseProcessor], **options) -> bool:
+    try:
+        ProcessAll(*processors, **options)
+    except BuildError as e:
+        print(e)
+        return False
+
+    return True
+
+
+def Watch(*processors: Union[BaseProcessor, List[BaseProcessor]],
+          buildDir: Optional[str] = None,
+          jobs: Optional[int] = None,
+          buildProfile: Union[str, BuildProfile, None] = None,
+          debounce: float = DEFAULT_DEBOUNCE,
+          polling: bool = False,
+          pollInterval: float = DEFAULT_POLL_INTERVAL):
+    """
+    Build all processors like ProcessAll(), then build again on every change of their
+    input files (see getInputs()) until interrupted with Ctrl+C. Only the processors
+    that read a changed file are built again, with the processors that depend on them,
+    and in those only the changed sources are cythonized and compiled again.
+
+    Changes are collected until no file changes for 'debounce' seconds, so a burst of
+    saves is one build. 'polling' checks the files every 'pollInterval' seconds instead
+    of using inotify. Files that are added later are not picked up by the patterns
+    the processors were created with, restart to include them.
+    """
+    processors = _flattenProcessors(processors)
+    options = {"buildDir": buildDir, "jobs": jobs, "buildProfile": buildProfile}
+
+    # Started first, changes made during the first build start the next one
+    inputs = [{_normPath(path) for path in processor.getInputs()} for processor in processors]
+    watcher = NewWatcher(set().union(*inputs), polling=polling, pollInterval=pollInterval)
+
+    try:
+        _build(processors, **options)
+
+        # ProcessAll has set the build dirs, the outputs are final now
+        dependencies = FindDependencies([(processor.getInputs(), processor.getOutputs()) for processor in processors])
+
+        print(f"Watch {len(set().union(*inputs))} files of {len(processors)} processors, Ctrl+C to stop")
+
+        while True:
+            changed = watcher.wait()
+            while True:
+                more = watcher.wait(debounce)
+                if not more:
+                    break
+                changed |= more
+
+            affected = _dependents(dependencies, {
+                index for index, processorInputs in enumerate(inputs) if processorInputs & changed
+            })
+            if not affected:
+                continue
+
+            print(f"{len(changed)} files changed: {', '.join(sorted(changed))}")
+
+            for index in affected:
+                processors[index].reset(changed)
+
+            start = time.monotonic()
+            succeeded = _build([processor for index, processor in enumerate(processors) if index in affected], **options)
+            print(f"Rebuilt {len(affected)} of {len(processors)} processors in {time.monotonic() - start:.2f}s"
+                  + ("" if succeeded else " with errors"))
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        watcher.close()